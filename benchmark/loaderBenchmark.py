@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+from ai_dataloader.benchmark.syntheticFixtures import SyntheticFixtures
+from ai_dataloader.benchmark.memoryUsage import MemoryUsage
+
+class LoaderBenchmark(object):
+    """
+    Benchmark of the hot paths of the loaders on the synthetic fixtures, each case runs in a new interpreter so
+    its peak memory is not mixed with the other cases. The results can be saved as a baseline and compared
+    with a later run
+
+    pathFixtures : String -> folder of the fixtures, written with SyntheticFixtures.build when it is missing
+    """
+    cases = {
+        "numbers.getRandomBatchSample" : {"loader" : "numbers", "batchSize" : 32, "calls" : 30},
+        "numbers.getRandomBatchSample.stacked" : {"loader" : "numbers", "batchSize" : 32, "calls" : 30},
+        "omniglot.getSample" : {"loader" : "omniglot", "batchSize" : 1, "calls" : 500},
+        "omniglot.getRandomSample" : {"loader" : "omniglot", "batchSize" : 1, "calls" : 500},
+        "omniglot.getRandomBatchSample" : {"loader" : "omniglot", "batchSize" : 32, "calls" : 30},
+        "omniglot.getRandomBatchSample.stacked" : {"loader" : "omniglot", "batchSize" : 32, "calls" : 30},
+        "svhn.getSample" : {"loader" : "svhn", "batchSize" : 1, "calls" : 500},
+        "svhn.getRandomSample" : {"loader" : "svhn", "batchSize" : 1, "calls" : 500},
+        "svhn.getBatch" : {"loader" : "svhn", "batchSize" : 32, "calls" : 30},
+        "svhn.prepareData" : {"loader" : "svhn", "batchSize" : 1, "calls" : 3},
+    }
+
+    warmupCalls = 3
+    regressionTolerance = 0.1
+    # Results of the numbers and svhn cases at scale 1 committed with the benchmark, --compare without a file uses it
+    baselineFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+    def __init__(self, pathFixtures):
+        self.__pathFixtures = pathFixtures
+        self.__paths = {
+            "numbers" : os.path.join(pathFixtures, "numbers"),
+            "omniglot" : os.path.join(pathFixtures, "omniglot"),
+            "svhn" : os.path.join(pathFixtures, "svhn"),
+        }
+
+    def __prepareFixtures(self):
+        """
+        Tool to write the fixtures when they are missing and prepare the svhn fixture for the sample cases
+        """
+        if any(os.path.exists(path) is False for path in self.__paths.values()):
+            SyntheticFixtures.build(self.__pathFixtures)
+
+        from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+        SVHN(self.__paths["svhn"]).prepareData(verbose=False)
+
+    def openOmniglot(pathOmniglot):
+        """
+        Method to open the omniglot fixture, torchvision checks the md5 of the downloaded zip which the fixture does
+        not have, so the check is skipped while the loader is built and restored afterwards
+        """
+        from torchvision.datasets import Omniglot
+        from ai_dataloader.dataset.omniglot import OmniglotDataloader
+
+        checkIntegrity = Omniglot._check_integrity
+        Omniglot._check_integrity = lambda self: True
+        try:
+            return OmniglotDataloader(pathOmniglot, seed=0)
+        finally:
+            Omniglot._check_integrity = checkIntegrity
+
+    def __linkSVHN(pathData, pathCopy):
+        """
+        Tool to link the extracted splits of the svhn fixture into an empty folder, so prepareData runs all its steps
+        """
+        for folder in SyntheticFixtures.svhnSplits.values():
+            os.makedirs(os.path.dirname(os.path.join(pathCopy, folder)))
+            os.symlink(os.path.abspath(os.path.join(pathData, folder)), os.path.join(pathCopy, folder))
+
+    def __getCall(case, path):
+        """
+        Tool to build the function of a case, each call processes batchSize samples
+        """
+        batchSize = LoaderBenchmark.cases[case]["batchSize"]
+
+        if case.startswith("numbers."):
+            from ai_dataloader.dataset.numbers import NumbersDataloader
+            loader = NumbersDataloader(path, seed=0)
+            return lambda: loader.getRandomBatchSample(batchSize, stacked=case.endswith(".stacked"))
+
+        if case.startswith("omniglot."):
+            loader = LoaderBenchmark.openOmniglot(path)
+            generator = np.random.default_rng(0)
+            if case == "omniglot.getSample":
+                return lambda: loader.getSample(int(generator.integers(0, len(loader.getLabels()))))
+            if case == "omniglot.getRandomSample":
+                return loader.getRandomSample
+            return lambda: loader.getRandomBatchSample(batchSize, stacked=case.endswith(".stacked"))
+
+        from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+        if case == "svhn.prepareData":
+            def prepareData():
+                pathCopy = tempfile.mkdtemp()
+                try:
+                    LoaderBenchmark.__linkSVHN(path, pathCopy)
+                    SVHN(pathCopy).prepareData(verbose=False)
+                finally:
+                    shutil.rmtree(pathCopy)
+            return prepareData
+
+        loader = SVHN(path, seed=0)
+        generator = np.random.default_rng(0)
+        if case == "svhn.getSample":
+            return lambda: loader.getSample(int(generator.integers(0, loader.getDatasetSize())))
+        if case == "svhn.getRandomSample":
+            return loader.getRandomSample
+        return lambda: loader.getBatch(generator.integers(0, loader.getDatasetSize(), batchSize), workers=4)
+
+    def runCase(case, path):
+        """
+        Method to measure a case in the current process
+
+        case : String -> key of LoaderBenchmark.cases
+        path : String -> fixture of the loader of the case
+
+        return dict -> samplesPerSecond, p50, p90, p99 and max of the calls in seconds and peakRssBytes
+        """
+        call = LoaderBenchmark.__getCall(case, path)
+        if case != "svhn.prepareData":
+            for _ in range(LoaderBenchmark.warmupCalls):
+                call()
+
+        latencies = np.empty(LoaderBenchmark.cases[case]["calls"], dtype=np.float64)
+        for position in range(len(latencies)):
+            startTime = time.perf_counter()
+            call()
+            latencies[position] = time.perf_counter() - startTime
+
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        return {
+            "samplesPerSecond" : len(latencies) * LoaderBenchmark.cases[case]["batchSize"] / latencies.sum(),
+            "p50" : float(p50),
+            "p90" : float(p90),
+            "p99" : float(p99),
+            "max" : float(latencies.max()),
+            "peakRssBytes" : MemoryUsage.getPeakRss(),
+        }
+
+    def __measure(self, case):
+        """
+        Tool to run a case in a new interpreter
+        """
+        output = subprocess.run(
+            [sys.executable, "-m", "ai_dataloader.benchmark.loaderBenchmark", self.__pathFixtures, "--runCase", case],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+        return json.loads(output.strip().splitlines()[-1])
+
+    def run(self, cases=None):
+        """
+        Method to run the benchmark
+
+        cases : list of String or None -> keys of LoaderBenchmark.cases, None for all of them
+
+        return dict -> {"environment" : dict, "cases" : {case : measures of runCase}}
+        """
+        if cases is None:
+            cases = list(LoaderBenchmark.cases.keys())
+        self.__prepareFixtures()
+
+        return {
+            "environment" : {
+                "python" : platform.python_version(),
+                "numpy" : np.__version__,
+                "platform" : platform.platform(),
+                "cpus" : os.cpu_count(),
+            },
+            "cases" : {case : self.__measure(case) for case in cases},
+        }
+
+    def compare(results, baseline, tolerance=None):
+        """
+        Method to compare results with a baseline
+
+        results : dict -> as returned by run
+        baseline : dict -> as returned by run
+        tolerance : float or None -> relative loss of throughput considered a regression, regressionTolerance when None
+
+        return dict -> {case : {"speedup", "p99Ratio", "rssRatio", "regression"}} for the cases in both
+        """
+        if tolerance is None:
+            tolerance = LoaderBenchmark.regressionTolerance
+
+        comparison = dict()
+        for case in list(results["cases"].keys()):
+            if case not in baseline["cases"]:
+                continue
+            current = results["cases"][case]
+            previous = baseline["cases"][case]
+            speedup = current["samplesPerSecond"] / previous["samplesPerSecond"]
+            comparison.update({
+                case : {
+                    "speedup" : speedup,
+                    "p99Ratio" : current["p99"] / previous["p99"],
+                    "rssRatio" : current["peakRssBytes"] / previous["peakRssBytes"],
+                    "regression" : speedup < 1.0 - tolerance,
+                }
+            })
+
+        return comparison
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the loaders on synthetic fixtures")
+    parser.add_argument("pathFixtures", help="folder of the fixtures, written when it is missing")
+    parser.add_argument("--cases", nargs="+", choices=list(LoaderBenchmark.cases.keys()), default=None)
+    parser.add_argument("--save", default=None, help="json file the results are saved to as a baseline")
+    parser.add_argument(
+        "--compare",
+        nargs="?",
+        const=LoaderBenchmark.baselineFile,
+        default=None,
+        help="json file of a baseline to compare the results with, the committed baseline.json when no file is given",
+    )
+    parser.add_argument("--tolerance", type=float, default=None)
+    parser.add_argument("--runCase", default=None, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.runCase is not None:
+        loader = LoaderBenchmark.cases[arguments.runCase]["loader"]
+        print(json.dumps(LoaderBenchmark.runCase(arguments.runCase, os.path.join(arguments.pathFixtures, loader))))
+        sys.exit(0)
+
+    results = LoaderBenchmark(arguments.pathFixtures).run(arguments.cases)
+    for case in list(results["cases"].keys()):
+        measures = results["cases"][case]
+        print(
+            "case : " + case
+            + ", samples/s : " + "{:.1f}".format(measures["samplesPerSecond"])
+            + ", p50 ms : " + "{:.2f}".format(measures["p50"] * 1e3)
+            + ", p99 ms : " + "{:.2f}".format(measures["p99"] * 1e3)
+            + ", peak rss MB : " + "{:.1f}".format(measures["peakRssBytes"] / 2**20)
+        )
+
+    if arguments.compare is not None:
+        comparison = LoaderBenchmark.compare(results, JsonHandler.loadJson(arguments.compare), arguments.tolerance)
+        for case in list(comparison.keys()):
+            print(
+                "case : " + case
+                + ", speedup : " + "{:.2f}".format(comparison[case]["speedup"])
+                + ", p99 ratio : " + "{:.2f}".format(comparison[case]["p99Ratio"])
+                + ", rss ratio : " + "{:.2f}".format(comparison[case]["rssRatio"])
+                + (", REGRESSION" if comparison[case]["regression"] else "")
+            )
+
+    if arguments.save is not None:
+        JsonHandler.saveJson(arguments.save, results)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+class MemoryUsage(object):
+    """
+    Class to measure the memory of the benchmarks, it only imports the standard library so it can be loaded before
+    an import is measured. The memory is always given in bytes
+    """
+    def getPeakRss():
+        """
+        Method to obtain the peak resident memory of the current process in bytes, from VmHWM on linux since
+        ru_maxrss keeps the peak of the parent process across fork and exec. ru_maxrss is in kilobytes on linux and
+        in bytes on macOS
+        """
+        if os.path.exists("/proc/self/status"):
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+
+        import resource
+        peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            return peakRss
+
+        return peakRss * 1024
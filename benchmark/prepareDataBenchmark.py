@@ -0,0 +1,122 @@
+import os
+import argparse
+import shutil
+import tempfile
+import time
+from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+
+class PrepareDataBenchmark(object):
+    """
+    Benchmark of SVHN.prepareData comparing the serial path against the process pool, it also checks
+    that both paths produce identical files
+
+    pathData : String -> path of a downloaded SVHN dataset, it is not modified
+    """
+    def __init__(self, pathData):
+        self.__pathData = pathData
+        self.__imageFolders = [
+            os.path.join("train", "train"),
+            os.path.join("test", "test"),
+        ]
+        self.__preparedFiles = [
+            os.path.join("train", "groundTruth", "groundTruth.json"),
+            os.path.join("test", "groundTruth", "groundTruth.json"),
+            os.path.join("train", "imagesDirectory", "jsonImagesIndex.json"),
+            os.path.join("test", "imagesDirectory", "jsonImagesIndex.json"),
+            os.path.join("train", "imagesDirectory", "normalizationParameters.json"),
+        ]
+
+    def __linkDataset(self, pathBenchmark):
+        """
+        Tool to link the image folders of the dataset into the benchmark folder, so the prepared files are
+        written in the benchmark folder
+        """
+        for folder in self.__imageFolders:
+            os.makedirs(os.path.dirname(os.path.join(pathBenchmark, folder)))
+            os.symlink(
+                os.path.abspath(os.path.join(self.__pathData, folder)),
+                os.path.join(pathBenchmark, folder),
+            )
+
+    def __removePreparedFiles(self, pathBenchmark):
+        """
+        Tool to remove the prepared files so prepareData runs all its steps
+        """
+        for preparedFile in self.__preparedFiles:
+            if os.path.exists(os.path.join(pathBenchmark, preparedFile)):
+                os.remove(os.path.join(pathBenchmark, preparedFile))
+
+    def __readPreparedFiles(self, pathBenchmark):
+        """
+        Tool to read the content of the prepared files
+        """
+        content = dict()
+        for preparedFile in self.__preparedFiles:
+            with open(os.path.join(pathBenchmark, preparedFile), "rb") as f:
+                content.update({
+                    preparedFile : f.read(),
+                })
+
+        return content
+
+    def run(self, workers, repetitions=1):
+        """
+        Method to run the benchmark
+
+        workers : list of int -> number of workers of each run, 1 is the serial path, it is always run first since the
+            speedup and the identical files are measured against it
+        repetitions : int -> runs per number of workers, the best time is kept
+
+        return dict -> {workers : {"seconds", "speedup", "identical"}}
+        """
+        pathBenchmark = tempfile.mkdtemp()
+        try:
+            self.__linkDataset(pathBenchmark)
+
+            results = dict()
+            reference = None
+            serialSeconds = None
+            for numberWorkers in [1] + [numberWorkers for numberWorkers in workers if numberWorkers != 1]:
+                seconds = None
+                for _ in range(repetitions):
+                    self.__removePreparedFiles(pathBenchmark)
+                    startTime = time.perf_counter()
+                    SVHN(pathBenchmark).prepareData(verbose=False, workers=numberWorkers)
+                    elapsed = time.perf_counter() - startTime
+                    if seconds is None or elapsed < seconds:
+                        seconds = elapsed
+
+                content = self.__readPreparedFiles(pathBenchmark)
+                if reference is None:
+                    reference = content
+                if serialSeconds is None:
+                    serialSeconds = seconds
+
+                results.update({
+                    numberWorkers : {
+                        "seconds" : seconds,
+                        "speedup" : serialSeconds / seconds,
+                        "identical" : content == reference,
+                    }
+                })
+
+            return results
+        finally:
+            shutil.rmtree(pathBenchmark)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of SVHN.prepareData with a process pool")
+    parser.add_argument("pathData", help="path of a downloaded SVHN dataset")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--repetitions", type=int, default=1)
+    arguments = parser.parse_args()
+
+    results = PrepareDataBenchmark(arguments.pathData).run(arguments.workers, arguments.repetitions)
+    print("speedup against the serial run with 1 worker")
+    for numberWorkers in list(results.keys()):
+        print(
+            "workers : " + str(numberWorkers)
+            + ", seconds : " + "{:.2f}".format(results[numberWorkers]["seconds"])
+            + ", speedup : " + "{:.2f}".format(results[numberWorkers]["speedup"])
+            + ", identical : " + str(results[numberWorkers]["identical"])
+        )
@@ -0,0 +1,92 @@
+import sys
+import json
+import argparse
+import subprocess
+
+class StartupBenchmark(object):
+    """
+    Benchmark of the import time and memory of the loaders, each import runs in a new interpreter so nothing
+    is already imported
+    """
+    modules = {
+        "numbers" : "ai_dataloader.dataset.numbers",
+        "omniglot" : "ai_dataloader.dataset.omniglot",
+        "svhn" : "ai_dataloader.dataset.streetViewHouseNumbers",
+        "dataloader" : "ai_dataloader.dataloader",
+    }
+
+    heavyModules = ["PIL", "git", "h5py", "requests", "torch", "torchvision"]
+
+    measureScript = (
+        "import sys, json, time, importlib\n"
+        "from ai_dataloader.benchmark.memoryUsage import MemoryUsage\n"
+        "rssBefore = MemoryUsage.getPeakRss()\n"
+        "startTime = time.perf_counter()\n"
+        "importlib.import_module(sys.argv[1])\n"
+        "seconds = time.perf_counter() - startTime\n"
+        "rssBytes = MemoryUsage.getPeakRss()\n"
+        "print(json.dumps({\n"
+        "    'seconds' : seconds,\n"
+        "    'rssBytes' : rssBytes,\n"
+        "    'importRssBytes' : rssBytes - rssBefore,\n"
+        "    'heavyModules' : [name for name in json.loads(sys.argv[2]) if name in sys.modules],\n"
+        "}))\n"
+    )
+
+    def __measure(self, module):
+        """
+        Tool to import a module in a new interpreter
+
+        return dict -> seconds, rssBytes, importRssBytes and heavyModules
+        """
+        output = subprocess.run(
+            [sys.executable, "-c", StartupBenchmark.measureScript, module, json.dumps(StartupBenchmark.heavyModules)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+        return json.loads(output.strip().splitlines()[-1])
+
+    def run(self, loaders=None, repetitions=5):
+        """
+        Method to run the benchmark
+
+        loaders : list of String or None -> keys of StartupBenchmark.modules, None for all of them
+        repetitions : int -> imports per loader, the median time and the maximum memory are kept
+
+        return dict -> {loader : {"seconds", "rssBytes", "importRssBytes", "heavyModules"}}
+        """
+        if loaders is None:
+            loaders = list(StartupBenchmark.modules.keys())
+
+        results = dict()
+        for loader in loaders:
+            measures = [self.__measure(StartupBenchmark.modules[loader]) for _ in range(repetitions)]
+            seconds = sorted(measure["seconds"] for measure in measures)
+            results.update({
+                loader : {
+                    "seconds" : seconds[len(seconds) // 2],
+                    "rssBytes" : max(measure["rssBytes"] for measure in measures),
+                    "importRssBytes" : max(measure["importRssBytes"] for measure in measures),
+                    "heavyModules" : measures[-1]["heavyModules"],
+                }
+            })
+
+        return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the import time and memory of the loaders")
+    parser.add_argument("--loaders", nargs="+", choices=list(StartupBenchmark.modules.keys()), default=None)
+    parser.add_argument("--repetitions", type=int, default=5)
+    arguments = parser.parse_args()
+
+    results = StartupBenchmark().run(arguments.loaders, arguments.repetitions)
+    for loader in list(results.keys()):
+        print(
+            "loader : " + loader
+            + ", seconds : " + "{:.3f}".format(results[loader]["seconds"])
+            + ", rss MB : " + "{:.1f}".format(results[loader]["rssBytes"] / 2**20)
+            + ", import rss MB : " + "{:.1f}".format(results[loader]["importRssBytes"] / 2**20)
+            + ", heavy modules : " + str(results[loader]["heavyModules"])
+        )
@@ -0,0 +1,169 @@
+import os
+import argparse
+import numpy as np
+
+class SyntheticFixtures(object):
+    """
+    Generators of small synthetic datasets with the on disk layout of the real ones, so the loaders can be
+    measured without the network. The images are random noise, only their format, size and count matter
+    """
+    numbersFolder = "numbers"
+    omniglotFolder = os.path.join("omniglot-py", "images_background")
+    svhnSplits = {
+        "train" : os.path.join("train", "train"),
+        "test" : os.path.join("test", "test"),
+    }
+
+    def buildNumbers(path, folders=4, imagesPerDigit=25, size=28, seed=0):
+        """
+        Method to write the folders of the numbers repository, path/numbers/<folder>/<digit>/<image>.jpg, with the
+        README and scan files the loader must skip
+
+        path : String -> path given to NumbersDataloader, a clone is not attempted since path/numbers exists
+        folders : int -> folders like 0001
+        imagesPerDigit : int -> images of each digit in each folder
+        size : int -> images are RGB size x size
+        seed : int
+        """
+        from PIL import Image
+
+        generator = np.random.default_rng(seed)
+        for folder in range(1, folders + 1):
+            pathFolder = os.path.join(path, SyntheticFixtures.numbersFolder, "{:04d}".format(folder))
+            os.makedirs(pathFolder, exist_ok=True)
+            with open(os.path.join(pathFolder, "README"), "w") as f:
+                f.write("synthetic fixture\n")
+            Image.fromarray(generator.integers(0, 256, (size * 4, size * 4, 3), dtype=np.uint8)).save(os.path.join(pathFolder, "scan.jpg"))
+
+            for digit in range(10):
+                pathDigit = os.path.join(pathFolder, str(digit))
+                os.makedirs(pathDigit, exist_ok=True)
+                for image in range(imagesPerDigit):
+                    pixels = generator.integers(0, 256, (size, size, 3), dtype=np.uint8)
+                    Image.fromarray(pixels).save(os.path.join(pathDigit, str(image) + ".jpg"))
+
+    def buildOmniglot(path, alphabets=5, charactersPerAlphabet=10, drawers=20, size=105, seed=0):
+        """
+        Method to write the background set of Omniglot as extracted by torchvision,
+        path/omniglot-py/images_background/<alphabet>/character<NN>/<image>.png
+
+        path : String -> path given to OmniglotDataloader
+        alphabets : int
+        charactersPerAlphabet : int
+        drawers : int -> images of each character, 20 in the real dataset
+        size : int -> images are binary size x size
+        seed : int
+        """
+        from PIL import Image
+
+        generator = np.random.default_rng(seed)
+        characterId = 0
+        for alphabet in range(alphabets):
+            pathAlphabet = os.path.join(path, SyntheticFixtures.omniglotFolder, "Alphabet_" + str(alphabet))
+            for character in range(1, charactersPerAlphabet + 1):
+                characterId += 1
+                pathCharacter = os.path.join(pathAlphabet, "character{:02d}".format(character))
+                os.makedirs(pathCharacter, exist_ok=True)
+                for drawer in range(1, drawers + 1):
+                    pixels = generator.random((size, size)) > 0.1
+                    Image.fromarray(pixels).save(os.path.join(pathCharacter, "{:04d}_{:02d}.png".format(characterId, drawer)))
+
+    def __writeReferences(group, name, values, references):
+        """
+        Tool to write a field of a box as MATLAB v7.3 does, a single value is stored in place and several values
+        as references to scalar datasets of #refs#
+        """
+        import h5py
+
+        if len(values) == 1:
+            group.create_dataset(name, data=np.array([[values[0]]], dtype=np.float64))
+            return
+
+        refs = list()
+        for value in values:
+            dataset = references.create_dataset("s" + str(len(references)), data=np.array([[value]], dtype=np.float64))
+            refs.append(dataset.ref)
+        group.create_dataset(name, data=np.array(refs, dtype=h5py.ref_dtype).reshape(len(values), 1))
+
+    def buildSVHN(path, trainImages=200, testImages=50, maxDigits=4, seed=0):
+        """
+        Method to write the extracted archives of SVHN, path/<split>/<split>/<n>.png and the digitStruct.mat of
+        each split in the MATLAB v7.3 HDF5 layout, with the names and boxes of the images stored as references
+
+        path : String -> path given to SVHN, prepareData can run directly on it
+        trainImages : int
+        testImages : int
+        maxDigits : int -> maximum boxes per image
+        seed : int
+        """
+        import h5py
+        from PIL import Image
+
+        generator = np.random.default_rng(seed)
+        for split, numberImages in [("train", trainImages), ("test", testImages)]:
+            pathSplit = os.path.join(path, SyntheticFixtures.svhnSplits[split])
+            os.makedirs(pathSplit, exist_ok=True)
+
+            with h5py.File(os.path.join(pathSplit, "digitStruct.mat"), "w") as f:
+                references = f.create_group("#refs#")
+                digitStruct = f.create_group("digitStruct")
+                boxReferences = list()
+                nameReferences = list()
+                for image in range(numberImages):
+                    height = int(generator.integers(30, 120))
+                    width = int(generator.integers(40, 250))
+                    name = str(image + 1) + ".png"
+                    Image.fromarray(generator.integers(0, 256, (height, width, 3), dtype=np.uint8)).save(os.path.join(pathSplit, name))
+
+                    numberDigits = int(generator.integers(1, maxDigits + 1))
+                    boxGroup = references.create_group("b" + str(image))
+                    boxHeight = generator.integers(10, height + 1, numberDigits)
+                    boxWidth = generator.integers(5, max(width // numberDigits, 6), numberDigits)
+                    fields = {
+                        "height" : boxHeight,
+                        "width" : boxWidth,
+                        "top" : generator.integers(0, height - boxHeight + 1),
+                        "left" : generator.integers(0, width - boxWidth + 1),
+                        "label" : generator.integers(1, 11, numberDigits),
+                    }
+                    for field in list(fields.keys()):
+                        SyntheticFixtures.__writeReferences(boxGroup, field, fields[field].astype(np.float64), references)
+                    boxReferences.append(boxGroup.ref)
+
+                    nameDataset = references.create_dataset("n" + str(image), data=np.array([[ord(c)] for c in name], dtype=np.uint16))
+                    nameReferences.append(nameDataset.ref)
+
+                digitStruct.create_dataset("bbox", data=np.array(boxReferences, dtype=h5py.ref_dtype).reshape(numberImages, 1))
+                digitStruct.create_dataset("name", data=np.array(nameReferences, dtype=h5py.ref_dtype).reshape(numberImages, 1))
+
+    def build(path, scale=1, seed=0):
+        """
+        Method to write the three fixtures in path/numbers, path/omniglot and path/svhn
+
+        path : String
+        scale : int -> multiplies the number of images of every fixture
+        seed : int
+
+        return dict -> {loader : path of its fixture}
+        """
+        paths = {
+            "numbers" : os.path.join(path, "numbers"),
+            "omniglot" : os.path.join(path, "omniglot"),
+            "svhn" : os.path.join(path, "svhn"),
+        }
+        SyntheticFixtures.buildNumbers(paths["numbers"], imagesPerDigit=25 * scale, seed=seed)
+        SyntheticFixtures.buildOmniglot(paths["omniglot"], alphabets=5 * scale, seed=seed)
+        SyntheticFixtures.buildSVHN(paths["svhn"], trainImages=200 * scale, testImages=50 * scale, seed=seed)
+
+        return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic fixtures with the layout of the datasets")
+    parser.add_argument("path", help="folder of the fixtures")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    paths = SyntheticFixtures.build(arguments.path, arguments.scale, arguments.seed)
+    for loader in list(paths.keys()):
+        print(loader + " : " + paths[loader])
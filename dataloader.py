@@ -0,0 +1,198 @@
+import queue
+import pickle
+import asyncio
+import threading
+import traceback
+import multiprocessing
+import numpy as np
+
+class Prefetcher(object):
+    """
+    Class to iterate over batches produced in background by a pool of threads or processes, each worker keeps a
+    bounded queue of ready batches and the batches are delivered round robin over the workers, so the sequence of
+    batches only depends on the seed
+
+    loaderFactory : function -> loaderFactory(seed) returns the object the batches are produced from, it is called
+        once in each worker with the seed of the worker, for example lambda seed: NumbersDataloader(path, seed=seed)
+    produceBatch : function -> produceBatch(loader) returns a batch, for example lambda loader: loader.getRandomBatchSample(32),
+        a batch must not be a buffer reused by the loader, since it is kept in the queue while the next one is produced
+    workers : int -> number of workers
+    queueSize : int -> number of ready batches kept by each worker
+    mode : String -> thread, process. With process the workers are forked, so a shared ImageCache created before is
+        shared with them, the process mode is not available where fork is not
+    seed : int or None -> seed the seeds of the workers are derived from
+    numberBatches : int or None -> number of batches of the iteration, None to iterate forever
+    """
+    def __init__(self, loaderFactory, produceBatch, workers=2, queueSize=2, mode="thread", seed=None, numberBatches=None):
+        if mode not in ["thread", "process"]:
+            raise Exception("Unexpected prefetch mode : " + str(mode))
+        if workers < 1 or queueSize < 1:
+            raise Exception("Workers and queue size must be at least 1")
+
+        self.__workers = workers
+        self.__numberBatches = numberBatches
+        self.__delivered = 0
+        self.__closed = False
+
+        seeds = [int(state.generate_state(1)[0]) for state in np.random.SeedSequence(seed).spawn(workers)]
+
+        if mode == "thread":
+            self.__stopEvent = threading.Event()
+            self.__queues = [queue.Queue(maxsize=queueSize) for _ in range(workers)]
+            createWorker = threading.Thread
+        else:
+            if "fork" not in multiprocessing.get_all_start_methods():
+                raise Exception("The process prefetch mode needs the fork start method of multiprocessing")
+            context = multiprocessing.get_context("fork")
+            self.__stopEvent = context.Event()
+            self.__queues = [context.Queue(maxsize=queueSize) for _ in range(workers)]
+            createWorker = context.Process
+
+        self.__processes = list()
+        for workerIndex in range(workers):
+            worker = createWorker(
+                target=Prefetcher.runWorker,
+                args=(
+                    loaderFactory,
+                    produceBatch,
+                    seeds[workerIndex],
+                    self.__getWorkerBatches(workerIndex),
+                    self.__queues[workerIndex],
+                    self.__stopEvent,
+                    mode == "process",
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self.__processes.append(worker)
+
+    def __getWorkerBatches(self, workerIndex):
+        """
+        Tool to obtain the number of batches a worker produces, None when the iteration is infinite
+
+        workerIndex : int
+        """
+        if self.__numberBatches is None:
+            return None
+
+        return len(range(workerIndex, self.__numberBatches, self.__workers))
+
+    def __put(outputQueue, item, stopEvent):
+        """
+        Tool to put an item in a bounded queue, giving up when the prefetcher is stopped
+
+        return boolean -> false if the prefetcher was stopped
+        """
+        while stopEvent.is_set() is False:
+            try:
+                outputQueue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def runWorker(loaderFactory, produceBatch, seed, numberBatches, outputQueue, stopEvent, pickleErrors):
+        """
+        Method run by each worker, it is not meant to be called directly
+
+        loaderFactory : function
+        produceBatch : function
+        seed : int -> seed of the worker
+        numberBatches : int or None -> batches to produce, None to produce until stopped
+        outputQueue : queue of the worker
+        stopEvent : event set when the prefetcher is closed
+        pickleErrors : boolean -> if true the exceptions that can not be pickled are replaced by a generic one
+        """
+        try:
+            loader = loaderFactory(seed)
+            produced = 0
+            while numberBatches is None or produced < numberBatches:
+                if Prefetcher.__put(outputQueue, ("batch", produceBatch(loader)), stopEvent) is False:
+                    return
+                produced += 1
+        except Exception as error:
+            if pickleErrors:
+                try:
+                    pickle.dumps(error)
+                except Exception:
+                    error = Exception(traceback.format_exc())
+            Prefetcher.__put(outputQueue, ("error", error), stopEvent)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Method to obtain the next batch, it blocks until the batch is ready
+        """
+        if self.__closed or (self.__numberBatches is not None and self.__delivered >= self.__numberBatches):
+            self.close()
+            raise StopIteration
+
+        workerIndex = self.__delivered % self.__workers
+        while(True):
+            try:
+                kind, value = self.__queues[workerIndex].get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self.__processes[workerIndex].is_alive() is False and self.__queues[workerIndex].empty():
+                    self.close()
+                    raise Exception("Prefetch worker " + str(workerIndex) + " stopped without producing a batch")
+
+        if kind == "error":
+            self.close()
+            raise value
+
+        self.__delivered += 1
+        return value
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """
+        Method to obtain the next batch from asyncio code, the wait happens in the default executor so the event loop
+        is not blocked
+        """
+        finished, batch = await asyncio.get_running_loop().run_in_executor(None, self.__nextOrFinished)
+        if finished:
+            raise StopAsyncIteration
+
+        return batch
+
+    def __nextOrFinished(self):
+        """
+        Tool to obtain the next batch without raising StopIteration, which can not be passed through a future
+
+        return finished, batch
+        """
+        try:
+            return False, self.__next__()
+        except StopIteration:
+            return True, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *arguments):
+        self.close()
+
+    def close(self):
+        """
+        Method to stop the workers and release the queues
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__stopEvent.set()
+
+        for workerIndex in range(len(self.__processes)):
+            while(True):
+                try:
+                    self.__queues[workerIndex].get_nowait()
+                except queue.Empty:
+                    break
+            self.__processes[workerIndex].join(timeout=5)
+            if isinstance(self.__processes[workerIndex], threading.Thread) is False and self.__processes[workerIndex].is_alive():
+                self.__processes[workerIndex].terminate()
@@ -0,0 +1,224 @@
+import numpy as np
+
+class Augmentation(object):
+    """
+    Class to augment stacked batches of images with numpy operations over the whole batch, the random parameters
+    of every sample are drawn at once and all the geometric transforms are applied in a single affine warp
+
+    rotation : float -> maximum rotation in degrees
+    shift : float -> maximum translation as a fraction of the size of the images
+    scale : tuple (minimum, maximum) -> range of the zoom factor
+    contrast : float -> maximum relative change of the contrast
+    brightness : float -> maximum change of the brightness in pixel values
+    noise : float -> standard deviation of the gaussian noise in pixel values
+    seed : int, numpy.random.Generator or None
+    """
+    parametersDtype = np.dtype([
+        ("angle", np.float64),
+        ("scale", np.float64),
+        ("shiftY", np.float64),
+        ("shiftX", np.float64),
+        ("contrast", np.float64),
+        ("brightness", np.float64),
+    ])
+
+    def __init__(self, rotation=0.0, shift=0.0, scale=(1.0, 1.0), contrast=0.0, brightness=0.0, noise=0.0, seed=None):
+        if isinstance(seed, np.random.Generator) is False:
+            seed = np.random.default_rng(seed)
+
+        self.__generator = seed
+        self.__rotation = rotation
+        self.__shift = shift
+        self.__scale = scale
+        self.__contrast = contrast
+        self.__brightness = brightness
+        self.__noise = noise
+
+    def sampleParameters(self, batchSize):
+        """
+        Method to draw the random parameters of a batch
+
+        batchSize : int
+
+        return numpy array with dtype parametersDtype (batchSize,) -> angle in radians and shifts as fractions of the size
+        """
+        parameters = np.empty(batchSize, dtype=Augmentation.parametersDtype)
+        draw = lambda limit: self.__generator.uniform(-limit, limit, batchSize)
+        parameters["angle"] = np.deg2rad(draw(self.__rotation))
+        parameters["scale"] = self.__generator.uniform(self.__scale[0], self.__scale[1], batchSize)
+        parameters["shiftY"] = draw(self.__shift)
+        parameters["shiftX"] = draw(self.__shift)
+        parameters["contrast"] = 1.0 + draw(self.__contrast)
+        parameters["brightness"] = draw(self.__brightness)
+
+        return parameters
+
+    def getMatrices(parameters, shape):
+        """
+        Method to obtain the affine matrices of the parameters, the images are rotated and scaled around their center
+
+        parameters : numpy array with dtype parametersDtype
+        shape : tuple (height, width)
+
+        return numpy array (len(parameters), 3, 3) -> maps (row, column, 1) of the source to the augmented image
+        """
+        center = np.array([(shape[0] - 1) / 2.0, (shape[1] - 1) / 2.0])
+        cos = np.cos(parameters["angle"]) * parameters["scale"]
+        sin = np.sin(parameters["angle"]) * parameters["scale"]
+
+        matrices = np.zeros((len(parameters), 3, 3))
+        matrices[:, 0, 0] = cos
+        matrices[:, 0, 1] = -sin
+        matrices[:, 1, 0] = sin
+        matrices[:, 1, 1] = cos
+        matrices[:, 0, 2] = center[0] - cos * center[0] + sin * center[1] + parameters["shiftY"] * shape[0]
+        matrices[:, 1, 2] = center[1] - sin * center[0] - cos * center[1] + parameters["shiftX"] * shape[1]
+        matrices[:, 2, 2] = 1.0
+
+        return matrices
+
+    def warp(images, matrices):
+        """
+        Method to apply an affine transform to each image of a batch with a bilinear interpolation computed for the
+        whole batch at once, the pixels coming from outside the images are 0
+
+        images : numpy array (batchSize, height, width) or (batchSize, height, width, channels)
+        matrices : numpy array (batchSize, 3, 3) -> maps the source to the warped image
+
+        return numpy array float32 with the shape of images
+        """
+        batchSize, height, width = images.shape[:3]
+        inverse = np.linalg.inv(matrices).astype(np.float32)
+        rows, columns = np.mgrid[0:height, 0:width].astype(np.float32)
+
+        sourceRows = inverse[:, 0, 0, None, None] * rows + inverse[:, 0, 1, None, None] * columns + inverse[:, 0, 2, None, None]
+        sourceColumns = inverse[:, 1, 0, None, None] * rows + inverse[:, 1, 1, None, None] * columns + inverse[:, 1, 2, None, None]
+
+        padding = ((0, 0), (1, 1), (1, 1)) + ((0, 0),) * (images.ndim - 3)
+        padded = np.pad(images.astype(np.float32, copy=False), padding)
+
+        rows0 = np.floor(sourceRows)
+        columns0 = np.floor(sourceColumns)
+        weightsY = sourceRows - rows0
+        weightsX = sourceColumns - columns0
+        if images.ndim == 4:
+            weightsY = weightsY[..., None]
+            weightsX = weightsX[..., None]
+
+        # Flat indexes into the padded batch, a single take per corner is much faster than 3 broadcast index arrays
+        batch = (np.arange(batchSize, dtype=np.int64) * (height + 2))[:, None, None]
+        rows1 = (batch + np.clip(rows0 + 1, -1, height).astype(np.int64) + 1) * (width + 2)
+        rows0 = (batch + np.clip(rows0, -1, height).astype(np.int64) + 1) * (width + 2)
+        columns1 = np.clip(columns0 + 1, -1, width).astype(np.int64) + 1
+        columns0 = np.clip(columns0, -1, width).astype(np.int64) + 1
+        padded = padded.reshape((-1,) + images.shape[3:])
+
+        def interpolate(first, second, weights):
+            second -= first
+            second *= weights
+            first += second
+            return first
+
+        top = interpolate(np.take(padded, rows0 + columns0, axis=0), np.take(padded, rows0 + columns1, axis=0), weightsX)
+        bottom = interpolate(np.take(padded, rows1 + columns0, axis=0), np.take(padded, rows1 + columns1, axis=0), weightsX)
+
+        return interpolate(top, bottom, weightsY)
+
+    def transformBoxes(boxes, counts, matrices, shape):
+        """
+        Method to transform boxes with the affine matrices of their images, each box becomes the bounding box of
+        its transformed corners clipped to the image
+
+        boxes : numpy array (batchSize, maxBoxes, 4) -> top, left, height, width
+        counts : numpy array (batchSize,) -> number of boxes of each image, the rest are padding
+        matrices : numpy array (batchSize, 3, 3)
+        shape : tuple (height, width)
+
+        return numpy array float32 (batchSize, maxBoxes, 4)
+        """
+        top, left, height, width = [boxes[:, :, field].astype(np.float64) for field in range(4)]
+        cornersY = np.stack([top, top, top + height, top + height], axis=-1)
+        cornersX = np.stack([left, left + width, left, left + width], axis=-1)
+
+        matrices = matrices[:, None, None]
+        rows = matrices[..., 0, 0] * cornersY + matrices[..., 0, 1] * cornersX + matrices[..., 0, 2]
+        columns = matrices[..., 1, 0] * cornersY + matrices[..., 1, 1] * cornersX + matrices[..., 1, 2]
+
+        top = np.clip(rows.min(axis=-1), 0, shape[0])
+        left = np.clip(columns.min(axis=-1), 0, shape[1])
+        bottom = np.clip(rows.max(axis=-1), 0, shape[0])
+        right = np.clip(columns.max(axis=-1), 0, shape[1])
+
+        transformed = np.stack([top, left, bottom - top, right - left], axis=-1).astype(np.float32)
+        transformed[np.arange(boxes.shape[1])[None, :] >= np.asarray(counts)[:, None]] = 0
+
+        return transformed
+
+    def apply(self, images, parameters=None, out=None):
+        """
+        Method to augment a stacked batch of images
+
+        images : numpy array uint8 or float (batchSize, height, width) or (batchSize, height, width, channels)
+        parameters : numpy array with dtype parametersDtype or None -> drawn when None
+        out : numpy array or None -> array the augmented images are written into, it can be images
+
+        return images, parameters -> the augmented images have the dtype of images
+        """
+        if parameters is None:
+            parameters = self.sampleParameters(len(images))
+
+        augmented = Augmentation.warp(images, Augmentation.getMatrices(parameters, images.shape[1:3]))
+
+        axes = tuple(range(1, augmented.ndim))
+        shape = (len(images),) + (1,) * (augmented.ndim - 1)
+        means = augmented.mean(axis=axes, keepdims=True)
+        augmented -= means
+        augmented *= parameters["contrast"].astype(np.float32).reshape(shape)
+        augmented += means + parameters["brightness"].astype(np.float32).reshape(shape)
+        if self.__noise > 0:
+            augmented += self.__generator.standard_normal(augmented.shape, dtype=np.float32) * np.float32(self.__noise)
+
+        if out is None:
+            out = np.empty(images.shape, dtype=images.dtype)
+        if np.issubdtype(out.dtype, np.integer):
+            info = np.iinfo(out.dtype)
+            np.clip(np.rint(augmented, out=augmented), info.min, info.max, out=augmented)
+        out[...] = augmented
+
+        return out, parameters
+
+    def applyPairs(self, images1, images2, labels, inPlace=False):
+        """
+        Method to augment a stacked batch of pairs, each side of a pair is augmented with its own parameters
+
+        images1 : numpy array
+        images2 : numpy array
+        labels : numpy array
+        inPlace : boolean -> if true the images are written into images1 and images2
+
+        return images1, images2, labels
+        """
+        images1, _ = self.apply(images1, out=images1 if inPlace else None)
+        images2, _ = self.apply(images2, out=images2 if inPlace else None)
+
+        return images1, images2, labels
+
+    def applyBoxes(self, batch):
+        """
+        Method to augment a batch with boxes as returned by SVHN.getBatch, the images, masks and boxes are
+        transformed with the same parameters
+
+        batch : dict -> images, masks, boxes and boxCounts
+
+        return dict -> a new batch with the same keys
+        """
+        images = batch["images"]
+        parameters = self.sampleParameters(len(images))
+        matrices = Augmentation.getMatrices(parameters, images.shape[1:3])
+
+        augmented = dict(batch)
+        augmented["images"], _ = self.apply(images, parameters)
+        augmented["masks"] = Augmentation.warp(batch["masks"].astype(np.float32), matrices) >= 0.5
+        augmented["boxes"] = Augmentation.transformBoxes(batch["boxes"], batch["boxCounts"], matrices, images.shape[1:3])
+
+        return augmented
@@ -0,0 +1,111 @@
+import numpy as np
+
+class BatchBuffer(object):
+    """
+    Class to write batches of image pairs into preallocated contiguous arrays, the arrays are reused by the
+    next batch with the same shape so the batches returned are overwritten by the following call
+
+    pin : boolean -> if true and torch is installed the arrays are allocated in pinned memory, so they can be
+        copied to the gpu asynchronously with torch.from_numpy(array).cuda(non_blocking=True)
+    """
+    def __init__(self, pin=False):
+        self.__pin = pin
+        self.__buffers = dict()
+
+    def __allocate(self, shape, dtype):
+        """
+        Tool to allocate an array, in pinned memory when requested and possible
+
+        return array, tensor -> tensor is the torch tensor owning the memory or None
+        """
+        if self.__pin:
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    tensor = torch.from_numpy(np.empty(shape, dtype=dtype)).pin_memory()
+                    return tensor.numpy(), tensor
+            except ImportError:
+                pass
+
+        return np.empty(shape, dtype=dtype), None
+
+    def get(self, name, shape, dtype):
+        """
+        Method to obtain the buffer of a name, it is allocated again only when the shape or dtype change
+
+        name : String
+        shape : tuple
+        dtype : numpy dtype
+        """
+        dtype = np.dtype(dtype)
+        if name not in self.__buffers or self.__buffers[name]["array"].shape != shape or self.__buffers[name]["array"].dtype != dtype:
+            array, tensor = self.__allocate(shape, dtype)
+            self.__buffers.update({
+                name : {
+                    "array" : array,
+                    "tensor" : tensor,
+                }
+            })
+
+        return self.__buffers[name]["array"]
+
+    def stackPairs(self, indexes1, indexes2, labels, readImage, dtype, out=None):
+        """
+        Method to write the images of a batch of pairs into arrays (batchSize, height, width) and the labels into
+        an array (batchSize,)
+
+        indexes1 : numpy array -> samples of the first side
+        indexes2 : numpy array -> samples of the second side
+        labels : numpy array
+        readImage : function -> readImage(index, out) writes the image of a sample into out, with out None it returns
+            the image, all the images must have the same shape
+        dtype : numpy dtype of the images
+        out : tuple or None -> (images1, images2, labels) arrays to write into instead of the reused buffers
+
+        return images1, images2, labels
+        """
+        if len(labels) == 0:
+            return np.empty((0, 0, 0), dtype=dtype), np.empty((0, 0, 0), dtype=dtype), np.empty(0, dtype=np.float32)
+
+        first = np.asarray(readImage(indexes1[0], None))
+        shape = (len(labels),) + first.shape
+
+        if out is None:
+            images1 = self.get("images1", shape, dtype)
+            images2 = self.get("images2", shape, dtype)
+            batchLabels = self.get("labels", (len(labels),), np.float32)
+        else:
+            images1, images2, batchLabels = out
+            if images1.shape != shape or images2.shape != shape or batchLabels.shape != (len(labels),):
+                raise Exception("Unexpected shape of the out arrays, expected " + str(shape) + " and " + str((len(labels),)))
+
+        images1[0] = first
+        for position in range(1, len(indexes1)):
+            readImage(indexes1[position], images1[position])
+        for position in range(len(indexes2)):
+            readImage(indexes2[position], images2[position])
+        batchLabels[:] = labels
+
+        return images1, images2, batchLabels
+
+    def stackImages(self, name, indexes, readImage, dtype):
+        """
+        Method to write the images of some samples into the array (len(indexes), height, width) of a name
+
+        name : String -> name of the reused buffer
+        indexes : numpy array -> samples
+        readImage : function -> readImage(index, out) as for stackPairs
+        dtype : numpy dtype of the images
+
+        return numpy array
+        """
+        if len(indexes) == 0:
+            return np.empty((0, 0, 0), dtype=dtype)
+
+        first = np.asarray(readImage(indexes[0], None))
+        images = self.get(name, (len(indexes),) + first.shape, dtype)
+        images[0] = first
+        for position in range(1, len(indexes)):
+            readImage(indexes[position], images[position])
+
+        return images
@@ -0,0 +1,474 @@
+import os
+import socket
+import struct
+import json
+import argparse
+import threading
+import socketserver
+import concurrent.futures
+import numpy as np
+from ai_dataloader.dataset.imageCache import ImageCache
+
+class DatasetServer(object):
+    """
+    Class to serve the samples of a dataset to the training processes of a host, a single server process decodes
+    the images and the clients read them from memory mapped files, so there is one copy of the decoded data per
+    host and the clients never decode. The clients request batches over a unix socket and receive the offsets of
+    the images in the mapped files instead of the images
+
+    The decoded images are appended to the store file until it is full and are never moved nor evicted, since the
+    clients read them at their offsets after the response, so the store keeps the first storeBytes of images decoded.
+    The images that do not fit are kept in an in memory cache of overflowBytes evicting the least recently used, and
+    are written into a scratch file of the connection, only valid until its next request. A sample requested while it
+    is being decoded is decoded once. With pathServer in /dev/shm the files are kept in memory
+
+    pathServer : String -> folder of the socket and the mapped files
+    getSample : function -> getSample(index) returning image, target with image a numpy array and target json serializable
+    numberSamples : int
+    storeBytes : int -> size of the store file
+    scratchBytes : int -> size of the scratch file of each connection, the maximum bytes of the images of a batch
+        that are not in the store
+    workers : int -> threads decoding the images
+    overflowBytes : int -> budget of the cache of the decoded images that do not fit in the store, uint8 and float32
+        images are cached
+    """
+    socketFile = "server.sock"
+    storeFile = "store.bin"
+    alignment = 64
+
+    def __init__(self, pathServer, getSample, numberSamples, storeBytes=2**30, scratchBytes=64 * 2**20, workers=4, overflowBytes=256 * 2**20):
+        if os.path.exists(pathServer) is False:
+            os.makedirs(pathServer)
+
+        self.__pathServer = pathServer
+        self.__getSample = getSample
+        self.__numberSamples = numberSamples
+        self.__storeBytes = int(storeBytes)
+        self.__scratchBytes = int(scratchBytes)
+
+        self.__storePath = os.path.join(pathServer, DatasetServer.storeFile)
+        with open(self.__storePath, "wb") as f:
+            f.truncate(self.__storeBytes)
+        self.__store = np.memmap(self.__storePath, dtype=np.uint8, mode="r+") if self.__storeBytes > 0 else None
+        self.__storeUsed = 0
+        self.__entries = dict()
+        self.__overflow = ImageCache(overflowBytes)
+        self.__overflowEntries = dict()
+        self.__decoding = dict()
+        self.__lock = threading.Lock()
+        self.__connections = 0
+        self.__counters = {
+            "requests" : 0,
+            "samples" : 0,
+            "decoded" : 0,
+            "stored" : 0,
+            "overflowHits" : 0,
+        }
+
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        socketPath = os.path.join(pathServer, DatasetServer.socketFile)
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        self.__server = socketserver.ThreadingUnixStreamServer(socketPath, DatasetRequestHandler)
+        self.__server.daemon_threads = True
+        self.__server.datasetServer = self
+        self.__thread = None
+
+    def forSVHN(pathServer, svhn, dataset="train", **arguments):
+        """
+        Method to create the server of a split of SVHN, the targets are the ground truth dicts
+
+        pathServer : String
+        svhn : SVHN -> with prepared data
+        dataset : String -> train, test
+        arguments : other arguments of DatasetServer
+        """
+        from ai_dataloader.dataset.svhnIndex import SVHNIndex
+
+        def getSample(index):
+            image, groundTruth = svhn.getSample(index, dataset)
+            if isinstance(groundTruth, dict) is False:
+                groundTruth = SVHNIndex.boxesToDict(groundTruth)
+            return image, groundTruth
+
+        return DatasetServer(pathServer, getSample, svhn.getDatasetSize(dataset), **arguments)
+
+    def forOmniglot(pathServer, loader, **arguments):
+        """
+        Method to create the server of Omniglot, the targets are the labels
+
+        pathServer : String
+        loader : OmniglotDataloader
+        arguments : other arguments of DatasetServer
+        """
+        return DatasetServer(pathServer, loader.getSample, len(loader.getLabels()), **arguments)
+
+    def send(connection, message):
+        """
+        Method to send a message, a json document preceded by its length
+
+        connection : socket.socket
+        message : dict
+        """
+        payload = json.dumps(message).encode("utf-8")
+        connection.sendall(struct.pack(">I", len(payload)) + payload)
+
+    def __receiveExactly(connection, size):
+        """
+        Tool to receive size bytes, None when the connection is closed before the first byte
+        """
+        chunks = list()
+        received = 0
+        while received < size:
+            chunk = connection.recv(size - received)
+            if len(chunk) == 0:
+                if received == 0:
+                    return None
+                raise Exception("Connection closed in the middle of a message")
+            chunks.append(chunk)
+            received += len(chunk)
+
+        return b"".join(chunks)
+
+    def receive(connection):
+        """
+        Method to receive a message sent with send
+
+        connection : socket.socket
+
+        return dict or None if the connection was closed
+        """
+        header = DatasetServer.__receiveExactly(connection, 4)
+        if header is None:
+            return None
+
+        return json.loads(DatasetServer.__receiveExactly(connection, struct.unpack(">I", header)[0]).decode("utf-8"))
+
+    def __align(offset):
+        """
+        Tool to round an offset up to the alignment of the images
+        """
+        return (offset + DatasetServer.alignment - 1) // DatasetServer.alignment * DatasetServer.alignment
+
+    def __decodeSample(self, index):
+        """
+        Tool to decode a sample and append it to the store when it fits, otherwise it is kept in the overflow cache
+
+        return entry, image -> memory, offset, shape, dtype and target, with memory None the image to write in the scratch
+        """
+        try:
+            image, target = self.__getSample(index)
+            image = np.ascontiguousarray(image)
+
+            with self.__lock:
+                self.__counters["decoded"] += 1
+                offset = DatasetServer.__align(self.__storeUsed)
+                entry = {
+                    "memory" : None,
+                    "offset" : 0,
+                    "shape" : list(image.shape),
+                    "dtype" : image.dtype.str,
+                    "target" : target,
+                }
+                if offset + image.nbytes > self.__storeBytes:
+                    if image.dtype in ImageCache.dtypes:
+                        self.__overflow.put(index, image)
+                        self.__overflowEntries[index] = entry
+                    return entry, image
+
+                self.__storeUsed = offset + image.nbytes
+                entry["memory"] = "store"
+                entry["offset"] = offset
+                self.__store[offset:offset + image.nbytes] = image.reshape(-1).view(np.uint8)
+                self.__entries[index] = entry
+                self.__counters["stored"] += 1
+
+            return entry, None
+        finally:
+            with self.__lock:
+                self.__decoding.pop(index, None)
+
+    def __getBatch(self, indices, scratch):
+        """
+        Tool to obtain the entries of a batch, the samples neither in the store nor in the overflow cache are decoded,
+        the decode of a sample already requested by another connection is awaited instead of repeated
+        """
+        for index in indices:
+            if index < 0 or index >= self.__numberSamples:
+                raise Exception("Sample index out of range : " + str(index))
+
+        found = dict()
+        futures = dict()
+        with self.__lock:
+            for index in sorted(set(indices)):
+                if index in self.__entries:
+                    found[index] = (self.__entries[index], None)
+                    continue
+
+                image = self.__overflow.get(index) if index in self.__overflowEntries else None
+                if image is not None:
+                    self.__counters["overflowHits"] += 1
+                    found[index] = (self.__overflowEntries[index], image)
+                    continue
+
+                future = self.__decoding.get(index)
+                if future is None:
+                    future = self.__executor.submit(self.__decodeSample, index)
+                    self.__decoding[index] = future
+                futures[index] = future
+
+        for index in list(futures.keys()):
+            found[index] = futures[index].result()
+
+        scratchUsed = 0
+        batch = list()
+        for index in indices:
+            entry, image = found[index]
+            if image is not None:
+                offset = DatasetServer.__align(scratchUsed)
+                if offset + image.nbytes > self.__scratchBytes:
+                    raise Exception("The images of the batch not in the store exceed the scratch of " + str(self.__scratchBytes) + " bytes")
+                scratch[offset:offset + image.nbytes] = image.reshape(-1).view(np.uint8)
+                scratchUsed = offset + image.nbytes
+                entry = dict(entry)
+                entry["memory"] = "scratch"
+                entry["offset"] = offset
+            batch.append(entry)
+
+        return batch
+
+    def handleConnection(self, connection):
+        """
+        Method to answer the requests of a client until it disconnects, used by the request handler
+
+        connection : socket.socket
+        """
+        with self.__lock:
+            self.__connections += 1
+            scratchPath = os.path.join(self.__pathServer, "scratch" + str(self.__connections) + ".bin")
+        with open(scratchPath, "wb") as f:
+            f.truncate(max(self.__scratchBytes, 1))
+        scratch = np.memmap(scratchPath, dtype=np.uint8, mode="r+")
+
+        try:
+            while True:
+                request = DatasetServer.receive(connection)
+                if request is None:
+                    break
+
+                try:
+                    if request["command"] == "info":
+                        response = {
+                            "numberSamples" : self.__numberSamples,
+                            "storeFile" : os.path.abspath(self.__storePath),
+                            "scratchFile" : os.path.abspath(scratchPath),
+                        }
+                    elif request["command"] == "getBatch":
+                        indices = [int(index) for index in request["indices"]]
+                        response = {
+                            "samples" : self.__getBatch(indices, scratch),
+                        }
+                        with self.__lock:
+                            self.__counters["requests"] += 1
+                            self.__counters["samples"] += len(indices)
+                    elif request["command"] == "counters":
+                        response = self.getCounters()
+                    else:
+                        raise Exception("Unexpected command : " + str(request["command"]))
+                except Exception as error:
+                    response = {
+                        "error" : str(error),
+                    }
+
+                DatasetServer.send(connection, response)
+        finally:
+            del scratch
+            os.remove(scratchPath)
+
+    def getCounters(self):
+        """
+        Method to obtain the counters of the server
+
+        return dict -> requests, samples served, samples decoded, samples stored, overflowHits, storeBytes used
+        """
+        with self.__lock:
+            counters = dict(self.__counters)
+            counters["storeBytes"] = self.__storeUsed
+
+        return counters
+
+    def start(self):
+        """
+        Method to serve the clients from a background thread
+        """
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def serveForever(self):
+        """
+        Method to serve the clients from the calling thread until close is called from another thread
+        """
+        self.__server.serve_forever()
+
+    def close(self):
+        """
+        Method to stop the server and remove its socket and store file
+        """
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        self.__executor.shutdown()
+
+        socketPath = os.path.join(self.__pathServer, DatasetServer.socketFile)
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        self.__store = None
+        if os.path.exists(self.__storePath):
+            os.remove(self.__storePath)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exceptionType, exception, traceback):
+        self.close()
+
+class DatasetRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Handler of the connections of a DatasetServer
+    """
+    def handle(self):
+        self.server.datasetServer.handleConnection(self.request)
+
+class DatasetClient(object):
+    """
+    Class to obtain samples from a DatasetServer of the same host, the images are read only views of the files
+    mapped by the server
+
+    pathServer : String -> folder of the server
+    """
+    def __init__(self, pathServer):
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__socket.connect(os.path.join(pathServer, DatasetServer.socketFile))
+
+        info = self.__request({
+            "command" : "info",
+        })
+        self.__numberSamples = info["numberSamples"]
+        self.__memories = {
+            "store" : DatasetClient.__mapFile(info["storeFile"]),
+            "scratch" : DatasetClient.__mapFile(info["scratchFile"]),
+        }
+
+    def __mapFile(pathFile):
+        """
+        Tool to map a file of the server
+        """
+        if os.path.getsize(pathFile) == 0:
+            return np.zeros(0, dtype=np.uint8)
+
+        return np.memmap(pathFile, dtype=np.uint8, mode="r")
+
+    def __request(self, message):
+        """
+        Tool to send a request and receive its response
+        """
+        DatasetServer.send(self.__socket, message)
+        response = DatasetServer.receive(self.__socket)
+        if response is None:
+            raise Exception("The dataset server closed the connection")
+        if "error" in response:
+            raise Exception("Dataset server error : " + response["error"])
+
+        return response
+
+    def __len__(self):
+        return self.__numberSamples
+
+    def getBatch(self, indices, copy=False):
+        """
+        Method to obtain the samples of some indexes
+
+        indices : list or numpy array of int
+        copy : boolean -> if false the images are views of the mapped files, the images that were not in the store
+            of the server are overwritten by the next request of this client
+
+        return images, targets -> lists
+        """
+        response = self.__request({
+            "command" : "getBatch",
+            "indices" : [int(index) for index in indices],
+        })
+
+        images = list()
+        targets = list()
+        for sample in response["samples"]:
+            dtype = np.dtype(sample["dtype"])
+            size = int(np.prod(sample["shape"])) * dtype.itemsize
+            memory = self.__memories[sample["memory"]]
+            image = memory[sample["offset"]:sample["offset"] + size].view(dtype).reshape(sample["shape"])
+            images.append(np.array(image) if copy else image)
+            targets.append(sample["target"])
+
+        return images, targets
+
+    def getSample(self, index, copy=False):
+        """
+        Method to obtain a sample
+
+        index : int
+        copy : boolean -> as for getBatch
+
+        return image, target
+        """
+        images, targets = self.getBatch([index], copy)
+
+        return images[0], targets[0]
+
+    def getCounters(self):
+        """
+        Method to obtain the counters of the server
+        """
+        return self.__request({
+            "command" : "counters",
+        })
+
+    def close(self):
+        """
+        Method to disconnect from the server
+        """
+        self.__socket.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a dataset to the training processes of the host")
+    parser.add_argument("loader", choices=["svhn", "omniglot"])
+    parser.add_argument("pathData", help="path of the data of the loader")
+    parser.add_argument("pathServer", help="folder of the socket and the mapped files, for example in /dev/shm")
+    parser.add_argument("--dataset", default="train", help="split of svhn")
+    parser.add_argument("--storeBytes", type=int, default=2**30)
+    parser.add_argument("--scratchBytes", type=int, default=64 * 2**20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--overflowBytes", type=int, default=256 * 2**20)
+    arguments = parser.parse_args()
+
+    serverArguments = {
+        "storeBytes" : arguments.storeBytes,
+        "scratchBytes" : arguments.scratchBytes,
+        "workers" : arguments.workers,
+        "overflowBytes" : arguments.overflowBytes,
+    }
+    if arguments.loader == "svhn":
+        from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+        server = DatasetServer.forSVHN(arguments.pathServer, SVHN(arguments.pathData), arguments.dataset, **serverArguments)
+    else:
+        from ai_dataloader.dataset.omniglot import OmniglotDataloader
+        server = DatasetServer.forOmniglot(arguments.pathServer, OmniglotDataloader(arguments.pathData), **serverArguments)
+
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
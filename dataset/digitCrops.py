@@ -0,0 +1,265 @@
+import os
+import numpy as np
+from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+from ai_dataloader.jsonHandler.arrayHandler import ArrayHandler
+from ai_dataloader.dataset.imageStore import ImageStore
+
+class DigitCrops(object):
+    """
+    Class to serve the crops of the digit boxes of a dataset, the crops are stored in a single contiguous uint8
+    file (numberCrops, size, size, 3) and each crop is returned as a zero copy view of the memory mapped file
+
+    cropPath : String -> folder of the crops, created with DigitCrops.build
+    """
+    version = 1
+    channels = 3
+
+    cropsFile = "crops.bin"
+    labelsFile = "cropsLabels.npy"
+    sourcesFile = "cropsSources.npy"
+    metadataFile = "digitCrops.json"
+
+    def __init__(self, cropPath):
+        self.__metadata = JsonHandler.loadJson(os.path.join(cropPath, DigitCrops.metadataFile))
+        if self.__metadata["version"] != DigitCrops.version:
+            raise Exception("Unexpected digit crops version : " + str(self.__metadata["version"]))
+
+        self.__labels = np.load(os.path.join(cropPath, DigitCrops.labelsFile))
+        self.__sources = np.load(os.path.join(cropPath, DigitCrops.sourcesFile))
+        shape = (self.__metadata["numberCrops"], self.__metadata["size"], self.__metadata["size"], DigitCrops.channels)
+        if self.__metadata["numberCrops"] > 0:
+            self.__crops = np.memmap(os.path.join(cropPath, DigitCrops.cropsFile), dtype=np.uint8, mode="r", shape=shape)
+        else:
+            self.__crops = np.zeros(shape, dtype=np.uint8)
+
+    def isAvailable(cropPath, margin, square, size):
+        """
+        Method to check if there are complete crops of the current version built with the given parameters
+
+        cropPath : String
+        margin : float
+        square : boolean
+        size : int
+        """
+        metadataPath = os.path.join(cropPath, DigitCrops.metadataFile)
+        if os.path.exists(metadataPath) is False:
+            return False
+
+        metadata = JsonHandler.loadJson(metadataPath)
+        return (
+            metadata["version"] == DigitCrops.version
+            and metadata["margin"] == margin
+            and metadata["square"] == square
+            and metadata["size"] == size
+        )
+
+    def __len__(self):
+        return len(self.__labels)
+
+    def getMetadata(self):
+        """
+        Method to obtain the metadata of the crops
+        """
+        return self.__metadata
+
+    def get(self, index):
+        """
+        Method to obtain a crop
+
+        index : int
+
+        return numpy array uint8 (size, size, 3), a read only view of the crops file
+        """
+        return self.__crops[index]
+
+    def getCrops(self):
+        """
+        Method to obtain all the crops as a read only memory mapped array (numberCrops, size, size, 3)
+        """
+        return self.__crops
+
+    def getLabel(self, index):
+        """
+        Method to obtain the label of a crop
+
+        index : int
+        """
+        return int(self.__labels[index])
+
+    def getLabels(self):
+        """
+        Method to obtain the label of every crop
+
+        return numpy array int32
+        """
+        return self.__labels
+
+    def getSources(self):
+        """
+        Method to obtain the index of the image each crop was cut from
+
+        return numpy array int32
+        """
+        return self.__sources
+
+    def getWindows(boxes, margin, square):
+        """
+        Method to obtain the windows cut around the boxes, each box is grown by margin times its size on every side
+        and with square the shorter side is grown to the longer one, keeping the center of the box
+
+        boxes : numpy array with the fields top, left, height and width
+        margin : float
+        square : boolean
+
+        return numpy array float64 (len(boxes), 4) -> top, left, height, width
+        """
+        heights = boxes["height"].astype(np.float64) * (1.0 + 2.0 * margin)
+        widths = boxes["width"].astype(np.float64) * (1.0 + 2.0 * margin)
+        if square:
+            heights = widths = np.maximum(heights, widths)
+
+        centersY = boxes["top"] + boxes["height"] / 2.0
+        centersX = boxes["left"] + boxes["width"] / 2.0
+
+        return np.stack([centersY - heights / 2.0, centersX - widths / 2.0, heights, widths], axis=1)
+
+    def resizeWindows(image, windows, size):
+        """
+        Method to cut and resize windows of an image with a bilinear interpolation computed for all the windows
+        at once, the pixels outside the image are 0
+
+        image : numpy array uint8 (height, width) or (height, width, channels)
+        windows : numpy array (numberWindows, 4) -> top, left, height, width
+        size : int
+
+        return numpy array uint8 (numberWindows, size, size, 3)
+        """
+        if image.ndim == 2:
+            image = image[:, :, None]
+        image = np.broadcast_to(image[:, :, :DigitCrops.channels], image.shape[:2] + (DigitCrops.channels,))
+        padded = np.pad(image.astype(np.float32), ((1, 1), (1, 1), (0, 0)))
+
+        steps = (np.arange(size) + 0.5) / size
+        rows = windows[:, 0:1] + steps * windows[:, 2:3] - 0.5
+        columns = windows[:, 1:2] + steps * windows[:, 3:4] - 0.5
+
+        rows0 = np.floor(rows)
+        columns0 = np.floor(columns)
+        weightsY = (rows - rows0).astype(np.float32)[:, :, None, None]
+        weightsX = (columns - columns0).astype(np.float32)[:, None, :, None]
+
+        rows1 = np.clip(rows0 + 1, -1, image.shape[0]).astype(np.int64)[:, :, None] + 1
+        rows0 = np.clip(rows0, -1, image.shape[0]).astype(np.int64)[:, :, None] + 1
+        columns1 = np.clip(columns0 + 1, -1, image.shape[1]).astype(np.int64)[:, None, :] + 1
+        columns0 = np.clip(columns0, -1, image.shape[1]).astype(np.int64)[:, None, :] + 1
+
+        top = padded[rows0, columns0] * (1 - weightsX) + padded[rows0, columns1] * weightsX
+        bottom = padded[rows1, columns0] * (1 - weightsX) + padded[rows1, columns1] * weightsX
+
+        return np.clip(np.rint(top * (1 - weightsY) + bottom * weightsY), 0, 255).astype(np.uint8)
+
+    def cropInto(cropPath, imageFiles, storePath, firstImage, boxes, offsets, margin, square, size):
+        """
+        Method to cut the crops of a chunk of images into the crops file of crops being built, the crops are written
+        in place so the chunks can be processed by different processes
+
+        cropPath : String
+        imageFiles : list of String -> images of the chunk
+        storePath : String or None -> image store the images are read from instead of decoding the files
+        firstImage : int -> index of the first image of the chunk
+        boxes : numpy array -> boxes of the images of the chunk
+        offsets : numpy array (len(imageFiles) + 1,) -> the boxes of image i are the crops offsets[i]:offsets[i + 1]
+        margin : float
+        square : boolean
+        size : int
+        """
+        from PIL import Image
+
+        numberCrops = os.path.getsize(os.path.join(cropPath, DigitCrops.cropsFile)) // (size * size * DigitCrops.channels)
+        crops = np.memmap(
+            os.path.join(cropPath, DigitCrops.cropsFile),
+            dtype=np.uint8,
+            mode="r+",
+            shape=(numberCrops, size, size, DigitCrops.channels),
+        )
+        store = ImageStore(storePath) if storePath is not None else None
+
+        windows = DigitCrops.getWindows(boxes, margin, square)
+        for index in range(len(imageFiles)):
+            start = offsets[index] - offsets[0]
+            stop = offsets[index + 1] - offsets[0]
+            if stop == start:
+                continue
+
+            if store is not None:
+                image = store.get(firstImage + index)
+            else:
+                image = np.asarray(Image.open(imageFiles[index]))
+            crops[offsets[index]:offsets[index + 1]] = DigitCrops.resizeWindows(image, windows[start:stop], size)
+
+        crops.flush()
+        del crops
+
+    def build(cropPath, imageFiles, tables, storePath=None, margin=0.15, square=True, size=32, submit=None, chunkSize=1024):
+        """
+        Method to cut every digit box of a dataset into crops, the metadata is written last so an interrupted
+        build is not taken as complete crops
+
+        cropPath : String
+        imageFiles : list of String -> images in the order of their index
+        tables : dict -> boxes and offsets of the images, as returned by SVHNIndex
+        storePath : String or None -> image store of the images, used instead of decoding the files when given
+        margin : float -> fraction of the size of a box added on every side
+        square : boolean -> if true the windows are squares around the center of the boxes
+        size : int -> size of the crops
+        submit : function or None -> submit(function, *arguments) returning a concurrent.futures.Future, used to
+            process the chunks in other processes, when None the crops are cut in the calling process
+        chunkSize : int -> images per chunk
+        """
+        if os.path.exists(cropPath) is False:
+            os.makedirs(cropPath)
+        metadataPath = os.path.join(cropPath, DigitCrops.metadataFile)
+        if os.path.exists(metadataPath):
+            os.remove(metadataPath)
+
+        offsets = np.asarray(tables["offsets"], dtype=np.int64)
+        boxes = tables["boxes"]
+        numberImages = min(len(imageFiles), len(offsets) - 1)
+        numberCrops = int(offsets[numberImages])
+
+        with open(os.path.join(cropPath, DigitCrops.cropsFile), "wb") as f:
+            f.truncate(numberCrops * size * size * DigitCrops.channels)
+
+        arguments = list()
+        for start in range(0, numberImages, chunkSize):
+            stop = min(start + chunkSize, numberImages)
+            arguments.append((
+                cropPath,
+                imageFiles[start:stop],
+                storePath,
+                start,
+                np.array(boxes[offsets[start]:offsets[stop]]),
+                offsets[start:stop + 1],
+                margin,
+                square,
+                size,
+            ))
+
+        if submit is None:
+            for chunkArguments in arguments:
+                DigitCrops.cropInto(*chunkArguments)
+        else:
+            futures = [submit(DigitCrops.cropInto, *chunkArguments) for chunkArguments in arguments]
+            for future in futures:
+                future.result()
+
+        ArrayHandler.saveArray(os.path.join(cropPath, DigitCrops.labelsFile), np.asarray(boxes["label"][:numberCrops], dtype=np.int32))
+        ArrayHandler.saveArray(os.path.join(cropPath, DigitCrops.sourcesFile), np.asarray(boxes["imageId"][:numberCrops], dtype=np.int32))
+
+        JsonHandler.saveJson(metadataPath, {
+            "version" : DigitCrops.version,
+            "numberCrops" : numberCrops,
+            "size" : size,
+            "margin" : margin,
+            "square" : square,
+        })
@@ -0,0 +1,253 @@
+import os
+import hashlib
+import shutil
+import concurrent.futures
+
+class Downloader(object):
+    """
+    Class to download files streaming the response in chunks to disk, partial downloads are resumed with http
+    range requests and optionally a file is fetched in parallel range segments
+
+    chunkSize : int -> bytes written per chunk
+    segments : int -> number of parallel range requests per file, used only when the server supports ranges
+    timeout : float -> seconds to wait for the server
+    """
+    partSuffix = ".part"
+
+    def __init__(self, chunkSize=1024 * 1024, segments=1, timeout=60):
+        self.__chunkSize = chunkSize
+        self.__segments = segments
+        self.__timeout = timeout
+
+    def sha256(path, chunkSize=1024 * 1024):
+        """
+        Method to compute the sha256 digest of a file reading it in chunks
+
+        path : String
+        chunkSize : int
+
+        return String -> hexadecimal digest
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while(True):
+                chunk = f.read(chunkSize)
+                if len(chunk) == 0:
+                    break
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def __getRemoteFile(self, url):
+        """
+        Tool to obtain the size of a remote file and if the server accepts range requests
+
+        url : String
+
+        return size, acceptRanges -> size is None when the server does not report it
+        """
+        import requests
+        response = requests.head(url, allow_redirects=True, timeout=self.__timeout)
+        response.raise_for_status()
+
+        size = response.headers.get("Content-Length")
+        acceptRanges = response.headers.get("Accept-Ranges", "none").lower() == "bytes"
+
+        return (int(size) if size is not None else None), acceptRanges
+
+    def __getResponseSize(response):
+        """
+        Tool to obtain the size of the remote file from a response, the total of Content-Range for range responses
+        and Content-Length otherwise, None when the server does not report it or the content is encoded
+        """
+        contentRange = response.headers.get("Content-Range")
+        if contentRange is not None:
+            total = contentRange.rsplit("/", 1)[-1].strip()
+            return int(total) if total.isdigit() else None
+
+        contentLength = response.headers.get("Content-Length")
+        if response.status_code == 200 and contentLength is not None and response.headers.get("Content-Encoding") is None:
+            return int(contentLength)
+
+        return None
+
+    def __fetch(self, url, partFile, start=0, end=None):
+        """
+        Tool to download the bytes [start, end] of a url into a partial file, if the partial file already
+        has content only the remaining bytes are requested
+
+        url : String
+        partFile : String
+        start : int
+        end : int or None -> last byte included, None until the end of the file
+
+        return completed, size -> completed is false if a range was requested for [start, end] and the server ignored it,
+            size is the size of the remote file reported by the response or None
+        """
+        import requests
+        done = os.path.getsize(partFile) if os.path.exists(partFile) else 0
+        if end is not None and done >= end - start + 1:
+            return True, None
+
+        headers = dict()
+        if start + done > 0 or end is not None:
+            headers.update({
+                "Range" : "bytes=" + str(start + done) + "-" + ("" if end is None else str(end)),
+            })
+
+        with requests.get(url, headers=headers, stream=True, timeout=self.__timeout) as response:
+            size = Downloader.__getResponseSize(response)
+            if response.status_code == 416 and done > 0 and end is None:
+                return True, size
+            response.raise_for_status()
+
+            mode = "ab"
+            if "Range" in headers and response.status_code != 206:
+                if start > 0 or end is not None:
+                    return False, size
+                mode = "wb"
+
+            with open(partFile, mode) as f:
+                for chunk in response.raw.stream(self.__chunkSize, decode_content=False):
+                    f.write(chunk)
+
+        return True, size
+
+    def __fetchSegments(self, url, partFile, size):
+        """
+        Tool to download a file in parallel range segments, each segment is stored and resumed on its own
+        and the segments are joined once all of them are complete
+
+        url : String
+        partFile : String
+        size : int -> size of the remote file
+
+        return boolean -> false if the server ignored the range requests
+        """
+        segmentSize = -(-size // self.__segments)
+        ranges = [(start, min(start + segmentSize, size) - 1) for start in range(0, size, segmentSize)]
+        segmentFiles = [partFile + str(segment) for segment in range(len(ranges))]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(self.__fetch, url, segmentFiles[segment], ranges[segment][0], ranges[segment][1])
+                for segment in range(len(ranges))
+            ]
+            completed = [future.result()[0] for future in futures]
+
+        if False in completed:
+            for segmentFile in segmentFiles:
+                if os.path.exists(segmentFile):
+                    os.remove(segmentFile)
+            return False
+
+        with open(partFile, "wb") as f:
+            for segmentFile in segmentFiles:
+                with open(segmentFile, "rb") as segment:
+                    shutil.copyfileobj(segment, f, self.__chunkSize)
+
+        for segmentFile in segmentFiles:
+            os.remove(segmentFile)
+
+        return True
+
+    def download(self, url, targetFile, sha256=None):
+        """
+        Method to download a url into a file, the content is written to targetFile.part and renamed once complete
+        and verified, so a partial download is resumed by calling the method again
+
+        url : String
+        targetFile : String
+        sha256 : String or None -> expected hexadecimal digest, the file is removed and an exception raised if it differs
+
+        return String -> sha256 digest of the file
+        """
+        if os.path.exists(targetFile):
+            digest = Downloader.sha256(targetFile, self.__chunkSize)
+            if sha256 is None or digest == sha256:
+                return digest
+            os.remove(targetFile)
+
+        if os.path.exists(os.path.dirname(os.path.abspath(targetFile))) is False:
+            os.makedirs(os.path.dirname(os.path.abspath(targetFile)))
+
+        partFile = targetFile + Downloader.partSuffix
+
+        size = None
+        acceptRanges = False
+        if self.__segments > 1:
+            size, acceptRanges = self.__getRemoteFile(url)
+
+        segmented = False
+        if self.__segments > 1 and acceptRanges and size is not None and size > 0:
+            segmented = self.__fetchSegments(url, partFile, size)
+        if segmented is False:
+            _, responseSize = self.__fetch(url, partFile)
+            if size is None:
+                size = responseSize
+
+        downloaded = os.path.getsize(partFile)
+        if size is not None and downloaded != size:
+            # A shorter file is resumed by the next download, a longer one would only obtain 416 responses
+            if downloaded > size:
+                os.remove(partFile)
+            raise Exception("Incomplete download of " + url + " : " + str(downloaded) + "/" + str(size) + " bytes")
+
+        digest = Downloader.sha256(partFile, self.__chunkSize)
+        if sha256 is not None and digest != sha256:
+            os.remove(partFile)
+            raise Exception("Checksum mismatch for " + url + " : expected " + sha256 + ", obtained " + digest)
+
+        os.replace(partFile, targetFile)
+
+        return digest
+
+    def stream(self, url, consume, sha256=None):
+        """
+        Method to stream a url without storing it, consume receives a file like object with the content of the url
+        and can read it while it is being downloaded, for example with tarfile in the "r|gz" mode
+
+        url : String
+        consume : function -> consume(fileObject)
+        sha256 : String or None -> expected hexadecimal digest, an exception is raised after consume if it differs
+
+        return String -> sha256 digest of the content
+        """
+        import requests
+        with requests.get(url, stream=True, timeout=self.__timeout) as response:
+            response.raise_for_status()
+
+            reader = HashingReader(response.raw)
+            consume(reader)
+            while len(reader.read(self.__chunkSize)) > 0:
+                pass
+
+        digest = reader.hexdigest()
+        if sha256 is not None and digest != sha256:
+            raise Exception("Checksum mismatch for " + url + " : expected " + sha256 + ", obtained " + digest)
+
+        return digest
+
+class HashingReader(object):
+    """
+    File like object computing the sha256 digest of the bytes read from another file like object
+
+    fileObject : file like object opened in binary mode
+    """
+    def __init__(self, fileObject):
+        self.__fileObject = fileObject
+        self.__digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        """
+        Method to read bytes from the file
+        """
+        content = self.__fileObject.read(None if size is None or size < 0 else size)
+        self.__digest.update(content)
+        return content
+
+    def hexdigest(self):
+        """
+        Method to obtain the digest of the bytes read so far
+        """
+        return self.__digest.hexdigest()
@@ -0,0 +1,105 @@
+import numpy as np
+
+class EpisodeSampler(object):
+    """
+    Class to sample few shot episodes from an array of labels, an episode has ways classes with shots support
+    samples and queries query samples each, every sample of an episode is different. Many episodes are drawn at once
+    with vectorized numpy operations over the class tables, the random values of each episode are a row of a single
+    draw, so drawing n episodes gives the first n episodes of a larger draw with the same generator state
+
+    labels : numpy array of int -> label of each sample
+    generator : numpy.random.Generator, int or None -> generator or seed used when no generator is given to sample
+    """
+    def __init__(self, labels, generator=None):
+        labels = np.asarray(labels)
+        if labels.ndim != 1 or len(labels) == 0:
+            raise Exception("Labels must be a non empty 1 dimensional array")
+
+        if isinstance(generator, np.random.Generator) is False:
+            generator = np.random.default_rng(generator)
+
+        self.__generator = generator
+        self.__classes, classLabels = np.unique(labels, return_inverse=True)
+        classLabels = classLabels.reshape(-1).astype(np.int64)
+        self.__classOrder = np.argsort(classLabels, kind="stable").astype(np.int64)
+        self.__classCounts = np.bincount(classLabels, minlength=len(self.__classes)).astype(np.int64)
+        self.__classOffsets = np.zeros(len(self.__classes) + 1, dtype=np.int64)
+        np.cumsum(self.__classCounts, out=self.__classOffsets[1:])
+
+    def getGenerator(self):
+        """
+        Method to obtain the random generator of the sampler
+        """
+        return self.__generator
+
+    def getClasses(self):
+        """
+        Method to obtain the sorted unique labels
+        """
+        return self.__classes
+
+    def getEligibleClasses(self, samplesPerClass):
+        """
+        Method to obtain the classes with at least samplesPerClass samples
+
+        samplesPerClass : int
+
+        return numpy array int64 -> indexes into the sorted unique labels
+        """
+        return np.flatnonzero(self.__classCounts >= samplesPerClass)
+
+    def __samplePositions(self, counts, uniforms):
+        """
+        Tool to draw samplesPerClass different positions in [0, count) for every count from uniforms of shape
+        counts.shape + (samplesPerClass,), the position of each draw is taken among the positions not drawn yet by
+        skipping the previous draws in increasing order
+        """
+        samplesPerClass = uniforms.shape[-1]
+        positions = np.empty(counts.shape + (samplesPerClass,), dtype=np.int64)
+        for draw in range(samplesPerClass):
+            position = (uniforms[..., draw] * (counts - draw)).astype(np.int64)
+            previous = np.sort(positions[..., :draw], axis=-1)
+            for column in range(draw):
+                position += position >= previous[..., column]
+            positions[..., draw] = position
+
+        return positions
+
+    def sample(self, ways, shots, queries, numberEpisodes=1, generator=None):
+        """
+        Method to draw episodes
+
+        ways : int -> classes of each episode
+        shots : int -> support samples of each class
+        queries : int -> query samples of each class
+        numberEpisodes : int
+        generator : numpy.random.Generator or None -> generator of the draws, the one of the sampler when None
+
+        return classes, support, query -> numpy arrays int64 (numberEpisodes, ways) with the labels of the classes,
+            (numberEpisodes, ways, shots) and (numberEpisodes, ways, queries) with the indexes of the samples
+        """
+        if generator is None:
+            generator = self.__generator
+
+        eligible = self.getEligibleClasses(shots + queries)
+        if ways < 1 or len(eligible) < ways:
+            raise Exception(
+                "Only " + str(len(eligible)) + " classes have " + str(shots + queries) + " samples, " + str(ways) + " ways requested"
+            )
+
+        # One row of uniforms per episode, the keys of the eligible classes followed by the draws of the positions
+        uniforms = generator.random((numberEpisodes, len(eligible) + ways * (shots + queries)))
+
+        # The ways classes with the smallest random keys, kept in the order of their keys
+        keys = uniforms[:, :len(eligible)]
+        selected = np.argpartition(keys, ways - 1, axis=1)[:, :ways]
+        selected = np.take_along_axis(selected, np.argsort(np.take_along_axis(keys, selected, axis=1), axis=1), axis=1)
+        classes = eligible[selected]
+
+        positions = self.__samplePositions(
+            self.__classCounts[classes],
+            uniforms[:, len(eligible):].reshape(numberEpisodes, ways, shots + queries),
+        )
+        indexes = self.__classOrder[self.__classOffsets[classes][..., None] + positions]
+
+        return self.__classes[classes].astype(np.int64), indexes[..., :shots], indexes[..., shots:]
@@ -0,0 +1,111 @@
+import numpy as np
+
+class EpochSampler(object):
+    """
+    Class to iterate over the samples of a dataset in epochs shared by several processes, the permutation of an
+    epoch only depends on the seed and the epoch, and each rank obtains a disjoint shard of it. The permutation
+    is padded repeating its first samples so all the shards have the same size
+
+    datasetSize : int
+    rank : int -> index of the process, from 0 to worldSize - 1
+    worldSize : int -> number of processes sharing the dataset
+    seed : int -> must be the same in every process
+    shuffle : boolean -> if false the samples are taken in order
+    """
+    def __init__(self, datasetSize, rank=0, worldSize=1, seed=0, shuffle=True):
+        if datasetSize < 1:
+            raise Exception("The dataset is empty")
+        if worldSize < 1 or rank < 0 or rank >= worldSize:
+            raise Exception("Unexpected rank " + str(rank) + " for a world size of " + str(worldSize))
+
+        self.__datasetSize = int(datasetSize)
+        self.__rank = int(rank)
+        self.__worldSize = int(worldSize)
+        self.__seed = int(seed)
+        self.__shuffle = shuffle
+        self.__shardSize = -(-self.__datasetSize // self.__worldSize)
+
+        self.__epoch = 0
+        self.__cursor = 0
+        self.__shard = None
+
+    def __len__(self):
+        return self.__shardSize
+
+    def getShard(self, epoch):
+        """
+        Method to obtain the samples of the rank in an epoch
+
+        epoch : int
+
+        return numpy array int64 (len(self),)
+        """
+        if self.__shuffle:
+            permutation = np.random.default_rng([self.__seed, int(epoch)]).permutation(self.__datasetSize)
+        else:
+            permutation = np.arange(self.__datasetSize, dtype=np.int64)
+
+        return np.resize(permutation, self.__shardSize * self.__worldSize)[self.__rank::self.__worldSize]
+
+    def setEpoch(self, epoch, cursor=0):
+        """
+        Method to start an epoch, optionally from a position of its shard
+
+        epoch : int
+        cursor : int -> number of samples of the shard already taken
+        """
+        if cursor < 0 or cursor > self.__shardSize:
+            raise Exception("Unexpected cursor " + str(cursor) + " for a shard of " + str(self.__shardSize) + " samples")
+
+        self.__epoch = int(epoch)
+        self.__cursor = int(cursor)
+        self.__shard = self.getShard(self.__epoch)
+
+    def getEpoch(self):
+        """
+        Method to obtain the current epoch
+        """
+        return self.__epoch
+
+    def getState(self):
+        """
+        Method to obtain the position of the sampler, it can be saved as json and restored with loadState
+
+        return dict
+        """
+        return {
+            "epoch" : self.__epoch,
+            "cursor" : self.__cursor,
+            "seed" : self.__seed,
+            "rank" : self.__rank,
+            "worldSize" : self.__worldSize,
+            "datasetSize" : self.__datasetSize,
+        }
+
+    def loadState(self, state):
+        """
+        Method to resume the sampler from a state obtained with getState
+
+        state : dict
+        """
+        for key in ["seed", "rank", "worldSize", "datasetSize"]:
+            if state[key] != self.getState()[key]:
+                raise Exception("The state was saved with a different " + key + " : " + str(state[key]))
+
+        self.setEpoch(state["epoch"], state["cursor"])
+
+    def next(self):
+        """
+        Method to obtain the next sample of the shard, the next epoch starts when the shard is covered
+
+        return int
+        """
+        if self.__shard is None:
+            self.setEpoch(self.__epoch, self.__cursor)
+        if self.__cursor == self.__shardSize:
+            self.setEpoch(self.__epoch + 1)
+
+        index = int(self.__shard[self.__cursor])
+        self.__cursor += 1
+
+        return index
@@ -0,0 +1,246 @@
+import mmap
+import threading
+import collections
+import multiprocessing
+import numpy as np
+
+class ImageCache(object):
+    """
+    Class to keep decoded images in memory with a budget in bytes, the least recently used images are evicted first.
+    With shared the images are kept in shared memory divided in slots of slotBytes, so a cache created before forking
+    the workers is used by all of them. The shared memory is only inherited through fork, a shared cache can not be
+    created where fork is not available nor be pickled to a spawned process. A key of the shared cache is hashed to a
+    set of setSlots slots, so a lookup only compares the keys of its set and the least recently used slot of the set
+    is evicted
+
+    budgetBytes : int -> maximum bytes of the cached images
+    shared : boolean -> if true the cache is in shared memory, the keys must be non negative int
+    slotBytes : int -> bytes of each slot of the shared cache, images bigger than a slot are not cached
+    """
+    dtypes = [np.dtype(np.uint8), np.dtype(np.float32)]
+    maxDimensions = 3
+    setSlots = 8
+
+    def __init__(self, budgetBytes, shared=False, slotBytes=64 * 1024):
+        self.__budgetBytes = int(budgetBytes)
+        self.__shared = shared
+
+        if shared is False:
+            self.__lock = threading.Lock()
+            self.__entries = collections.OrderedDict()
+            self.__bytes = 0
+            self.__counters = np.zeros(3, dtype=np.int64)
+            return
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise Exception("A shared image cache needs the fork start method of multiprocessing")
+
+        self.__lock = multiprocessing.get_context("fork").Lock()
+        self.__slotBytes = int(slotBytes)
+        numberSlots = max(self.__budgetBytes // self.__slotBytes, 1)
+        self.__setSlots = min(ImageCache.setSlots, numberSlots)
+        self.__numberSets = numberSlots // self.__setSlots
+        numberSlots = self.__numberSets * self.__setSlots
+
+        # Anonymous mmaps are MAP_SHARED, so the pages are shared with the processes forked afterwards
+        self.__tableMemory = mmap.mmap(-1, numberSlots * 8 * (4 + ImageCache.maxDimensions) + 8 * 4)
+        table = np.frombuffer(self.__tableMemory, dtype=np.int64)
+        self.__keys = table[0:numberSlots]
+        self.__ticks = table[numberSlots:2 * numberSlots]
+        self.__sizes = table[2 * numberSlots:3 * numberSlots]
+        self.__dtypeCodes = table[3 * numberSlots:4 * numberSlots]
+        self.__shapes = table[4 * numberSlots:(4 + ImageCache.maxDimensions) * numberSlots].reshape(numberSlots, ImageCache.maxDimensions)
+        self.__counters = table[(4 + ImageCache.maxDimensions) * numberSlots:]
+        self.__keys[:] = -1
+
+        self.__dataMemory = mmap.mmap(-1, numberSlots * self.__slotBytes)
+        self.__data = np.frombuffer(self.__dataMemory, dtype=np.uint8).reshape(numberSlots, self.__slotBytes)
+
+    def __getstate__(self):
+        if self.__shared:
+            raise Exception("A shared image cache is only shared with forked processes, it can not be pickled")
+
+        # The lock is not pickled, the copy creates its own
+        state = dict(self.__dict__)
+        state.update({
+            "_ImageCache__lock" : None,
+        })
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def __getSet(self, key):
+        """
+        Tool to obtain the first slot of the set of a key of the shared cache, the key is mixed by a multiplicative
+        hash so consecutive keys spread over the sets
+        """
+        mixed = (int(key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        return ((mixed >> 32) % self.__numberSets) * self.__setSlots
+
+    def __findShared(self, key, first):
+        """
+        Tool to obtain the slot of a key in its set of the shared cache, None if it is not cached
+        """
+        slots = np.flatnonzero(self.__keys[first:first + self.__setSlots] == key)
+        if len(slots) == 0:
+            return None
+
+        return first + int(slots[0])
+
+    def __getLocal(self, key):
+        """
+        Tool to obtain an image of the cache in process memory
+        """
+        image = self.__entries.get(key)
+        if image is None:
+            return None
+
+        self.__entries.move_to_end(key)
+        return image
+
+    def __putLocal(self, key, image):
+        """
+        Tool to store an image in the cache in process memory evicting the least recently used
+        """
+        if key in self.__entries:
+            self.__bytes -= self.__entries.pop(key).nbytes
+
+        while self.__bytes + image.nbytes > self.__budgetBytes and len(self.__entries) > 0:
+            self.__bytes -= self.__entries.popitem(last=False)[1].nbytes
+            self.__counters[2] += 1
+
+        self.__entries[key] = image
+        self.__bytes += image.nbytes
+
+    def __getShared(self, key):
+        """
+        Tool to obtain a copy of an image of the shared cache
+        """
+        slot = self.__findShared(key, self.__getSet(key))
+        if slot is None:
+            return None
+
+        self.__counters[3] += 1
+        self.__ticks[slot] = self.__counters[3]
+
+        dtype = ImageCache.dtypes[self.__dtypeCodes[slot]]
+        shape = tuple(int(size) for size in self.__shapes[slot] if size >= 0)
+        return self.__data[slot, :self.__sizes[slot]].view(dtype).reshape(shape).copy()
+
+    def __putShared(self, key, image):
+        """
+        Tool to store an image in a free slot of the set of its key, or in the least recently used slot of the set
+        """
+        first = self.__getSet(key)
+        slot = self.__findShared(key, first)
+        if slot is None:
+            slot = first + int(np.argmin(self.__ticks[first:first + self.__setSlots]))
+            if self.__keys[slot] >= 0:
+                self.__counters[2] += 1
+
+        self.__counters[3] += 1
+        self.__keys[slot] = key
+        self.__ticks[slot] = self.__counters[3]
+        self.__sizes[slot] = image.nbytes
+        self.__dtypeCodes[slot] = ImageCache.dtypes.index(image.dtype)
+        self.__shapes[slot] = -1
+        self.__shapes[slot, :image.ndim] = image.shape
+        self.__data[slot, :image.nbytes] = np.ascontiguousarray(image).reshape(-1).view(np.uint8)
+
+    def get(self, key):
+        """
+        Method to obtain a cached image, the image must not be modified
+
+        key : hashable, non negative int for a shared cache
+
+        return numpy array or None if the image is not cached
+        """
+        with self.__lock:
+            if self.__shared:
+                image = self.__getShared(key)
+            else:
+                image = self.__getLocal(key)
+
+            if image is None:
+                self.__counters[1] += 1
+            else:
+                self.__counters[0] += 1
+
+        return image
+
+    def put(self, key, image):
+        """
+        Method to store an image, it is kept as read only
+
+        key : hashable, non negative int for a shared cache
+        image : numpy array uint8 or float32
+        """
+        image = np.asarray(image)
+        if image.dtype not in ImageCache.dtypes:
+            raise Exception("Unexpected dtype of cached image : " + str(image.dtype))
+        if image.nbytes > (self.__slotBytes if self.__shared else self.__budgetBytes):
+            return
+
+        with self.__lock:
+            if self.__shared:
+                if image.ndim > ImageCache.maxDimensions:
+                    return
+                self.__putShared(key, image)
+            else:
+                if image.flags.writeable:
+                    image = image.copy()
+                    image.flags.writeable = False
+                self.__putLocal(key, image)
+
+    def getOrLoad(self, key, load):
+        """
+        Method to obtain a cached image, loading and caching it when it is missing
+
+        key : hashable, non negative int for a shared cache
+        load : function -> load() returning the image
+        """
+        image = self.get(key)
+        if image is None:
+            image = np.asarray(load())
+            self.put(key, image)
+
+        return image
+
+    def getCounters(self):
+        """
+        Method to obtain the counters of the cache
+
+        return dict -> hits, misses, evictions, entries and bytes
+        """
+        with self.__lock:
+            if self.__shared:
+                used = self.__keys >= 0
+                entries = int(used.sum())
+                cachedBytes = int(self.__sizes[used].sum())
+            else:
+                entries = len(self.__entries)
+                cachedBytes = self.__bytes
+
+            return {
+                "hits" : int(self.__counters[0]),
+                "misses" : int(self.__counters[1]),
+                "evictions" : int(self.__counters[2]),
+                "entries" : entries,
+                "bytes" : cachedBytes,
+            }
+
+    def clear(self):
+        """
+        Method to remove all the images and reset the counters
+        """
+        with self.__lock:
+            if self.__shared:
+                self.__keys[:] = -1
+                self.__ticks[:] = 0
+            else:
+                self.__entries.clear()
+                self.__bytes = 0
+            self.__counters[:] = 0
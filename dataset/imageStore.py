@@ -0,0 +1,219 @@
+import os
+import io
+import zlib
+import numpy as np
+from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+from ai_dataloader.jsonHandler.arrayHandler import ArrayHandler
+
+class ImageStore(object):
+    """
+    Class to serve images decoded once into a single contiguous uint8 file, each image is returned as a zero copy
+    view of the memory mapped file
+
+    storePath : String -> folder of the store, created with ImageStore.build
+    """
+    version = 1
+
+    blobFile = "images.bin"
+    tableFile = "imagesTable.npy"
+    metadataFile = "imageStore.json"
+
+    tableDtype = np.dtype([
+        ("offset", np.int64),
+        ("height", np.int32),
+        ("width", np.int32),
+        ("channels", np.int32),
+        ("sourceSize", np.int64),
+        ("sourceChecksum", np.uint32),
+    ])
+
+    def __init__(self, storePath):
+        self.__storePath = storePath
+        self.__metadata = JsonHandler.loadJson(os.path.join(storePath, ImageStore.metadataFile))
+        if self.__metadata["version"] != ImageStore.version:
+            raise Exception("Unexpected image store version : " + str(self.__metadata["version"]))
+
+        self.__table = np.load(os.path.join(storePath, ImageStore.tableFile))
+        if self.__metadata["totalBytes"] > 0:
+            self.__blob = np.memmap(os.path.join(storePath, ImageStore.blobFile), dtype=np.uint8, mode="r")
+        else:
+            self.__blob = np.zeros(0, dtype=np.uint8)
+
+    def isAvailable(storePath):
+        """
+        Method to check if there is a complete store of the current version in a folder
+
+        storePath : String
+        """
+        metadataPath = os.path.join(storePath, ImageStore.metadataFile)
+        if os.path.exists(metadataPath) is False:
+            return False
+
+        return JsonHandler.loadJson(metadataPath)["version"] == ImageStore.version
+
+    def __len__(self):
+        return len(self.__table)
+
+    def getMetadata(self):
+        """
+        Method to obtain the metadata of the store
+        """
+        return self.__metadata
+
+    def get(self, index):
+        """
+        Method to obtain an image
+
+        index : int
+
+        return numpy array uint8 (height, width) or (height, width, channels), a read only view of the store
+        """
+        entry = self.__table[index]
+        shape = (int(entry["height"]), int(entry["width"]))
+        if entry["channels"] > 0:
+            shape = shape + (int(entry["channels"]),)
+
+        offset = int(entry["offset"])
+        return self.__blob[offset:offset + int(np.prod(shape))].reshape(shape)
+
+    def verify(self, imageFiles):
+        """
+        Method to check that the source images did not change since the store was built, the checksums of the
+        files are computed again so it reads all the source files
+
+        imageFiles : list of String
+
+        return boolean
+        """
+        if len(imageFiles) != len(self.__table):
+            return False
+
+        for index in range(len(imageFiles)):
+            if os.path.getsize(imageFiles[index]) != self.__table[index]["sourceSize"]:
+                return False
+            with open(imageFiles[index], "rb") as f:
+                if zlib.crc32(f.read()) != self.__table[index]["sourceChecksum"]:
+                    return False
+
+        return True
+
+    def readShapes(imageFiles):
+        """
+        Method to obtain the shape of the decoded images reading only the headers of the files
+
+        imageFiles : list of String
+
+        return numpy array int64 (len(imageFiles), 3) -> height, width, channels, channels is 0 for 2 dimensional images
+        """
+        from PIL import Image
+        shapes = np.empty((len(imageFiles), 3), dtype=np.int64)
+        for index in range(len(imageFiles)):
+            with Image.open(imageFiles[index]) as image:
+                bands = len(image.getbands())
+                if image.mode == "P":
+                    bands = 1
+                shapes[index] = (image.size[1], image.size[0], bands if bands > 1 else 0)
+
+        return shapes
+
+    def decodeInto(storePath, imageFiles, table):
+        """
+        Method to decode a chunk of images into the blob of a store being built, the images are written
+        in place so the chunks can be decoded by different processes
+
+        storePath : String
+        imageFiles : list of String -> images of the chunk
+        table : numpy array with dtype tableDtype -> entries of the chunk
+
+        return numpy array (len(imageFiles), 2) -> size and checksum of each source file
+        """
+        from PIL import Image
+        blob = np.memmap(os.path.join(storePath, ImageStore.blobFile), dtype=np.uint8, mode="r+")
+        sources = np.empty((len(imageFiles), 2), dtype=np.int64)
+        for index in range(len(imageFiles)):
+            with open(imageFiles[index], "rb") as f:
+                content = f.read()
+            image = np.asarray(Image.open(io.BytesIO(content)))
+
+            entry = table[index]
+            shape = (int(entry["height"]), int(entry["width"]))
+            if entry["channels"] > 0:
+                shape = shape + (int(entry["channels"]),)
+            if image.dtype != np.uint8 or image.shape != shape:
+                raise Exception("Unexpected image " + imageFiles[index] + " : " + str(image.dtype) + " " + str(image.shape))
+
+            offset = int(entry["offset"])
+            blob[offset:offset + image.size] = image.ravel()
+            sources[index] = (len(content), zlib.crc32(content))
+
+        blob.flush()
+        del blob
+
+        return sources
+
+    def build(storePath, imageFiles, submit=None, chunkSize=1024):
+        """
+        Method to decode a list of images into a store, the metadata is written last so an interrupted build
+        is not taken as a complete store
+
+        storePath : String
+        imageFiles : list of String -> images in the order of their index
+        submit : function or None -> submit(function, *arguments) returning a concurrent.futures.Future, used to
+            decode the chunks in other processes, when None the images are decoded in the calling process
+        chunkSize : int -> images per chunk
+        """
+        if os.path.exists(storePath) is False:
+            os.makedirs(storePath)
+        metadataPath = os.path.join(storePath, ImageStore.metadataFile)
+        if os.path.exists(metadataPath):
+            os.remove(metadataPath)
+
+        chunks = [(start, min(start + chunkSize, len(imageFiles))) for start in range(0, len(imageFiles), chunkSize)]
+
+        if submit is None:
+            shapes = [ImageStore.readShapes(imageFiles[start:stop]) for start, stop in chunks]
+        else:
+            futures = [submit(ImageStore.readShapes, imageFiles[start:stop]) for start, stop in chunks]
+            shapes = [future.result() for future in futures]
+        shapes = np.concatenate(shapes) if len(shapes) > 0 else np.zeros((0, 3), dtype=np.int64)
+
+        sizes = shapes[:, 0] * shapes[:, 1] * np.maximum(shapes[:, 2], 1)
+        table = np.zeros(len(imageFiles), dtype=ImageStore.tableDtype)
+        table["offset"][1:] = np.cumsum(sizes)[:-1]
+        table["height"] = shapes[:, 0]
+        table["width"] = shapes[:, 1]
+        table["channels"] = shapes[:, 2]
+
+        blobPath = os.path.join(storePath, ImageStore.blobFile)
+        with open(blobPath, "wb") as f:
+            f.truncate(int(sizes.sum()))
+
+        if submit is None:
+            sources = [ImageStore.decodeInto(storePath, imageFiles[start:stop], table[start:stop]) for start, stop in chunks]
+        else:
+            futures = [submit(ImageStore.decodeInto, storePath, imageFiles[start:stop], table[start:stop]) for start, stop in chunks]
+            sources = [future.result() for future in futures]
+        sources = np.concatenate(sources) if len(sources) > 0 else np.zeros((0, 2), dtype=np.int64)
+
+        table["sourceSize"] = sources[:, 0]
+        table["sourceChecksum"] = sources[:, 1]
+
+        ImageStore.writeTable(storePath, table, int(sizes.sum()))
+
+    def writeTable(storePath, table, totalBytes):
+        """
+        Method to write the table and the metadata of a store whose blob is already written, the metadata is
+        the last file written and marks the store as complete
+
+        storePath : String
+        table : numpy array with dtype tableDtype
+        totalBytes : int -> size of the blob
+        """
+        ArrayHandler.saveArray(os.path.join(storePath, ImageStore.tableFile), table)
+
+        JsonHandler.saveJson(os.path.join(storePath, ImageStore.metadataFile), {
+            "version" : ImageStore.version,
+            "numberImages" : len(table),
+            "totalBytes" : totalBytes,
+            "sourceChecksum" : zlib.crc32(table["sourceChecksum"].tobytes()),
+        })
@@ -0,0 +1,65 @@
+import os
+import io
+import zlib
+import numpy as np
+from ai_dataloader.dataset.imageStore import ImageStore
+
+class ImageStoreWriter(object):
+    """
+    Class to build an image store incrementally when the images arrive in any order, for example while a
+    tar archive is being extracted, each image is decoded and appended to the blob as it is added
+
+    storePath : String -> folder of the store
+    """
+    def __init__(self, storePath):
+        if os.path.exists(storePath) is False:
+            os.makedirs(storePath)
+        metadataPath = os.path.join(storePath, ImageStore.metadataFile)
+        if os.path.exists(metadataPath):
+            os.remove(metadataPath)
+
+        self.__storePath = storePath
+        self.__blob = open(os.path.join(storePath, ImageStore.blobFile), "wb")
+        self.__offset = 0
+        self.__entries = dict()
+
+    def add(self, index, content):
+        """
+        Method to decode an image and append it to the store
+
+        index : int -> index of the image in the store
+        content : bytes -> content of the image file
+        """
+        from PIL import Image
+        image = np.ascontiguousarray(np.asarray(Image.open(io.BytesIO(content))))
+        if image.dtype != np.uint8 or image.ndim not in [2, 3]:
+            raise Exception("Unexpected image " + str(index) + " : " + str(image.dtype) + " " + str(image.shape))
+
+        self.__blob.write(image.tobytes())
+        self.__entries.update({
+            index : (
+                self.__offset,
+                image.shape[0],
+                image.shape[1],
+                image.shape[2] if image.ndim == 3 else 0,
+                len(content),
+                zlib.crc32(content),
+            ),
+        })
+        self.__offset += image.size
+
+    def close(self, numberImages):
+        """
+        Method to finish the store with the images [0, numberImages), images added with other indexes are left out
+
+        numberImages : int
+        """
+        self.__blob.close()
+
+        table = np.zeros(numberImages, dtype=ImageStore.tableDtype)
+        for index in range(numberImages):
+            if index not in self.__entries:
+                raise Exception("Image " + str(index) + " was not added to the store " + self.__storePath)
+            table[index] = self.__entries[index]
+
+        ImageStore.writeTable(self.__storePath, table, self.__offset)
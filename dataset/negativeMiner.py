@@ -0,0 +1,203 @@
+import threading
+import numpy as np
+
+class NegativeMiner(object):
+    """
+    Class to mine hard negatives from the embeddings computed by the training loop, the embeddings are kept in a
+    matrix with one row per sample and a background thread searches the nearest samples of other classes in
+    blocks, so the memory of the search is blockSize x blockSize and the batches are never waiting for it
+
+    classLabels : numpy array of int -> class of each sample, PairSampler.getClassLabels
+    dimension : int -> size of the embeddings
+    topK : int -> neighbours kept per sample
+    mode : String -> hard, semihard. With semihard the neighbours closer than the mean distance of the sample
+        to the samples of its class are skipped
+    hardFraction : float -> fraction of the negatives replaced by a mined neighbour
+    blockSize : int -> samples per block of the search
+    refreshEvery : int -> embeddings pushed between two searches
+    """
+    def __init__(self, classLabels, dimension, topK=8, mode="hard", hardFraction=0.5, blockSize=1024, refreshEvery=None):
+        if mode not in ["hard", "semihard"]:
+            raise Exception("Unexpected mining mode : " + str(mode))
+
+        self.__classLabels = np.asarray(classLabels, dtype=np.int64)
+        self.__topK = topK
+        self.__mode = mode
+        self.__hardFraction = hardFraction
+        self.__blockSize = blockSize
+        self.__refreshEvery = refreshEvery if refreshEvery is not None else max(len(self.__classLabels) // 4, 1)
+
+        self.__lock = threading.Lock()
+        self.__embeddings = np.zeros((len(self.__classLabels), dimension), dtype=np.float32)
+        self.__known = np.zeros(len(self.__classLabels), dtype=bool)
+        self.__pushed = 0
+        self.__neighbours = None
+        self.__search = None
+
+    def update(self, indexes, embeddings):
+        """
+        Method to store the embeddings of samples, a new search starts in background once refreshEvery embeddings
+        were pushed since the last one
+
+        indexes : numpy array of int
+        embeddings : numpy array (len(indexes), dimension)
+        """
+        indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+        with self.__lock:
+            self.__embeddings[indexes] = np.asarray(embeddings, dtype=np.float32).reshape(len(indexes), -1)
+            self.__known[indexes] = True
+            self.__pushed += len(indexes)
+            refresh = self.__pushed >= self.__refreshEvery
+
+        if refresh:
+            self.refresh()
+
+    def refresh(self, wait=False):
+        """
+        Method to start a search of the neighbours with the current embeddings, nothing is started if a search
+        is still running
+
+        wait : boolean -> if true the method returns once the search finished
+        """
+        with self.__lock:
+            if self.__search is None or self.__search.is_alive() is False:
+                self.__pushed = 0
+                embeddings = self.__embeddings.copy()
+                known = self.__known.copy()
+                self.__search = threading.Thread(target=self.__searchNeighbours, args=(embeddings, known), daemon=True)
+                self.__search.start()
+            search = self.__search
+
+        if wait:
+            search.join()
+
+    def isReady(self):
+        """
+        Method to check if a search finished, before that the negatives are not modified
+        """
+        return self.__neighbours is not None
+
+    def getNeighbours(self):
+        """
+        Method to obtain the result of the last search
+
+        return numpy array int64 (numberSamples, topK) or None -> nearest samples of other classes, -1 when missing
+        """
+        return self.__neighbours
+
+    def __classMask(self, queryClasses, keyClasses):
+        """
+        Tool to obtain the pairs of a query block and a key block with the same class, None when the blocks
+        have no class in common, since the samples are sorted by class this happens for most blocks
+        """
+        if queryClasses[-1] < keyClasses[0] or keyClasses[-1] < queryClasses[0]:
+            return None
+
+        return queryClasses[:, None] == keyClasses[None, :]
+
+    def __searchNeighbours(self, embeddings, known):
+        """
+        Tool to search the topK nearest samples of other classes of every known sample, the key blocks are
+        merged into a running topK so only a block of distances is in memory. The samples are sorted by class
+        and the distances are computed without the norm of the query, which does not change the order of a row
+        """
+        order = np.argsort(self.__classLabels, kind="stable")
+        classes = self.__classLabels[order]
+        embeddings = embeddings[order]
+        known = known[order]
+
+        numberSamples = len(embeddings)
+        # With the norm of the keys as an extra column, a single product gives |k|^2 - 2 q.k, unknown keys are at inf
+        norms = np.einsum("ij,ij->i", embeddings, embeddings)
+        queries = np.concatenate([embeddings, np.ones((numberSamples, 1), dtype=np.float32)], axis=1)
+        keys = np.concatenate([embeddings * np.float32(-2), np.where(known, norms, np.inf).astype(np.float32)[:, None]], axis=1)
+        neighbours = np.full((numberSamples, self.__topK), -1, dtype=np.int64)
+        blocks = [(start, min(start + self.__blockSize, numberSamples)) for start in range(0, numberSamples, self.__blockSize)]
+
+        for queryStart, queryStop in blocks:
+            queryBlock = queries[queryStart:queryStop]
+            queryClasses = classes[queryStart:queryStop]
+
+            thresholds = np.full(queryStop - queryStart, -np.inf, dtype=np.float32)
+            if self.__mode == "semihard":
+                sums = np.zeros(queryStop - queryStart, dtype=np.float64)
+                counts = np.zeros(queryStop - queryStart, dtype=np.int64)
+                for keyStart, keyStop in blocks:
+                    positives = self.__classMask(queryClasses, classes[keyStart:keyStop])
+                    if positives is None:
+                        continue
+                    positives &= known[None, keyStart:keyStop]
+                    positives[np.arange(queryStart, queryStop)[:, None] == np.arange(keyStart, keyStop)[None, :]] = False
+                    distances = queryBlock @ keys[keyStart:keyStop].T
+                    sums += np.where(positives, distances, 0).sum(axis=1)
+                    counts += positives.sum(axis=1)
+                thresholds = np.where(counts > 0, sums / np.maximum(counts, 1), -np.inf).astype(np.float32)
+
+            bestDistances = np.full((queryStop - queryStart, self.__topK), np.inf, dtype=np.float32)
+            bestIndexes = np.full((queryStop - queryStart, self.__topK), -1, dtype=np.int64)
+            for keyStart, keyStop in blocks:
+                distances = queryBlock @ keys[keyStart:keyStop].T
+                excluded = self.__classMask(queryClasses, classes[keyStart:keyStop])
+                if excluded is not None:
+                    distances[excluded] = np.inf
+
+                # Only the distances below the current worst neighbour of their row can enter the topK, they are
+                # compacted to the left of a small matrix so the partition does not visit the whole block
+                limits = bestDistances.max(axis=1)
+                if self.__mode == "semihard":
+                    candidates = (distances < limits[:, None]) & (distances > thresholds[:, None])
+                else:
+                    candidates = distances < limits[:, None]
+                candidateRows = np.flatnonzero(candidates.any(axis=1))
+                if len(candidateRows) == 0:
+                    continue
+                rows, columns = np.nonzero(candidates[candidateRows])
+                rows = candidateRows[rows]
+                rowStarts = np.searchsorted(rows, np.arange(len(queryBlock)))
+                positions = np.arange(len(rows)) - rowStarts[rows]
+                width = int(positions.max()) + 1
+
+                candidates = np.full((len(queryBlock), self.__topK + width), np.inf, dtype=np.float32)
+                candidateIndexes = np.full((len(queryBlock), self.__topK + width), -1, dtype=np.int64)
+                candidates[:, :self.__topK] = bestDistances
+                candidateIndexes[:, :self.__topK] = bestIndexes
+                candidates[rows, self.__topK + positions] = distances[rows, columns]
+                candidateIndexes[rows, self.__topK + positions] = keyStart + columns
+
+                selected = np.argpartition(candidates, self.__topK - 1, axis=1)[:, :self.__topK]
+                bestDistances = np.take_along_axis(candidates, selected, axis=1)
+                bestIndexes = np.take_along_axis(candidateIndexes, selected, axis=1)
+
+            sortedOrder = np.argsort(bestDistances, axis=1)
+            bestDistances = np.take_along_axis(bestDistances, sortedOrder, axis=1)
+            bestIndexes = np.take_along_axis(bestIndexes, sortedOrder, axis=1)
+            bestIndexes = np.where(np.isinf(bestDistances), -1, order[np.maximum(bestIndexes, 0)])
+            bestIndexes[known[queryStart:queryStop] == False] = -1
+            neighbours[order[queryStart:queryStop]] = bestIndexes
+
+        self.__neighbours = neighbours
+
+    def hook(self, anchors, negatives, generator):
+        """
+        Method used as negative hook of a PairSampler, a fraction of the negatives of the anchors with mined
+        neighbours is replaced by one of their neighbours
+
+        anchors : numpy array int64
+        negatives : numpy array int64
+        generator : numpy.random.Generator
+
+        return numpy array int64
+        """
+        neighbours = self.__neighbours
+        if neighbours is None:
+            return negatives
+
+        candidates = neighbours[anchors]
+        counts = (candidates >= 0).sum(axis=1)
+        replace = (counts > 0) & (generator.random(len(anchors)) < self.__hardFraction)
+        choices = (generator.random(len(anchors)) * counts).astype(np.int64)
+
+        negatives = negatives.copy()
+        negatives[replace] = candidates[replace, choices[replace]]
+
+        return negatives
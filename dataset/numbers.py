@@ -1,21 +1,54 @@
-from operator import index
 import os
-import git
-import random
-from PIL import Image
 import numpy as np
-
-from torch import rand
+from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+from ai_dataloader.dataset.pairSampler import PairSampler
+from ai_dataloader.dataset.batchBuffer import BatchBuffer
+from ai_dataloader.dataset.episodeSampler import EpisodeSampler
+from ai_dataloader.dataset.imageCache import ImageCache
+from ai_dataloader.instrumentation.instrumentation import Instrumentation
 
 class NumbersDataloader(object):
     """
     Class to load numbers dataset
+
+    path : String -> path where data is stored
+    seed : int, numpy.random.Generator or None -> seed of the pairs sampled for the batches
+    pinMemory : boolean -> if true the stacked batches are allocated in pinned memory when torch is installed
+    cache : ImageCache or None -> cache of the decoded images, keyed by the index of the sample
+    augmentation : Augmentation or None -> augmentation applied in place to the stacked batches
+    supportCacheBytes : int or None -> budget of the cache of the decoded support images of the episodes, with None or 0
+        the support images go through the cache of the loader
     """
-    def __init__(self, path):
+    repositoryUrl = "https://github.com/kensanata/numbers.git"
+    manifestFile = "numbersManifest.json"
+    manifestVersion = 1
+    episodeChunk = 256
+
+    def __init__(self, path, seed=None, pinMemory=False, cache=None, augmentation=None, supportCacheBytes=16 * 1024 * 1024):
         self.__path = path
         self.__pathDataset = os.path.join(self.__path, "numbers")
+        self.__pathManifest = os.path.join(self.__path, NumbersDataloader.manifestFile)
         self.__downloadDataset()
+        timing = Instrumentation.enabled and Instrumentation.start()
         self.__dictNumberPaths = self.__getDictNumbersPath()
+        if timing:
+            Instrumentation.stop("indexLoad", timing, items=sum(len(paths) for paths in self.__dictNumberPaths.values()))
+        self.__paths = [pathImage for number in list(self.__dictNumberPaths.keys()) for pathImage in self.__dictNumberPaths[number]]
+        self.__pathIndexes = {self.__paths[index] : index for index in range(len(self.__paths))}
+        self.__labels = np.array(
+            [number for number in list(self.__dictNumberPaths.keys()) for _ in self.__dictNumberPaths[number]],
+            dtype=np.int32,
+        )
+        self.__pairSampler = PairSampler(self.__labels, seed)
+        # The episodes have their own stream spawned from the generator of the pairs, so drawing episodes does not
+        # change the sequence of the pairs
+        self.__episodeSampler = EpisodeSampler(self.__labels, self.__pairSampler.getGenerator().spawn(1)[0])
+        self.__supportCache = ImageCache(supportCacheBytes) if supportCacheBytes else None
+        self.__batchBuffer = BatchBuffer(pinMemory)
+        self.__cache = cache
+        self.__augmentation = augmentation
+        self.__negativeMiner = None
+        self.__batchIndexes = None
 
     def getDictPaths(self):
         """
@@ -23,19 +56,79 @@ class NumbersDataloader(object):
         """
         return self.__dictNumberPaths
 
+    def getLabels(self):
+        """
+        Method to obtain the label of each sample, in the order of the samples used by the pair sampler
+        """
+        return self.__labels
+
+    def getPairSampler(self):
+        """
+        Method to obtain the sampler of the pairs of the batches
+        """
+        return self.__pairSampler
+
+    def getEpisodeSampler(self):
+        """
+        Method to obtain the sampler of the few shot episodes
+        """
+        return self.__episodeSampler
+
     def __downloadDataset(self):
         """
-        Tool to download numbers dataset
+        Tool to download numbers dataset, with a shallow blobless clone whose checkout contains only the image
+        folders, so only the blobs of the images are fetched
         https://github.com/kensanata/numbers
         """
+        import git
         if os.path.exists(self.__pathDataset):
             pass
         else:
-            git.Git(self.__path).clone("https://github.com/kensanata/numbers.git")
+            git.Git(self.__path).clone("--depth", "1", "--filter=blob:none", "--sparse", NumbersDataloader.repositoryUrl, self.__pathDataset)
+            git.Git(self.__pathDataset).sparse_checkout("set", "--no-cone", "/*00*/[0-9]/")
+
+    def __scanDirectory(self, relativePath, manifest, accept):
+        """
+        Tool to obtain the names of the entries of a directory accepted by a filter, the names of the manifest
+        are reused when the mtime of the directory did not change
+
+        relativePath : String -> directory relative to the dataset
+        manifest : dict -> directories of the previous manifest
+        accept : function -> accept(os.DirEntry) returns true for the entries to keep
+
+        return dict -> mtime and names of the directory
+        """
+        pathDirectory = os.path.join(self.__pathDataset, relativePath)
+        mtime = os.stat(pathDirectory).st_mtime_ns
+        previous = manifest.get(relativePath)
+        if previous is not None and previous["mtime"] == mtime:
+            return previous
+
+        with os.scandir(pathDirectory) as entries:
+            names = [entry.name for entry in entries if accept(entry)]
+
+        return {
+            "mtime" : mtime,
+            "names" : names,
+        }
+
+    def __loadManifest(self):
+        """
+        Tool to load the directories of the manifest, empty when there is no manifest of the current version
+        """
+        if os.path.exists(self.__pathManifest) is False:
+            return dict()
+
+        manifest = JsonHandler.loadJson(self.__pathManifest)
+        if manifest.get("version") != NumbersDataloader.manifestVersion:
+            return dict()
+
+        return manifest["directories"]
 
     def __getDictNumbersPath(self):
         """
-        Tool to obtain dict with the paths for each number
+        Tool to obtain dict with the paths for each number, the listing of every directory is kept in a manifest
+        so only the directories that changed since the last run are listed again
         """
         dictNumberPaths = {
             0 : [],
@@ -49,110 +142,225 @@ class NumbersDataloader(object):
             8 : [],
             9 : [],
         }
-        folders = os.listdir(self.__pathDataset)
-        for folder in folders:
-            if "00" in folder:
-                folderPath = os.path.join(self.__pathDataset, folder)
-                pathNumbers = os.listdir(folderPath)
-                for number in pathNumbers:
-                    if "scan" not in number and ".jpg" not in number and "README" not in number and ".jpeg" not in number:
-                        pathNumber = os.path.join(folderPath, number)
-                        imagesNumber = os.listdir(pathNumber)
-                        for image in imagesNumber:
-                            pathImage = os.path.join(pathNumber, image)
-                            dictNumberPaths[int(number)].append(pathImage)
+        manifest = self.__loadManifest()
+        directories = dict()
+
+        def isFolder(entry):
+            return "00" in entry.name and entry.is_dir()
+
+        def isNumber(entry):
+            return entry.name.isdigit() and len(entry.name) == 1 and entry.is_dir()
+
+        directories[""] = self.__scanDirectory("", manifest, isFolder)
+        for folder in directories[""]["names"]:
+            directories[folder] = self.__scanDirectory(folder, manifest, isNumber)
+            for number in directories[folder]["names"]:
+                relativeNumber = os.path.join(folder, number)
+                directories[relativeNumber] = self.__scanDirectory(relativeNumber, manifest, lambda entry: True)
+                pathNumber = os.path.join(self.__pathDataset, relativeNumber)
+                dictNumberPaths[int(number)].extend(pathNumber + os.sep + image for image in directories[relativeNumber]["names"])
+
+        if directories != manifest:
+            JsonHandler.saveJson(self.__pathManifest, {
+                "version" : NumbersDataloader.manifestVersion,
+                "directories" : directories,
+            })
 
         return dictNumberPaths
 
-    def getImage(self, path):
+    def setNegativeMiner(self, miner):
+        """
+        Method to enable the mining of hard negatives, the negatives of the batches are then partly replaced by
+        neighbours of other classes found in the embeddings pushed with pushEmbeddings, None disables it
+
+        miner : NegativeMiner or None -> built with the class labels of getPairSampler().getClassLabels()
+        """
+        self.__negativeMiner = miner
+        self.__pairSampler.setNegativeHook(miner.hook if miner is not None else None)
+
+    def getBatchIndexes(self):
+        """
+        Method to obtain the sample indexes of the last batch of getRandomBatchSample
+
+        return indexes1, indexes2 -> numpy arrays int64
+        """
+        return self.__batchIndexes
+
+    def pushEmbeddings(self, embeddings1, embeddings2=None):
+        """
+        Method to give the embeddings of the last batch to the negative miner
+
+        embeddings1 : numpy array (batchSize, dimension) -> embeddings of the first images of the pairs
+        embeddings2 : numpy array (batchSize, dimension) or None -> embeddings of the second images of the pairs
+        """
+        if self.__negativeMiner is None:
+            raise Exception("No negative miner, set one with setNegativeMiner")
+        if self.__batchIndexes is None:
+            raise Exception("No batch sampled yet, the embeddings are of the last batch of getRandomBatchSample")
+
+        indexes1, indexes2 = self.__batchIndexes
+        self.__negativeMiner.update(indexes1, embeddings1)
+        if embeddings2 is not None:
+            self.__negativeMiner.update(indexes2, embeddings2)
+
+    def getCache(self):
+        """
+        Method to obtain the cache of the decoded images, None when the images are not cached
+        """
+        return self.__cache
+
+    def __decodeImage(self, path, cache=None):
+        """
+        Tool to decode an image as stored in the file, through the cache when the path is a sample of the dataset
+
+        cache : ImageCache or None -> cache used instead of the cache of the loader
+
+        return numpy array uint8, read only when it comes from the cache
+        """
+        cache = self.__cache if cache is None else cache
+        index = self.__pathIndexes.get(path)
+        if cache is None or index is None:
+            return self.__loadImage(path)
+
+        return cache.getOrLoad(index, lambda: self.__loadImage(path))
+
+    def __loadImage(self, path):
+        """
+        Tool to decode an image file
+
+        return numpy array uint8
+        """
+        from PIL import Image
+        timing = Instrumentation.enabled and Instrumentation.start()
+        image = np.asarray(Image.open(path))
+        if timing:
+            Instrumentation.stop("decode", timing, bytesRead=os.path.getsize(path))
+
+        return image
+
+    def getImage(self, path, cache=None):
         """
         Tool to load image
 
+        cache : ImageCache or None -> cache used instead of the cache of the loader
+
         return numpy array
         """
-        imageNumpy = np.asarray(Image.open(path))
+        imageNumpy = self.__decodeImage(path, cache)
         if len(imageNumpy.shape) == 2:
             return imageNumpy.astype(float)
         else:
             return np.mean(imageNumpy, axis=2).astype(float)
 
-    def __getBatchImages(self, equal, size):
+    def __readImage(self, index, out=None, cache=None):
         """
-        Tool to get a batch of images
+        Tool to load the image of a sample in grayscale float32, into out when it is given
 
-        equal : boolean -> if each sample has equal classes
-        size : int -> size batch
+        index : int
+        out : numpy array float32 (height, width) or None
+        cache : ImageCache or None -> cache used instead of the cache of the loader
         """
-        batchImages1 = []
-        batchImages2 = []
-        batchLabels = []
-        for index in range(size):
-            indexClass  = random.randrange(0, 10)
-            if equal:
-                batchLabels.append(1.0)
-                indexSample1 = random.randrange(0, len(self.__dictNumberPaths[indexClass]))
-                while(True):
-                    indexSample2 = random.randrange(0, len(self.__dictNumberPaths[indexClass]))
-                    if indexSample2 != indexSample1:
-                        break
+        imageNumpy = self.__decodeImage(self.__paths[index], cache)
+        if out is None:
+            out = np.empty(imageNumpy.shape[:2], dtype=np.float32)
+        elif out.shape != imageNumpy.shape[:2]:
+            raise Exception("Images of different size can not be stacked : " + self.__paths[index] + " " + str(imageNumpy.shape))
 
-                pathImage1 = self.__dictNumberPaths[indexClass][indexSample1]
-                pathImage2 = self.__dictNumberPaths[indexClass][indexSample2]
-            else:
-                batchLabels.append(0.0)
-                indexesOtherClasses = [i for i in range(0, 10)]
-                del indexesOtherClasses[indexClass]
-                indexOtherClass = indexesOtherClasses[random.randrange(0, len(indexesOtherClasses))]
+        if len(imageNumpy.shape) == 2:
+            out[...] = imageNumpy
+        else:
+            np.mean(imageNumpy, axis=2, out=out)
 
-                indexSample1 = random.randrange(0, len(self.__dictNumberPaths[indexClass]))
-                indexSample2 = random.randrange(0, len(self.__dictNumberPaths[indexOtherClass]))
+        return out
 
-                pathImage1 = self.__dictNumberPaths[indexClass][indexSample1]
-                pathImage2 = self.__dictNumberPaths[indexOtherClass][indexSample2]
+    def getRandomBatchSample(self, batchSize, stacked=False, out=None):
+        """
+        Method to obtain random batch sample, the first half of the batch are pairs with the same class and
+        the second half pairs with different classes
+
+        batchSize : int
+        stacked : boolean -> if true the images are returned as float32 arrays (batchSize, height, width) and the labels
+            as a float32 array (batchSize,), the arrays are reused and overwritten by the next stacked call
+        out : tuple or None -> (images1, images2, labels) arrays the stacked batch is written into
+
+        return batchImages1, batchImages2, batchLabels
+        """
+        timing = Instrumentation.enabled and Instrumentation.start()
+        indexes1, indexes2, labels = self.__pairSampler.sampleBatch(batchSize)
+        self.__batchIndexes = (indexes1, indexes2)
+        if timing:
+            Instrumentation.stop("samplePick", timing, items=len(labels))
 
-            batchImages1.append(self.getImage(pathImage1))
-            batchImages2.append(self.getImage(pathImage2))
+        if stacked or out is not None:
+            timing = Instrumentation.enabled and Instrumentation.start()
+            batch = self.__batchBuffer.stackPairs(indexes1, indexes2, labels, self.__readImage, np.float32, out)
+            if self.__augmentation is not None:
+                batch = self.__augmentation.applyPairs(*batch, inPlace=True)
+            if timing:
+                Instrumentation.stop("collate", timing, items=len(labels))
+            return batch
+
+        batchImages1 = [self.getImage(self.__paths[index]) for index in indexes1]
+        batchImages2 = [self.getImage(self.__paths[index]) for index in indexes2]
+        batchLabels = labels.tolist()
 
         return batchImages1, batchImages2, batchLabels
 
-    def getRandomBatchSample(self, batchSize):
+    def getEpisodes(self, numberEpisodes, ways, shots, queries, seed=None):
         """
-        Method to obtain random batch sample
+        Method to iterate over few shot episodes, the indexes of up to episodeChunk episodes are drawn at once and the
+        support images are kept decoded in a small cache. Only the episodes iterated are drawn, the same seed gives
+        the same sequence of episodes whatever their number
+
+        numberEpisodes : int
+        ways : int -> classes of each episode
+        shots : int -> support images of each class
+        queries : int -> query images of each class
+        seed : int or None -> seed of the episodes, the generator of the loader is used when None
+
+        return generator of supportImages, supportLabels, queryImages, queryLabels, classes -> images float32 arrays
+            (ways * shots, height, width) and (ways * queries, height, width) ordered by class, labels int64 arrays
+            with the position of the class in classes. The image arrays are reused and overwritten by the next episode
         """
-        batchSize = batchSize
+        generator = np.random.default_rng(seed) if seed is not None else None
+        supportLabels = np.repeat(np.arange(ways, dtype=np.int64), shots)
+        queryLabels = np.repeat(np.arange(ways, dtype=np.int64), queries)
 
-        batchImages1Equal, batchImages2Equal, batchLabelsEqual = self.__getBatchImages(
-            True,
-            int(batchSize/2),
-        )
+        readSupport = lambda index, out: self.__readImage(index, out, self.__supportCache)
 
-        batchImages1Different, batchImages2Different, batchLabelsDifferent = self.__getBatchImages(
-            False,
-            int(batchSize/2),
-        )
+        for start in range(0, numberEpisodes, NumbersDataloader.episodeChunk):
+            timing = Instrumentation.enabled and Instrumentation.start()
+            chunk = min(NumbersDataloader.episodeChunk, numberEpisodes - start)
+            classes, support, query = self.__episodeSampler.sample(ways, shots, queries, chunk, generator)
+            if timing:
+                Instrumentation.stop("samplePick", timing, items=len(classes))
+            for episode in range(chunk):
+                timing = Instrumentation.enabled and Instrumentation.start()
+                supportImages = self.__batchBuffer.stackImages("supportImages", support[episode].reshape(-1), readSupport, np.float32)
+                queryImages = self.__batchBuffer.stackImages("queryImages", query[episode].reshape(-1), self.__readImage, np.float32)
+                if timing:
+                    Instrumentation.stop("collate", timing, items=len(supportImages) + len(queryImages))
+                yield supportImages, supportLabels, queryImages, queryLabels, classes[episode]
 
-        batchImages1 = batchImages1Equal + batchImages1Different
-        batchImages2 = batchImages2Equal + batchImages2Different
-        batchLabels = batchLabelsEqual + batchLabelsDifferent
+    def getEpisode(self, ways, shots, queries, seed=None):
+        """
+        Method to obtain a few shot episode, as returned by getEpisodes
+        """
+        return next(self.getEpisodes(1, ways, shots, queries, seed))
 
-        return batchImages1, batchImages2, batchLabels
+    def loadSupportVector(self, seed=None):
+        """
+        Method to load support vector, the first image of each number or with a seed a random image of each number,
+        the images are kept decoded in the cache of the support images
 
-    def loadSupportVector(self):
-        """
-        Method to load support vector
-        """
-        support = {
-            0 : self.getImage(self.__dictNumberPaths[0][0]),
-            1 : self.getImage(self.__dictNumberPaths[1][0]),
-            2 : self.getImage(self.__dictNumberPaths[2][0]),
-            3 : self.getImage(self.__dictNumberPaths[3][0]),
-            4 : self.getImage(self.__dictNumberPaths[4][0]),
-            5 : self.getImage(self.__dictNumberPaths[5][0]),
-            6 : self.getImage(self.__dictNumberPaths[6][0]),
-            7 : self.getImage(self.__dictNumberPaths[7][0]),
-            8 : self.getImage(self.__dictNumberPaths[8][0]),
-            9 : self.getImage(self.__dictNumberPaths[9][0]),
-        }
+        seed : int or None
+        """
+        if seed is None:
+            indexes = [self.__pathIndexes[self.__dictNumberPaths[number][0]] for number in range(10)]
+        else:
+            classes, support, _ = self.__episodeSampler.sample(10, 1, 0, generator=np.random.default_rng(seed))
+            indexes = support[0, np.argsort(classes[0]), 0]
 
-        return support
+        support = {number : self.getImage(self.__paths[indexes[number]], self.__supportCache) for number in range(10)}
 
+        return support
@@ -1,19 +1,169 @@
-import random
+import os
 import numpy as np
-from torchvision.datasets import Omniglot
+from ai_dataloader.jsonHandler.arrayHandler import ArrayHandler
+from ai_dataloader.dataset.pairSampler import PairSampler
+from ai_dataloader.dataset.batchBuffer import BatchBuffer
+from ai_dataloader.dataset.episodeSampler import EpisodeSampler
+from ai_dataloader.dataset.imageCache import ImageCache
+from ai_dataloader.instrumentation.instrumentation import Instrumentation
 
 class OmniglotDataloader(object):
     """
     Class to load dataset omniglot
 
     path : String -> path where data is stored
+    seed : int, numpy.random.Generator or None -> seed of the pairs sampled for the batches and by getRandomSample
+    pinMemory : boolean -> if true the stacked batches are allocated in pinned memory when torch is installed
+    cache : ImageCache or None -> cache of the decoded images, keyed by the index of the sample
+    augmentation : Augmentation or None -> augmentation applied in place to the stacked batches
+    supportCacheBytes : int or None -> budget of the cache of the decoded support images of the episodes, with None or 0
+        the support images go through the cache of the loader
     """
-    def __init__(self, path):
+    episodeChunk = 256
+
+    def __init__(self, path, seed=None, pinMemory=False, cache=None, augmentation=None, supportCacheBytes=16 * 1024 * 1024):
+        from torchvision.datasets import Omniglot
+
         self.__path = path
         self.omniglot = Omniglot(
             path,
             download=True,
         )
+        timing = Instrumentation.enabled and Instrumentation.start()
+        self.__labels = self.__loadClassIndex()
+        if timing:
+            Instrumentation.stop("indexLoad", timing, items=len(self.__labels))
+        self.__pairSampler = PairSampler(self.__labels, seed)
+        # The episodes have their own stream spawned from the generator of the pairs, so drawing episodes does not
+        # change the sequence of the pairs
+        self.__episodeSampler = EpisodeSampler(self.__labels, self.__pairSampler.getGenerator().spawn(1)[0])
+        self.__supportCache = ImageCache(supportCacheBytes) if supportCacheBytes else None
+        self.__batchBuffer = BatchBuffer(pinMemory)
+        self.__cache = cache
+        self.__augmentation = augmentation
+        self.__negativeMiner = None
+        self.__batchIndexes = None
+
+    def __buildClassIndex(self):
+        """
+        Tool to build the label of each sample from the file list of torchvision, without loading any image, the
+        samples are grouped by class by PairSampler and EpisodeSampler
+
+        return labels -> numpy array int32
+        """
+        return np.array([label for _, label in self.omniglot._flat_character_images], dtype=np.int32)
+
+    def __loadClassIndex(self):
+        """
+        Tool to load the labels cached next to the torchvision data, they are built and cached when they are missing
+        or do not match the dataset
+
+        return labels
+        """
+        indexPath = os.path.join(self.omniglot.root, self.omniglot._get_target_folder() + "ClassIndex.npz")
+        if os.path.exists(indexPath):
+            with np.load(indexPath) as classIndex:
+                labels = classIndex["labels"]
+            if len(labels) == len(self.omniglot) and (len(labels) == 0 or labels.max() < len(self.omniglot._characters)):
+                return labels
+
+        labels = self.__buildClassIndex()
+        ArrayHandler.saveArrays(indexPath, {
+            "labels" : labels,
+        })
+
+        return labels
+
+    def getLabels(self):
+        """
+        Method to obtain the label of each sample
+
+        return numpy array int32
+        """
+        return self.__labels
+
+    def getPairSampler(self):
+        """
+        Method to obtain the sampler of the pairs of the batches
+        """
+        return self.__pairSampler
+
+    def getEpisodeSampler(self):
+        """
+        Method to obtain the sampler of the few shot episodes
+        """
+        return self.__episodeSampler
+
+    def setNegativeMiner(self, miner):
+        """
+        Method to enable the mining of hard negatives, the negatives of the batches are then partly replaced by
+        neighbours of other classes found in the embeddings pushed with pushEmbeddings, None disables it
+
+        miner : NegativeMiner or None -> built with the class labels of getPairSampler().getClassLabels()
+        """
+        self.__negativeMiner = miner
+        self.__pairSampler.setNegativeHook(miner.hook if miner is not None else None)
+
+    def getBatchIndexes(self):
+        """
+        Method to obtain the sample indexes of the last batch of getRandomBatchSample
+
+        return indexes1, indexes2 -> numpy arrays int64
+        """
+        return self.__batchIndexes
+
+    def pushEmbeddings(self, embeddings1, embeddings2=None):
+        """
+        Method to give the embeddings of the last batch to the negative miner
+
+        embeddings1 : numpy array (batchSize, dimension) -> embeddings of the first images of the pairs
+        embeddings2 : numpy array (batchSize, dimension) or None -> embeddings of the second images of the pairs
+        """
+        if self.__negativeMiner is None:
+            raise Exception("No negative miner, set one with setNegativeMiner")
+        if self.__batchIndexes is None:
+            raise Exception("No batch sampled yet, the embeddings are of the last batch of getRandomBatchSample")
+
+        indexes1, indexes2 = self.__batchIndexes
+        self.__negativeMiner.update(indexes1, embeddings1)
+        if embeddings2 is not None:
+            self.__negativeMiner.update(indexes2, embeddings2)
+
+    def getCache(self):
+        """
+        Method to obtain the cache of the decoded images, None when the images are not cached
+        """
+        return self.__cache
+
+    def __decodeImage(self, index, cache=None):
+        """
+        Tool to decode the image of a sample as uint8, through the cache when there is one
+
+        cache : ImageCache or None -> cache used instead of the cache of the loader
+
+        return numpy array, read only when it comes from the cache
+        """
+        index = int(index)
+        cache = self.__cache if cache is None else cache
+        if cache is None:
+            return self.__loadImage(index)
+
+        return cache.getOrLoad(index, lambda: self.__loadImage(index))
+
+    def __loadImage(self, index):
+        """
+        Tool to decode the image of a sample with torchvision
+
+        return numpy array uint8
+        """
+        timing = Instrumentation.enabled and Instrumentation.start()
+        image = np.asarray(self.omniglot[index][0])
+        if timing:
+            name, character = self.omniglot._flat_character_images[index]
+            pathImage = os.path.join(self.omniglot.target_folder, self.omniglot._characters[character], name)
+            Instrumentation.stop("decode", timing, bytesRead=os.path.getsize(pathImage))
+
+        return image
 
     def __getLengthDataset(self):
         """
@@ -27,126 +177,111 @@ class OmniglotDataloader(object):
 
         return image1, image2, label -> 0 if equal, 1 if different
         """
-        index1 = random.randrange(0 , self.__getLengthDataset())
-        index2 = random.randrange(0 , self.__getLengthDataset())
+        index1, index2 = (int(index) for index in self.__pairSampler.getGenerator().integers(0, self.__getLengthDataset(), 2))
 
-        image1, label1 = self.omniglot[index1]
-        image2, label2 = self.omniglot[index2]
+        image1 = self.__decodeImage(index1)
+        image2 = self.__decodeImage(index2)
 
-        if label1 == label2:
+        if self.__labels[index1] == self.__labels[index2]:
             label = 1.0
         else:
             label = 0.0
 
-        return np.asarray(image1), np.asarray(image2), label
-
-    def __getIndexesSameClass(self, index):
-        """
-        Method to obtain a range of indexes sample class
-        """
-        downIndex = index
-        upIndex = index
-
-        lengthDataset = self.__getLengthDataset()
-
-        currentClass = self.omniglot[index][1]
-
-        counter = index
-        while(True):
-            counter -= 1
-            if counter <= 0:
-                break
-            nextClass = self.omniglot[counter][1]
-            if nextClass == currentClass:
-                downIndex = counter
-            else:
-                break
-
-        counter = index
-        while(True):
-            counter += 1
-            if counter >= lengthDataset:
-                break
-            nextClass = self.omniglot[counter][1]
-            if nextClass == currentClass:
-                upIndex = counter
-            else:
-                break
-
-        return downIndex, upIndex
-
-    def __getBatchImagesByRange(self, indexDown, indexUp, size, exclude):
-        """
-        Method to obtain batch by receiving a range and excluding or including such range
-
-        indexDown : int
-        indexUp : int
-        size : int -> size of the batch
-        exclude : boolean -> if true the range is excluded, when false the images are obtained from the range
-        """
-        batchImages1 = []
-        batchImages2 = []
-        batchLabels = []
-        rangeIndexes = [i for i in range(indexDown, indexUp + 1)]
-        indexImage1 = indexDown
-        for _ in range(size):
-            if exclude:
-                batchLabels.append(0.0)
-                while(True):
-                    indexImage2 = random.randrange(0, self.__getLengthDataset())
-                    if indexImage2 not in rangeIndexes:
-                        break
-            else:
-                batchLabels.append(1.0)
-                while(True):
-                    indexImage2 = random.randrange(indexDown, indexUp + 1)
-                    if indexImage2 != indexImage1:
-                        break
-
-            batchImages1.append(np.asarray(self.omniglot[indexImage1][0]))
-            batchImages2.append(np.asarray(self.omniglot[indexImage2][0]))
-
-            if indexImage1 == indexUp:
-                indexImage1 = indexDown
-
-            indexImage1 += 1
-
-        return batchImages1, batchImages2, batchLabels
+        return image1, image2, label
 
     def getSample(self, index):
         """
         Method to get a sample
         """
-        return np.asarray(self.omniglot[index][0]), self.omniglot[index][1]
+        return self.__decodeImage(index), int(self.__labels[index])
 
-    def getRandomBatchSample(self, batchSize):
+    def __readImage(self, index, out=None, cache=None):
+        """
+        Tool to load the image of a sample as uint8, into out when it is given
+
+        index : int
+        out : numpy array uint8 (height, width) or None
+        cache : ImageCache or None -> cache used instead of the cache of the loader
+        """
+        image = self.__decodeImage(index, cache)
+        if out is None:
+            return image
+        if out.shape != image.shape:
+            raise Exception("Images of different size can not be stacked : " + str(index) + " " + str(image.shape))
+
+        out[...] = image
+        return out
+
+    def getRandomBatchSample(self, batchSize, stacked=False, out=None):
         """
         Method to get a batch, the half of the batch contain images with the same class and the another half images with different class
 
         batchSize -> size of the batch
+        stacked : boolean -> if true the images are returned as uint8 arrays (batchSize, height, width) and the labels
+            as a float32 array (batchSize,), the arrays are reused and overwritten by the next stacked call
+        out : tuple or None -> (images1, images2, labels) arrays the stacked batch is written into
 
         return batchImages1, batchImage2, batchLabels
         """
-        index = random.randrange(0 , self.__getLengthDataset())
-        rangeIndexes = self.__getIndexesSameClass(index)
+        timing = Instrumentation.enabled and Instrumentation.start()
+        indexes1, indexes2, labels = self.__pairSampler.sampleBatch(batchSize)
+        self.__batchIndexes = (indexes1, indexes2)
+        if timing:
+            Instrumentation.stop("samplePick", timing, items=len(labels))
 
-        batchImages1Equal, batchImages2Equal, batchLabelsEqual = self.__getBatchImagesByRange(
-            rangeIndexes[0],
-            rangeIndexes[1],
-            int(batchSize/2),
-            exclude=False,
-        )
-
-        batchImages1Different, batchImages2Different, batchLabelsDifferent = self.__getBatchImagesByRange(
-            rangeIndexes[0],
-            rangeIndexes[1],
-            int(batchSize/2),
-            exclude=True,
-        )
+        if stacked or out is not None:
+            timing = Instrumentation.enabled and Instrumentation.start()
+            batch = self.__batchBuffer.stackPairs(indexes1, indexes2, labels, self.__readImage, np.uint8, out)
+            if self.__augmentation is not None:
+                batch = self.__augmentation.applyPairs(*batch, inPlace=True)
+            if timing:
+                Instrumentation.stop("collate", timing, items=len(labels))
+            return batch
 
-        batchImages1 = batchImages1Equal + batchImages1Different
-        batchImages2 = batchImages2Equal + batchImages2Different
-        batchLabels = batchLabelsEqual + batchLabelsDifferent
+        batchImages1 = [self.__decodeImage(index) for index in indexes1]
+        batchImages2 = [self.__decodeImage(index) for index in indexes2]
+        batchLabels = labels.tolist()
 
         return batchImages1, batchImages2, batchLabels
 
+    def getEpisodes(self, numberEpisodes, ways, shots, queries, seed=None):
+        """
+        Method to iterate over few shot episodes, the indexes of up to episodeChunk episodes are drawn at once and the
+        support images are kept decoded in a small cache. Only the episodes iterated are drawn, the same seed gives
+        the same sequence of episodes whatever their number
+
+        numberEpisodes : int
+        ways : int -> characters of each episode
+        shots : int -> support images of each character
+        queries : int -> query images of each character
+        seed : int or None -> seed of the episodes, the generator of the loader is used when None
+
+        return generator of supportImages, supportLabels, queryImages, queryLabels, classes -> images uint8 arrays
+            (ways * shots, height, width) and (ways * queries, height, width) ordered by class, labels int64 arrays
+            with the position of the class in classes. The image arrays are reused and overwritten by the next episode
+        """
+        generator = np.random.default_rng(seed) if seed is not None else None
+        supportLabels = np.repeat(np.arange(ways, dtype=np.int64), shots)
+        queryLabels = np.repeat(np.arange(ways, dtype=np.int64), queries)
+
+        readSupport = lambda index, out: self.__readImage(index, out, self.__supportCache)
+
+        for start in range(0, numberEpisodes, OmniglotDataloader.episodeChunk):
+            timing = Instrumentation.enabled and Instrumentation.start()
+            chunk = min(OmniglotDataloader.episodeChunk, numberEpisodes - start)
+            classes, support, query = self.__episodeSampler.sample(ways, shots, queries, chunk, generator)
+            if timing:
+                Instrumentation.stop("samplePick", timing, items=len(classes))
+            for episode in range(chunk):
+                timing = Instrumentation.enabled and Instrumentation.start()
+                supportImages = self.__batchBuffer.stackImages("supportImages", support[episode].reshape(-1), readSupport, np.uint8)
+                queryImages = self.__batchBuffer.stackImages("queryImages", query[episode].reshape(-1), self.__readImage, np.uint8)
+                if timing:
+                    Instrumentation.stop("collate", timing, items=len(supportImages) + len(queryImages))
+                yield supportImages, supportLabels, queryImages, queryLabels, classes[episode]
+
+    def getEpisode(self, ways, shots, queries, seed=None):
+        """
+        Method to obtain a few shot episode, as returned by getEpisodes
+        """
+        return next(self.getEpisodes(1, ways, shots, queries, seed))
@@ -0,0 +1,164 @@
+import numpy as np
+
+class PairSampler(object):
+    """
+    Class to sample pairs of sample indexes with the same class (positive) or different classes (negative) from
+    an array of labels, a whole batch of pairs is drawn with vectorized numpy operations
+
+    labels : numpy array of int -> label of each sample
+    generator : numpy.random.Generator, int or None -> generator or seed used for every draw
+    balanced : boolean -> if true the classes of the pairs are drawn uniformly, otherwise proportionally to their size
+    """
+    def __init__(self, labels, generator=None, balanced=True):
+        labels = np.asarray(labels)
+        if labels.ndim != 1 or len(labels) == 0:
+            raise Exception("Labels must be a non empty 1 dimensional array")
+
+        if isinstance(generator, np.random.Generator) is False:
+            generator = np.random.default_rng(generator)
+
+        self.__generator = generator
+        self.__balanced = balanced
+        self.__classes, classLabels = np.unique(labels, return_inverse=True)
+        self.__classLabels = classLabels.reshape(-1).astype(np.int64)
+        self.__classOrder = np.argsort(self.__classLabels, kind="stable").astype(np.int64)
+        self.__classCounts = np.bincount(self.__classLabels, minlength=len(self.__classes)).astype(np.int64)
+        self.__classOffsets = np.zeros(len(self.__classes) + 1, dtype=np.int64)
+        np.cumsum(self.__classCounts, out=self.__classOffsets[1:])
+
+        self.__positiveClasses = np.flatnonzero(self.__classCounts >= 2)
+        self.__negativeWeights = None
+        self.__negativeHook = None
+
+    def getGenerator(self):
+        """
+        Method to obtain the random generator of the sampler
+        """
+        return self.__generator
+
+    def getClassLabels(self):
+        """
+        Method to obtain the class of each sample as an index into the sorted unique labels
+        """
+        return self.__classLabels
+
+    def getClassIndexes(self, classIndex):
+        """
+        Method to obtain the indexes of the samples of a class
+
+        classIndex : int -> index into the sorted unique labels
+        """
+        return self.__classOrder[self.__classOffsets[classIndex]:self.__classOffsets[classIndex + 1]]
+
+    def setNegativeWeights(self, weights):
+        """
+        Method to set a weight per sample used to draw the second sample of the negative pairs, for example to
+        draw hard negatives more often, None restores uniform sampling
+
+        weights : numpy array of float (numberSamples,) or None
+        """
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+            if weights.shape != self.__classLabels.shape or (weights < 0).any():
+                raise Exception("Negative weights must be one non negative value per sample")
+            self.__negativeWeights = np.concatenate([[0.0], np.cumsum(weights[self.__classOrder])])
+        else:
+            self.__negativeWeights = None
+
+    def setNegativeHook(self, hook):
+        """
+        Method to set a function that can replace the negatives drawn by the sampler, None removes it
+
+        hook : function or None -> hook(anchors, negatives, generator) returning an array of negatives for the anchors,
+            every negative must have a class different from its anchor
+        """
+        self.__negativeHook = hook
+
+    def __sampleClasses(self, size, eligible):
+        """
+        Tool to draw the classes of the anchors
+
+        size : int
+        eligible : numpy array -> classes that can be drawn
+        """
+        if self.__balanced:
+            return eligible[self.__generator.integers(0, len(eligible), size)]
+
+        counts = self.__classCounts[eligible]
+        positions = self.__generator.integers(0, counts.sum(), size)
+        return eligible[np.searchsorted(np.cumsum(counts), positions, side="right")]
+
+    def __samplePositives(self, classes):
+        """
+        Tool to draw two different samples of each class
+        """
+        counts = self.__classCounts[classes]
+        offsets = self.__classOffsets[classes]
+
+        positions1 = (self.__generator.random(len(classes)) * counts).astype(np.int64)
+        positions2 = (self.__generator.random(len(classes)) * (counts - 1)).astype(np.int64)
+        positions2 += positions2 >= positions1
+
+        return self.__classOrder[offsets + positions1], self.__classOrder[offsets + positions2]
+
+    def __sampleNegatives(self, classes):
+        """
+        Tool to draw an anchor of each class and a sample of any other class, uniformly or with the negative weights
+        """
+        counts = self.__classCounts[classes]
+        offsets = self.__classOffsets[classes]
+        anchors = self.__classOrder[offsets + (self.__generator.random(len(classes)) * counts).astype(np.int64)]
+
+        if self.__negativeWeights is None:
+            positions = (self.__generator.random(len(classes)) * (len(self.__classOrder) - counts)).astype(np.int64)
+            positions += counts * (positions >= offsets)
+        else:
+            cumulative = self.__negativeWeights
+            classWeights = cumulative[offsets + counts] - cumulative[offsets]
+            if ((cumulative[-1] - classWeights) <= 0).any():
+                raise Exception("Negative weights are zero for every sample outside a class")
+            values = self.__generator.random(len(classes)) * (cumulative[-1] - classWeights)
+            values += classWeights * (values >= cumulative[offsets])
+            positions = np.searchsorted(cumulative, values, side="right") - 1
+            positions = np.clip(positions, 0, len(self.__classOrder) - 1)
+
+        negatives = self.__classOrder[positions]
+        if self.__negativeHook is not None:
+            negatives = np.asarray(self.__negativeHook(anchors, negatives, self.__generator), dtype=np.int64)
+
+        return anchors, negatives
+
+    def sample(self, size, positive):
+        """
+        Method to draw pairs of samples
+
+        size : int -> number of pairs
+        positive : boolean -> if true both samples of a pair have the same class, otherwise different classes
+
+        return indexes1, indexes2 -> numpy arrays int64
+        """
+        if positive:
+            if len(self.__positiveClasses) == 0:
+                raise Exception("No class has two samples to build positive pairs")
+            return self.__samplePositives(self.__sampleClasses(size, self.__positiveClasses))
+
+        if len(self.__classes) < 2:
+            raise Exception("At least two classes are needed to build negative pairs")
+        return self.__sampleNegatives(self.__sampleClasses(size, np.arange(len(self.__classes))))
+
+    def sampleBatch(self, batchSize):
+        """
+        Method to draw a batch whose first half are positive pairs and second half negative pairs
+
+        batchSize : int
+
+        return indexes1, indexes2, labels -> labels is 1.0 for positive pairs and 0.0 for negative pairs
+        """
+        half = int(batchSize / 2)
+        positives1, positives2 = self.sample(half, True)
+        negatives1, negatives2 = self.sample(half, False)
+
+        labels = np.zeros(2 * half, dtype=np.float32)
+        labels[:half] = 1.0
+
+        return np.concatenate([positives1, negatives1]), np.concatenate([positives2, negatives2]), labels
@@ -0,0 +1,206 @@
+import numpy as np
+
+class PixelStatistics(object):
+    """
+    Class to accumulate the pixel statistics of a stream of images in a single pass per image, the partial
+    states of different chunks of images can be merged with the parallel formulation of Welford's algorithm
+
+    histogram : boolean -> if true a histogram of the pixel values per channel is also accumulated, uint8 images only
+    """
+    histogramBins = 256
+
+    def __init__(self, histogram=False):
+        self.__histogramEnabled = histogram
+        self.__state = {
+            "channels" : None,
+            "count" : 0,
+            "mean" : None,
+            "m2" : None,
+            "min" : None,
+            "max" : None,
+            "minWidth" : None,
+            "maxWidth" : None,
+            "minHeight" : None,
+            "maxHeight" : None,
+            "numberImages" : 0,
+            "imageMean" : None,
+            "imageM2" : None,
+            "histogram" : None,
+        }
+
+    def __mergeMoments(countA, meanA, m2A, countB, meanB, m2B):
+        """
+        Tool to merge the count, mean and sum of squared deviations of two sets of values
+
+        return count, mean, m2
+        """
+        count = countA + countB
+        delta = meanB - meanA
+        mean = meanA + delta * (countB / count)
+        m2 = m2A + m2B + (delta ** 2) * (countA * countB / count)
+
+        return count, mean, m2
+
+    def __imageMoments(self, pixels):
+        """
+        Tool to obtain the moments of the channels of an image, for uint8 images the values are taken from
+        a per channel bincount, which is the only pass over the pixels
+
+        pixels : numpy array (numberPixels, channels)
+
+        return mean, m2, min, max, histogram
+        """
+        if pixels.dtype == np.uint8:
+            histogram = np.empty((pixels.shape[1], PixelStatistics.histogramBins), dtype=np.int64)
+            for channel in range(pixels.shape[1]):
+                histogram[channel] = np.bincount(pixels[:, channel], minlength=PixelStatistics.histogramBins)
+
+            values = np.arange(PixelStatistics.histogramBins, dtype=np.float64)
+            mean = histogram @ values / len(pixels)
+            m2 = (histogram * (values[None, :] - mean[:, None]) ** 2).sum(axis=1)
+            present = np.flatnonzero(histogram.sum(axis=0))
+
+            return mean, m2, float(present[0]), float(present[-1]), histogram
+
+        pixels = pixels.astype(np.float64)
+        mean = pixels.mean(axis=0)
+        m2 = ((pixels - mean) ** 2).sum(axis=0)
+
+        return mean, m2, float(pixels.min()), float(pixels.max()), None
+
+    def update(self, image):
+        """
+        Method to add an image to the statistics
+
+        image : numpy array (height, width) or (height, width, channels)
+        """
+        image = np.asarray(image)
+        pixels = image.reshape(image.shape[0] * image.shape[1], -1)
+        mean, m2, imageMin, imageMax, histogram = self.__imageMoments(pixels)
+
+        self.merge({
+            "channels" : pixels.shape[1],
+            "count" : len(pixels),
+            "mean" : mean,
+            "m2" : m2,
+            "min" : imageMin,
+            "max" : imageMax,
+            "minWidth" : image.shape[0],
+            "maxWidth" : image.shape[0],
+            "minHeight" : image.shape[1],
+            "maxHeight" : image.shape[1],
+            "numberImages" : 1,
+            "imageMean" : mean,
+            "imageM2" : np.zeros(len(mean)),
+            "histogram" : histogram if self.__histogramEnabled else None,
+        })
+
+    def merge(self, other):
+        """
+        Method to merge the state of other statistics into these ones
+
+        other : PixelStatistics or dict returned by getState
+        """
+        if isinstance(other, PixelStatistics):
+            other = other.getState()
+        if other["numberImages"] == 0:
+            return
+
+        state = self.__state
+        if state["numberImages"] == 0:
+            state.update({key : other[key] for key in list(state.keys())})
+            if self.__histogramEnabled is False:
+                state.update({"histogram" : None})
+            return
+
+        if state["channels"] != other["channels"]:
+            raise Exception("Images with different number of channels : " + str(state["channels"]) + ", " + str(other["channels"]))
+
+        count, mean, m2 = PixelStatistics.__mergeMoments(
+            state["count"], state["mean"], state["m2"],
+            other["count"], other["mean"], other["m2"],
+        )
+        numberImages, imageMean, imageM2 = PixelStatistics.__mergeMoments(
+            state["numberImages"], state["imageMean"], state["imageM2"],
+            other["numberImages"], other["imageMean"], other["imageM2"],
+        )
+
+        histogram = None
+        if self.__histogramEnabled and state["histogram"] is not None and other["histogram"] is not None:
+            histogram = state["histogram"] + other["histogram"]
+
+        state.update({
+            "count" : count,
+            "mean" : mean,
+            "m2" : m2,
+            "min" : min(state["min"], other["min"]),
+            "max" : max(state["max"], other["max"]),
+            "minWidth" : min(state["minWidth"], other["minWidth"]),
+            "maxWidth" : max(state["maxWidth"], other["maxWidth"]),
+            "minHeight" : min(state["minHeight"], other["minHeight"]),
+            "maxHeight" : max(state["maxHeight"], other["maxHeight"]),
+            "numberImages" : numberImages,
+            "imageMean" : imageMean,
+            "imageM2" : imageM2,
+            "histogram" : histogram,
+        })
+
+    def getState(self):
+        """
+        Method to obtain the partial state, it can be merged into other statistics
+        """
+        return self.__state
+
+    def getNumberImages(self):
+        """
+        Method to obtain the number of images added
+        """
+        return self.__state["numberImages"]
+
+    def getStandardError(self):
+        """
+        Method to estimate the standard error of the mean pixel value, from the spread of the mean of each image,
+        the largest error over the channels is returned
+
+        return float -> inf when less than two images were added
+        """
+        numberImages = self.__state["numberImages"]
+        if numberImages < 2:
+            return float("inf")
+
+        variance = self.__state["imageM2"] / (numberImages - 1)
+        return float(np.sqrt(variance / numberImages).max())
+
+    def getResults(self):
+        """
+        Method to obtain the normalization parameters, the scalar values are over all the channels
+
+        return dict
+        """
+        state = self.__state
+        if state["numberImages"] == 0:
+            raise Exception("No images added to the statistics")
+
+        average = state["mean"].mean()
+        m2 = state["m2"].sum() + (state["count"] * (state["mean"] - average) ** 2).sum()
+        deviation = (m2 / (state["count"] * state["channels"])) ** (1/2)
+
+        results = {
+            "average" : float(average),
+            "deviation" : float(deviation),
+            "min" : float(state["min"]),
+            "max" : float(state["max"]),
+            "minWidth" : float(state["minWidth"]),
+            "maxWidth" : float(state["maxWidth"]),
+            "minHeight" : float(state["minHeight"]),
+            "maxHeight" : float(state["maxHeight"]),
+            "averageChannels" : [float(value) for value in state["mean"]],
+            "deviationChannels" : [float(value) for value in np.sqrt(state["m2"] / state["count"])],
+            "numberImages" : int(state["numberImages"]),
+        }
+        if state["histogram"] is not None:
+            results.update({
+                "histogram" : state["histogram"].tolist(),
+            })
+
+        return results
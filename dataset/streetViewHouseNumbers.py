@@ -1,31 +1,52 @@
 import os
+import collections
+import concurrent.futures
 import tarfile
-from tokenize import Double
-import requests
+import threading
+import time
 import numpy as np
-from PIL import Image
-import h5py
-import random
 from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+from ai_dataloader.dataset.svhnIndex import SVHNIndex
+from ai_dataloader.dataset.svhnPreparation import SVHNPreparation
+from ai_dataloader.dataset.pixelStatistics import PixelStatistics
+from ai_dataloader.dataset.imageStore import ImageStore
+from ai_dataloader.dataset.imageStoreWriter import ImageStoreWriter
+from ai_dataloader.dataset.downloader import Downloader
+from ai_dataloader.dataset.epochSampler import EpochSampler
+from ai_dataloader.dataset.digitCrops import DigitCrops
+from ai_dataloader.instrumentation.instrumentation import Instrumentation
 
 class SVHN(object):
     """
     Class to manage Stree View House Numbers dataset
     http://ufldl.stanford.edu/housenumbers/
     """
-    def __init__(self, pathData):
+    def __init__(self, pathData, groundTruthFormat="json", baseUrl="http://ufldl.stanford.edu/housenumbers/", rank=0, worldSize=1, seed=None):
         """
         pathData : String path where the dataset will be downloaded
+        groundTruthFormat : String -> json, packed. With packed the boxes are stored as .npy files, memory mapped
+            and getSample returns the boxes of an image as a structured array view instead of a dict
+        baseUrl : String -> url the dataset files are downloaded from
+        rank : int -> index of the process among the processes sharing the random samples of getRandomSample
+        worldSize : int -> number of processes sharing the random samples, each one obtains a disjoint shard
+        seed : int or None -> seed of the epoch permutations, it must be given and be the same in every process
+            when worldSize is greater than 1
         """
+        if groundTruthFormat not in ["json", "packed"]:
+            raise Exception("Unexpected ground truth format : " + str(groundTruthFormat))
+        if worldSize > 1 and seed is None:
+            raise Exception("A seed shared by every process is needed when worldSize is greater than 1")
+
         self.__pathData = pathData
+        self.__groundTruthFormat = groundTruthFormat
         self.__nonCropDatasetUrl = {
-            "train" : "http://ufldl.stanford.edu/housenumbers/train.tar.gz",
-            "test" : "http://ufldl.stanford.edu/housenumbers/test.tar.gz",
+            "train" : baseUrl + "train.tar.gz",
+            "test" : baseUrl + "test.tar.gz",
         }
 
         self.__cropDatasetUrl = {
-            "train" : "http://ufldl.stanford.edu/housenumbers/train_32x32.mat",
-            "test" : "http://ufldl.stanford.edu/housenumbers/test_32x32.mat",
+            "train" : baseUrl + "train_32x32.mat",
+            "test" : baseUrl + "test_32x32.mat",
         }
 
         self.__targetFile = {
@@ -33,11 +54,23 @@ class SVHN(object):
             "test" : "test.tar.gz",
         }
 
+        self.__cropTargetFile = {
+            "train" : os.path.join("train", "train_32x32.mat"),
+            "test" : os.path.join("test", "test_32x32.mat"),
+        }
+
+        self.__downloadMarkerFile = "download.json"
+        self.__cropDownloadMarkerFile = "downloadCrop.json"
+
         self.__imageFormat = ".png"
+        self.__statisticsChunkSize = 256
 
         groundTruthFile = "digitStruct.mat"
         groundTruthJsonFile = "groundTruth.json"
+        groundTruthBoxesFile = "groundTruthBoxes.npy"
+        groundTruthOffsetsFile = "groundTruthOffsets.npy"
         jsonImagesIndex = "jsonImagesIndex.json"
+        packedImagesIndex = "imagesIndex.npz"
         normalizationParametersFile = "normalizationParameters.json"
         trainFolder = os.path.join("train", "train")
         testFolder = os.path.join("test", "test")
@@ -45,20 +78,34 @@ class SVHN(object):
         groundTruthTestFolder = os.path.join("test", "groundTruth")
         imagesDirectoryTrainFolder = os.path.join("train", "imagesDirectory")
         imagesDirectoryTestFolder = os.path.join("test", "imagesDirectory")
+        imageStoreTrainFolder = os.path.join("train", "imageStore")
+        imageStoreTestFolder = os.path.join("test", "imageStore")
+        digitCropsTrainFolder = os.path.join("train", "digitCrops")
+        digitCropsTestFolder = os.path.join("test", "digitCrops")
 
         self.__folderStructure = {
             "train" : {
                 "folder" : trainFolder,
                 "groundTruthFile" : os.path.join(trainFolder, groundTruthFile),
                 "jsonGroundTruth" : os.path.join(groundTruthTrainFolder, groundTruthJsonFile),
+                "packedGroundTruthBoxes" : os.path.join(groundTruthTrainFolder, groundTruthBoxesFile),
+                "packedGroundTruthOffsets" : os.path.join(groundTruthTrainFolder, groundTruthOffsetsFile),
                 "jsonImagesIndex" : os.path.join(imagesDirectoryTrainFolder, jsonImagesIndex),
+                "packedImagesIndex" : os.path.join(imagesDirectoryTrainFolder, packedImagesIndex),
                 "jsonNormalizationParameters" : os.path.join(imagesDirectoryTrainFolder, normalizationParametersFile),
+                "imageStore" : imageStoreTrainFolder,
+                "digitCrops" : digitCropsTrainFolder,
             },
             "test" : {
                 "folder" : testFolder,
                 "groundTruthFile" : os.path.join(testFolder, groundTruthFile),
                 "jsonGroundTruth" : os.path.join(groundTruthTestFolder, groundTruthJsonFile),
+                "packedGroundTruthBoxes" : os.path.join(groundTruthTestFolder, groundTruthBoxesFile),
+                "packedGroundTruthOffsets" : os.path.join(groundTruthTestFolder, groundTruthOffsetsFile),
                 "jsonImagesIndex" : os.path.join(imagesDirectoryTestFolder, jsonImagesIndex),
+                "packedImagesIndex" : os.path.join(imagesDirectoryTestFolder, packedImagesIndex),
+                "imageStore" : imageStoreTestFolder,
+                "digitCrops" : digitCropsTestFolder,
             },
         }
         self.__matKeys = {
@@ -73,340 +120,870 @@ class SVHN(object):
             }
         }
 
-        self.__randomList = {
-            "train" : list(),
-            "test" : list(),
+        self.__rank = rank
+        self.__worldSize = worldSize
+        self.__seed = seed if seed is not None else int(np.random.SeedSequence().generate_state(1)[0])
+        self.__samplers = {
+            "train" : None,
+            "test" : None,
+        }
+
+        self.__index = SVHNIndex()
+
+        self.__imageStores = {
+            "train" : None,
+            "test" : None,
         }
 
-        self.__randomListIndex = {
-            "train" : 0,
-            "test" : 0,
+        self.__digitCrops = {
+            "train" : None,
+            "test" : None,
         }
 
-    def __checkH5pyDatasetType(self, value, matFile):
+        self.__batchLock = threading.Lock()
+        self.__batchExecutor = None
+        self.__batchWorkers = None
+        self.__bucketShapes = dict()
+
+    def __submit(self, executor, function, *arguments):
+        """
+        Private method to run a function in the process pool, or in the calling process when there is no pool
+
+        executor : concurrent.futures.ProcessPoolExecutor or None
+        function : function -> must be picklable to run in the pool
+
+        return concurrent.futures.Future
         """
-        Checks if the value is type reference or value and returns its value
+        if executor is None:
+            future = concurrent.futures.Future()
+            future.set_result(function(*arguments))
+            return future
+
+        return executor.submit(function, *arguments)
 
-        value : String or Reference
-        matFile : h5py file
+    def __chunkSize(self, size, workers):
         """
-        if type(value) == h5py.h5r.Reference:
-            return int(np.array(matFile[value]).squeeze())
-        elif type(value) == np.float64:
-            return int(value)
-        else:
-            raise Exception("Unexpected type : " + type(value))
-    
-    def __unpackGroundTruth(self, path):
+        Private method to obtain the size of the chunks a split is sharded into, a few chunks per worker
+        so the workers stay busy when the chunks take different time
+
+        size : int
+        workers : int
+        """
+        if workers <= 1:
+            return max(size, 1)
+
+        return max(-(-size // (workers * 4)), 1)
+
+    def __boxesToJson(self, boxes, offsets):
+        """
+        Private method to build the content of groundTruth.json from the boxes arrays
+
+        boxes : numpy array with dtype boxDtype
+        offsets : numpy array int64
+        """
+        fields = SVHNIndex.boxFields
+        columns = [boxes[field].tolist() for field in fields]
+        offsets = offsets.tolist()
+
+        jsonContent = dict()
+        for index in range(len(offsets) - 1):
+            numbers = dict()
+            for numberIndex, position in enumerate(range(offsets[index], offsets[index + 1])):
+                numbers.update({
+                    numberIndex : {fields[fieldIndex] : columns[fieldIndex][position] for fieldIndex in range(len(fields))},
+                })
+            jsonContent.update({
+                index : numbers,
+            })
+
+        return jsonContent
+
+    def __unpackGroundTruth(self, path, verbose=False, executor=None, workers=1):
         """
-        Private method to unpack from .mat file into csv
+        Private method to unpack from .mat file into json, with a pool the train and test splits and the chunks
+        of each split are extracted concurrently and merged in order
 
         path : String -> path where the dataset is stored
+        verbose : boolean -> if true the progress and throughput are reported
+        executor : concurrent.futures.ProcessPoolExecutor or None
+        workers : int -> number of workers of the pool
         """
+        startTime = time.perf_counter()
+        splits = dict()
         for key in list(self.__targetFile.keys()):
             groundTruthFile = os.path.join(
                 path,
                 self.__folderStructure[key]["groundTruthFile"],
             )
-            matFile = h5py.File(groundTruthFile)
-            matBox = matFile[self.__matKeys["digitStruct"]][self.__matKeys["box"]]
-
-            index = 0
+            timing = Instrumentation.enabled and Instrumentation.start()
+            numberImages = SVHNPreparation.countImages(groundTruthFile, self.__matKeys)
+            message = "Unpacking " + key + " ground truth" if verbose else None
+
+            futures = list()
+            for start, stop in SVHNPreparation.chunkRanges(numberImages, self.__chunkSize(numberImages, workers)):
+                futures.append(self.__submit(
+                    executor,
+                    SVHNPreparation.extractBoxes,
+                    groundTruthFile,
+                    self.__matKeys,
+                    start,
+                    stop,
+                    message if executor is None else None,
+                ))
+
+            splits.update({
+                key : {
+                    "futures" : futures,
+                    "message" : message,
+                    "numberImages" : numberImages,
+                    "groundTruthFile" : groundTruthFile,
+                    "timing" : timing,
+                }
+            })
 
-            jsonContent = dict()
-            for box in matBox:
-                referenceBox = matFile[box[0]]
+        for key in list(splits.keys()):
+            chunks = list()
+            done = 0
+            for future in splits[key]["futures"]:
+                chunks.append(future.result())
+                reported = done // 1000
+                done += len(chunks[-1][1]) - 1
+                if executor is not None and splits[key]["message"] is not None:
+                    if done // 1000 > reported or done == splits[key]["numberImages"]:
+                        SVHNPreparation.reportProgress(splits[key]["message"], done, splits[key]["numberImages"], startTime)
+
+            boxes, offsets = SVHNPreparation.mergeBoxes(chunks)
+            if splits[key]["timing"]:
+                Instrumentation.stop(
+                    "groundTruthRead",
+                    splits[key]["timing"],
+                    bytesRead=os.path.getsize(splits[key]["groundTruthFile"]),
+                    items=splits[key]["numberImages"],
+                )
 
-                numbers = dict()
+            JsonHandler.saveJson(
+                os.path.join(path, self.__folderStructure[key]["jsonGroundTruth"]),
+                self.__boxesToJson(boxes, offsets),
+            )
 
-                if referenceBox[self.__matKeys["boxKeys"]["height"]].shape[0] == 1:
-                    height = self.__checkH5pyDatasetType(
-                        referenceBox[self.__matKeys["boxKeys"]["height"]][0][0],
-                        matFile,
-                    )
-                    width = self.__checkH5pyDatasetType(
-                        referenceBox[self.__matKeys["boxKeys"]["width"]][0][0],
-                        matFile,
-                    )
-                    top = self.__checkH5pyDatasetType(
-                        referenceBox[self.__matKeys["boxKeys"]["top"]][0][0],
-                        matFile,
-                    )
-                    left = self.__checkH5pyDatasetType(
-                        referenceBox[self.__matKeys["boxKeys"]["left"]][0][0],
-                        matFile,
-                    )
-                    label = self.__checkH5pyDatasetType(
-                        referenceBox[self.__matKeys["boxKeys"]["label"]][0][0],
-                        matFile,
-                    )
-                    numbers.update({
-                        0 : {
-                            "height" : height,
-                            "width" : width,
-                            "top" : top,
-                            "left" : left,
-                            "label" : label,
-                        }
-                    })
-                else:
-                    for numberIndex in range(referenceBox[self.__matKeys["boxKeys"]["height"]].shape[0]):
-                        height = self.__checkH5pyDatasetType(
-                            referenceBox[self.__matKeys["boxKeys"]["height"]][numberIndex][0],
-                            matFile,
-                        )
-                        width = self.__checkH5pyDatasetType(
-                            referenceBox[self.__matKeys["boxKeys"]["width"]][numberIndex][0],
-                            matFile,
-                        )
-                        top = self.__checkH5pyDatasetType(
-                            referenceBox[self.__matKeys["boxKeys"]["top"]][numberIndex][0],
-                            matFile,
-                        )
-                        left = self.__checkH5pyDatasetType(
-                            referenceBox[self.__matKeys["boxKeys"]["left"]][numberIndex][0],
-                            matFile,
-                        )
-                        label = self.__checkH5pyDatasetType(
-                            referenceBox[self.__matKeys["boxKeys"]["label"]][numberIndex][0],
-                            matFile,
-                        )
-                        numbers.update({
-                            numberIndex : {
-                                "height" : height,
-                                "width" : width,
-                                "top" : top,
-                                "left" : left,
-                                "label" : label,
-                            }
-                        })
-                jsonContent.update({
-                    index : numbers,
-                })
-                index += 1
+    def __packGroundTruth(self, path):
+        """
+        Private method to convert the json ground truth into the packed .npy format
 
-            JsonHandler.saveJson(
+        path : String -> path where the dataset is stored
+        """
+        for key in list(self.__targetFile.keys()):
+            SVHNIndex.convertJsonGroundTruth(
                 os.path.join(path, self.__folderStructure[key]["jsonGroundTruth"]),
-                jsonContent,
+                os.path.join(path, self.__folderStructure[key]["packedGroundTruthBoxes"]),
+                os.path.join(path, self.__folderStructure[key]["packedGroundTruthOffsets"]),
             )
 
-    def __indexImages(self, path):
+    def __packImagesIndex(self, path):
+        """
+        Private method to convert the json images index into the packed .npz format
+
+        path : String -> path where the dataset is stored
+        """
+        for key in list(self.__targetFile.keys()):
+            SVHNIndex.saveImagesIndex(
+                os.path.join(path, self.__folderStructure[key]["jsonImagesIndex"]),
+                os.path.join(path, self.__folderStructure[key]["packedImagesIndex"]),
+            )
+
+    def __indexImages(self, path, executor=None):
         """
         Private method to store location of the images
 
         path : String -> path where the dataset is stored
+        executor : concurrent.futures.ProcessPoolExecutor or None
         """
+        futures = dict()
         for key in list(self.__targetFile.keys()):
             pathImages = os.path.join(
                 path,
                 self.__folderStructure[key]["folder"],
             )
+            futures.update({
+                key : self.__submit(executor, SVHNPreparation.indexImages, pathImages, self.__imageFormat),
+            })
 
-            index = 0
-            imagesDirectory = dict()
-            while(True):
-                indexImage = index + 1
-                imageFileName = str(indexImage) + self.__imageFormat
-                imageFile = os.path.join(pathImages, imageFileName)
-
-                if os.path.isfile(imageFile):
-                    imagesDirectory.update({
-                        index : imageFile,
-                    })
-                else:
-                    break
-
-                index += 1
+        for key in list(futures.keys()):
+            imagesDirectory = futures[key].result()
 
             if len(list(imagesDirectory.keys())) == 0:
-                raise Exception("No " + key + " images in the path : " + pathImages)
+                raise Exception("No " + key + " images in the path : " + os.path.join(path, self.__folderStructure[key]["folder"]))
 
             JsonHandler.saveJson(
                 os.path.join(path, self.__folderStructure[key]["jsonImagesIndex"]),
                 imagesDirectory,
             )
 
-    def __normalizationParameters(self, path):
+    def __normalizationParameters(self, path, executor=None, workers=1, histogram=False, tolerance=None):
         """
-        Privare method to calculate normalization parameters and store them in a json
+        Privare method to calculate normalization parameters and store them in a json, the images are split in chunks
+        of fixed size whose partial statistics are computed by the workers and merged in order, so the result does not
+        depend on the number of workers
 
         path : String
+        executor : concurrent.futures.ProcessPoolExecutor or None
+        workers : int -> number of workers of the pool
+        histogram : boolean -> if true the histogram of the pixel values per channel is stored as well
+        tolerance : float or None -> if not None the images are visited in a random order and the computation stops
+            once the standard error of the mean pixel value falls below tolerance
         """
         listImages = JsonHandler.loadJson(
             os.path.join(path, self.__folderStructure["train"]["jsonImagesIndex"])
         )
-
-        sumPixels = 0
-        sumVariation = 0
-        min = 0
-        max = 0
-        countPixels = 0
-        minHeight = 0
-        maxHeight = 0
-        minWidth = 0
-        maxWidth = 0
-        firstSample = True
-        for key in list(listImages.keys()):
-            image = np.asarray(Image.open(listImages[key]))
-
-            if firstSample:
-                minWidth = image.shape[0]
-                minHeight = image.shape[1]
-                maxWidth = image.shape[0]
-                maxHeight = image.shape[1]
-                min = image.min()
-                max = image.max()
-                firstSample = False
-
-            numberPixels = np.prod(image.shape)
-            countPixels += numberPixels
-
-            sumPixels += image.mean() * numberPixels
-            sumVariation += (image.std() ** 2) * numberPixels
-
-            imageMin = image.min()
-            imageMax = image.max()
-
-            imageWidth = image.shape[0]
-            imageHeight = image.shape[1]
-
-            if imageMin < min:
-                min = imageMin
-            if imageMax > max:
-                max = imageMax
-            if imageWidth < minWidth:
-                minWidth = imageWidth
-            if imageWidth > maxWidth:
-                maxWidth = imageWidth
-            if imageHeight < minHeight:
-                minHeight = imageHeight
-            if imageHeight > maxHeight:
-                maxHeight = imageHeight
-
-        average = sumPixels / countPixels
-        deviation = (sumVariation / countPixels) ** (1/2)
-
-        normalizationParameters = {
-            "average" : float(average),
-            "deviation" : float(deviation),
-            "min" : float(min),
-            "max" : float(max),
-            "minWidth" : float(minWidth),
-            "maxWidth" : float(maxWidth),
-            "minHeight" : float(minHeight),
-            "maxHeight" : float(maxHeight),
-        }
+        imageFiles = [listImages[key] for key in list(listImages.keys())]
+        if tolerance is not None:
+            order = np.random.default_rng(0).permutation(len(imageFiles))
+            imageFiles = [imageFiles[index] for index in order]
+
+        chunks = SVHNPreparation.chunkRanges(len(imageFiles), self.__statisticsChunkSize)
+        statistics = PixelStatistics(histogram)
+        pending = collections.deque()
+        nextChunk = 0
+        while nextChunk < len(chunks) or len(pending) > 0:
+            while nextChunk < len(chunks) and len(pending) < max(workers * 2, 1):
+                start, stop = chunks[nextChunk]
+                pending.append(self.__submit(executor, SVHNPreparation.pixelStatistics, imageFiles[start:stop], histogram))
+                nextChunk += 1
+
+            statistics.merge(pending.popleft().result())
+
+            if tolerance is not None and statistics.getStandardError() < tolerance:
+                for future in pending:
+                    future.cancel()
+                break
 
         JsonHandler.saveJson(
             os.path.join(path, self.__folderStructure["train"]["jsonNormalizationParameters"]),
-            normalizationParameters,
+            statistics.getResults(),
         )
 
-    def downloadDataset(self, crop=False):
+    def __buildImageStore(self, path, executor=None):
         """
-        Method to download dataset in a specific path and extract it
+        Private method to decode the images of each split once into an image store
 
-        crop : boolean if the cropped dataset is desired
+        path : String -> path where the dataset is stored
+        executor : concurrent.futures.ProcessPoolExecutor or None
         """
-        if os.path.exists(self.__pathData) is False:
-            os.makedirs(self.__pathData)
-            for key in list(self.__targetFile.keys()):
-                targetFile = os.path.join(self.__pathData, self.__targetFile[key])
-                targetPath = os.path.join(self.__pathData, key)
+        submit = None
+        if executor is not None:
+            submit = lambda function, *arguments: self.__submit(executor, function, *arguments)
 
-                if crop:
-                    response = requests.get( self.__cropDatasetUrl[key])
-                else:
-                    response = requests.get( self.__nonCropDatasetUrl[key])
+        for key in list(self.__targetFile.keys()):
+            listImages = JsonHandler.loadJson(
+                os.path.join(path, self.__folderStructure[key]["jsonImagesIndex"])
+            )
+            ImageStore.build(
+                os.path.join(path, self.__folderStructure[key]["imageStore"]),
+                [listImages[str(index)] for index in range(len(listImages))],
+                submit,
+            )
+            self.__imageStores.update({
+                key : None,
+            })
+
+    def __buildDigitCrops(self, path, executor=None, margin=0.15, square=True, size=32):
+        """
+        Private method to cut the digit boxes of each split into crops
+
+        path : String -> path where the dataset is stored
+        executor : concurrent.futures.ProcessPoolExecutor or None
+        margin : float
+        square : boolean
+        size : int
+        """
+        submit = None
+        if executor is not None:
+            submit = lambda function, *arguments: self.__submit(executor, function, *arguments)
+
+        for key in list(self.__targetFile.keys()):
+            tables = self.__getTables(key)
+            storePath = os.path.join(path, self.__folderStructure[key]["imageStore"])
+            if ImageStore.isAvailable(storePath) is False or len(ImageStore(storePath)) != len(tables["imagePaths"]):
+                storePath = None
+
+            DigitCrops.build(
+                os.path.join(path, self.__folderStructure[key]["digitCrops"]),
+                tables["imagePaths"],
+                tables,
+                storePath,
+                margin,
+                square,
+                size,
+                submit,
+            )
+            self.__digitCrops.update({
+                key : None,
+            })
+
+    def __isDownloaded(self, key, crop=False):
+        """
+        Private method to check if a split was completely downloaded and extracted, datasets downloaded before the
+        download marker existed are complete when the ground truth file is there and no archive was left behind
+
+        key : String -> train, test
+        crop : boolean -> if the cropped dataset is checked
+        """
+        if crop:
+            return os.path.exists(os.path.join(self.__pathData, key, self.__cropDownloadMarkerFile))
+
+        targetFile = os.path.join(self.__pathData, self.__targetFile[key])
+        if os.path.exists(os.path.join(self.__pathData, key, self.__downloadMarkerFile)):
+            return True
+
+        return (
+            os.path.exists(os.path.join(self.__pathData, self.__folderStructure[key]["groundTruthFile"]))
+            and os.path.exists(targetFile) is False
+            and os.path.exists(targetFile + Downloader.partSuffix) is False
+        )
+
+    def __saveDownloadMarker(self, key, url, digest, crop=False):
+        """
+        Private method to mark a split as completely downloaded
+
+        key : String -> train, test
+        url : String
+        digest : String -> sha256 of the downloaded file
+        crop : boolean -> if the cropped dataset was downloaded
+        """
+        JsonHandler.saveJson(
+            os.path.join(self.__pathData, key, self.__cropDownloadMarkerFile if crop else self.__downloadMarkerFile),
+            {
+                "url" : url,
+                "sha256" : digest,
+            },
+        )
+
+    def __downloadSplit(self, key, url, downloader, sha256):
+        """
+        Private method to download and extract a split, an interrupted download is resumed on the next call
+
+        key : String -> train, test
+        url : String
+        downloader : Downloader
+        sha256 : String or None -> expected digest of the archive
+        """
+        targetFile = os.path.join(self.__pathData, self.__targetFile[key])
+        targetPath = os.path.join(self.__pathData, key)
 
-                open(targetFile, "wb").write(response.content)
+        digest = downloader.download(url, targetFile, sha256)
 
-                tarFile = tarfile.open(targetFile)
-                tarFile.extractall(targetPath)
-                tarFile.close()
+        tarFile = tarfile.open(targetFile)
+        tarFile.extractall(targetPath)
+        tarFile.close()
 
-                os.remove(targetFile)
+        self.__saveDownloadMarker(key, url, digest)
 
-    def prepareData(self):
+        os.remove(targetFile)
+
+    def __downloadCropSplit(self, key, url, downloader, sha256):
+        """
+        Private method to download the .mat file of a split of the cropped dataset, it is not an archive so it
+        is stored as it is
+
+        key : String -> train, test
+        url : String
+        downloader : Downloader
+        sha256 : String or None -> expected digest of the file
+        """
+        digest = downloader.download(url, os.path.join(self.__pathData, self.__cropTargetFile[key]), sha256)
+
+        self.__saveDownloadMarker(key, url, digest, crop=True)
+
+    def __streamSplit(self, key, url, downloader, sha256, imageStore):
+        """
+        Private method to extract a split while it is downloaded, without storing the archive. The images index is
+        built in the same pass and optionally the images are decoded into the image store as they arrive
+
+        key : String -> train, test
+        url : String
+        downloader : Downloader
+        sha256 : String or None -> expected digest of the archive, checked once the archive is consumed
+        imageStore : boolean -> if true the image store is built during the extraction
+        """
+        targetPath = os.path.join(self.__pathData, key)
+        pathImages = os.path.join(self.__pathData, self.__folderStructure[key]["folder"])
+        imageNumbers = set()
+        writer = None
+        if imageStore:
+            writer = ImageStoreWriter(os.path.join(self.__pathData, self.__folderStructure[key]["imageStore"]))
+
+        def extract(fileObject):
+            with tarfile.open(fileobj=fileObject, mode="r|gz") as tarFile:
+                for member in tarFile:
+                    memberPath = os.path.join(targetPath, member.name)
+                    imageFileName = os.path.basename(memberPath)
+                    isImage = (
+                        member.isfile()
+                        and os.path.normpath(os.path.dirname(memberPath)) == os.path.normpath(pathImages)
+                        and imageFileName.endswith(self.__imageFormat)
+                        and imageFileName[:-len(self.__imageFormat)].isdigit()
+                    )
+
+                    if isImage and writer is not None:
+                        content = tarFile.extractfile(member).read()
+                        if os.path.exists(pathImages) is False:
+                            os.makedirs(pathImages)
+                        with open(memberPath, "wb") as f:
+                            f.write(content)
+                        writer.add(int(imageFileName[:-len(self.__imageFormat)]) - 1, content)
+                    else:
+                        tarFile.extract(member, targetPath)
+
+                    if isImage:
+                        imageNumbers.add(int(imageFileName[:-len(self.__imageFormat)]))
+
+        digest = downloader.stream(url, extract, sha256)
+
+        imagesDirectory = dict()
+        while len(imagesDirectory) + 1 in imageNumbers:
+            index = len(imagesDirectory)
+            imagesDirectory.update({
+                index : os.path.join(pathImages, str(index + 1) + self.__imageFormat),
+            })
+
+        if len(list(imagesDirectory.keys())) == 0:
+            raise Exception("No " + key + " images in the path : " + pathImages)
+
+        JsonHandler.saveJson(
+            os.path.join(self.__pathData, self.__folderStructure[key]["jsonImagesIndex"]),
+            imagesDirectory,
+        )
+        if writer is not None:
+            writer.close(len(imagesDirectory))
+            self.__imageStores.update({
+                key : None,
+            })
+
+        self.__saveDownloadMarker(key, url, digest)
+
+    def downloadDataset(self, crop=False, checksums=None, segments=1, parallel=True, streaming=False, imageStore=False):
+        """
+        Method to download dataset in a specific path and extract it, the archives are streamed to disk, a partial
+        download is resumed and the splits that are already complete are skipped
+
+        crop : boolean if the cropped dataset is desired, its .mat files are stored in the folder of each split
+        checksums : dict or None -> {train : sha256, test : sha256} expected digests of the archives, there are no
+            published digests for the dataset so by default the archives are not verified
+        segments : int -> number of parallel range requests per archive
+        parallel : boolean -> if true train and test are downloaded concurrently
+        streaming : boolean -> if true the archives are extracted while they are downloaded and never stored, the
+            images index is built in the same pass, an interrupted streaming download starts again from the beginning
+        imageStore : boolean -> with streaming, the images are also decoded into the image store in the same pass
+        """
+        if os.path.exists(self.__pathData) is False:
+            os.makedirs(self.__pathData)
+
+        if checksums is None:
+            checksums = dict()
+
+        downloader = Downloader(segments=segments)
+        keys = [key for key in list(self.__targetFile.keys()) if self.__isDownloaded(key, crop) is False]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(keys) if parallel and len(keys) > 0 else 1) as executor:
+            futures = list()
+            for key in keys:
+                if crop:
+                    futures.append(executor.submit(
+                        self.__downloadCropSplit, key, self.__cropDatasetUrl[key], downloader, checksums.get(key),
+                    ))
+                elif streaming:
+                    futures.append(executor.submit(
+                        self.__streamSplit, key, self.__nonCropDatasetUrl[key], downloader, checksums.get(key), imageStore,
+                    ))
+                else:
+                    futures.append(executor.submit(
+                        self.__downloadSplit, key, self.__nonCropDatasetUrl[key], downloader, checksums.get(key),
+                    ))
+
+            for future in futures:
+                future.result()
+
+    def prepareData(
+        self,
+        verbose=False,
+        workers=1,
+        normalizationHistogram=False,
+        normalizationTolerance=None,
+        imageStore=False,
+        digitCrops=False,
+        cropMargin=0.15,
+        cropSquare=True,
+        cropSize=32,
+    ):
         """
         Method to prepare the dataset for training
+
+        verbose : boolean -> if true the progress of the long running steps is reported
+        workers : int -> number of processes, with more than one the splits and chunks of each split are processed
+            concurrently in a process pool, the files produced are identical to the ones of the serial path
+        normalizationHistogram : boolean -> if true the normalization parameters include the histogram of the pixel values
+        normalizationTolerance : float or None -> if not None the normalization parameters are estimated from a random
+            subsample of the images, stopping once the standard error of the mean pixel value is below the tolerance
+        imageStore : boolean -> if true the images are decoded once into an image store, getSample then serves them
+            from the store without decoding the png files
+        digitCrops : boolean -> if true every digit box is cut into a crop of cropSize x cropSize, getSample then serves
+            the crops with crop=True
+        cropMargin : float -> fraction of the size of a box added on every side of the crop
+        cropSquare : boolean -> if true the crops are squares around the center of the boxes, keeping the aspect ratio
+        cropSize : int
         """
         unPack = False
+        pack = False
         indexImages = False
+        packImagesIndex = False
         normalizationParameters = False
+        buildImageStore = False
+        buildDigitCrops = False
         for key in list(self.__targetFile.keys()):
             if os.path.exists(os.path.join(self.__pathData, self.__folderStructure[key]["jsonGroundTruth"])) is False:
                 unPack = True
+            if self.__groundTruthFormat == "packed":
+                for packedFile in ["packedGroundTruthBoxes", "packedGroundTruthOffsets"]:
+                    if os.path.exists(os.path.join(self.__pathData, self.__folderStructure[key][packedFile])) is False:
+                        pack = True
+                if os.path.exists(os.path.join(self.__pathData, self.__folderStructure[key]["packedImagesIndex"])) is False:
+                    packImagesIndex = True
             if os.path.exists(os.path.join(self.__pathData, self.__folderStructure[key]["jsonImagesIndex"])) is False:
                 indexImages = True
+            if imageStore and ImageStore.isAvailable(os.path.join(self.__pathData, self.__folderStructure[key]["imageStore"])) is False:
+                buildImageStore = True
+            cropPath = os.path.join(self.__pathData, self.__folderStructure[key]["digitCrops"])
+            if digitCrops and DigitCrops.isAvailable(cropPath, cropMargin, cropSquare, cropSize) is False:
+                buildDigitCrops = True
+        if imageStore and indexImages:
+            buildImageStore = True
+        if digitCrops and (unPack or indexImages):
+            buildDigitCrops = True
         if os.path.exists(os.path.join(self.__pathData, self.__folderStructure["train"]["jsonNormalizationParameters"])) is False:
             normalizationParameters = True
-        if unPack:
-            self.__unpackGroundTruth(self.__pathData)
-        if indexImages:
-            self.__indexImages(self.__pathData)
-        if  normalizationParameters:
-            self.__normalizationParameters(self.__pathData)
+        executor = None
+        if workers > 1 and (unPack or indexImages or normalizationParameters or buildImageStore or buildDigitCrops):
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+        try:
+            if unPack:
+                self.__unpackGroundTruth(self.__pathData, verbose, executor, workers)
+            if unPack or pack:
+                if self.__groundTruthFormat == "packed":
+                    self.__packGroundTruth(self.__pathData)
+            if indexImages:
+                self.__indexImages(self.__pathData, executor)
+            if indexImages or packImagesIndex:
+                if self.__groundTruthFormat == "packed":
+                    self.__packImagesIndex(self.__pathData)
+            if  normalizationParameters:
+                self.__bucketShapes = dict()
+                self.__normalizationParameters(
+                    self.__pathData,
+                    executor,
+                    workers,
+                    normalizationHistogram,
+                    normalizationTolerance,
+                )
+            if buildImageStore:
+                self.__buildImageStore(self.__pathData, executor)
+            if buildDigitCrops:
+                self.__buildDigitCrops(self.__pathData, executor, cropMargin, cropSquare, cropSize)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def __getTables(self, dataset):
+        """
+        Private method to obtain the in memory tables of a dataset, the json files are only parsed when they change
+
+        dataset : String -> train, test
+        """
+        imagesIndexPath = os.path.join(self.__pathData, self.__folderStructure[dataset]["jsonImagesIndex"])
+        if self.__groundTruthFormat == "packed":
+            return self.__index.getPackedTables(
+                os.path.join(self.__pathData, self.__folderStructure[dataset]["packedImagesIndex"]),
+                os.path.join(self.__pathData, self.__folderStructure[dataset]["packedGroundTruthBoxes"]),
+                os.path.join(self.__pathData, self.__folderStructure[dataset]["packedGroundTruthOffsets"]),
+            )
+
+        return self.__index.getTables(
+            imagesIndexPath,
+            os.path.join(self.__pathData, self.__folderStructure[dataset]["jsonGroundTruth"]),
+        )
+
+    def __getImage(self, tables, index, dataset):
+        """
+        Private method to obtain an image, from the image store when it is available or decoding the png file otherwise
+
+        tables : dict -> tables of the dataset
+        index : int
+        dataset : String -> train, test
+        """
+        store = self.__imageStores[dataset]
+        if store is None:
+            storePath = os.path.join(self.__pathData, self.__folderStructure[dataset]["imageStore"])
+            if ImageStore.isAvailable(storePath):
+                store = ImageStore(storePath)
+                self.__imageStores.update({
+                    dataset : store,
+                })
+
+        timing = Instrumentation.enabled and Instrumentation.start()
+        if store is not None and len(store) == len(tables["imagePaths"]):
+            image = store.get(index)
+            if timing:
+                Instrumentation.stop("decode", timing, bytesRead=image.nbytes)
+            return image
+
+        from PIL import Image
+
+        image = np.asarray(Image.open(tables["imagePaths"][index]))
+        if timing:
+            Instrumentation.stop("decode", timing, bytesRead=os.path.getsize(tables["imagePaths"][index]))
+        return image
 
-    def getDatasetSize(self, dataset="train"):
+    def __getDigitCrops(self, dataset):
+        """
+        Private method to obtain the digit crops of a dataset, built with prepareData(digitCrops=True)
+
+        dataset : String -> train, test
+        """
+        if self.__digitCrops[dataset] is None:
+            self.__digitCrops.update({
+                dataset : DigitCrops(os.path.join(self.__pathData, self.__folderStructure[dataset]["digitCrops"])),
+            })
+
+        return self.__digitCrops[dataset]
+
+    def getDatasetSize(self, dataset="train", crop=False):
         """
         Method to obtain the train dataset size
         train : String -> train, test
+        crop : boolean -> if true the number of digit crops
         """
-        datasetJsonIndexPath = os.path.join(self.__pathData, self.__folderStructure[dataset]["jsonImagesIndex"])
-        datasetJson = JsonHandler.loadJson(datasetJsonIndexPath)
+        if crop:
+            return len(self.__getDigitCrops(dataset))
 
-        return len(datasetJson)
+        return len(self.__getTables(dataset)["imagePaths"])
 
-    def getSample(self, index, dataset="train"):
+    def getSample(self, index, dataset="train", crop=False):
         """
         Method to get a sample from a specific dataset and a specific index
 
         index : int
         dataset : String -> train, test
+        crop : boolean -> if true the sample is a digit crop, built with prepareData(digitCrops=True)
 
-        return tuple image, groundTruth
+        return tuple image, groundTruth -> groundTruth is a dict, or a boxes array view with the packed format,
+            with crop the image is a (cropSize, cropSize, 3) view and groundTruth the label of the digit
+        """
+        if crop:
+            digitCrops = self.__getDigitCrops(dataset)
+            return digitCrops.get(int(index)), digitCrops.getLabel(int(index))
+
+        tables = self.__getTables(dataset)
+        index = int(index)
+
+        groundTruth = SVHNIndex.getBoxes(tables, index)
+        if self.__groundTruthFormat == "json":
+            groundTruth = SVHNIndex.boxesToDict(groundTruth)
+        return self.__getImage(tables, index, dataset), groundTruth
+
+    def getSampler(self, dataset="train"):
+        """
+        Method to obtain the epoch sampler used by getRandomSample, it is created the first time it is used
+
+        dataset : String -> train, test
+
+        return EpochSampler
+        """
+        if self.__samplers[dataset] is None:
+            self.__samplers.update({
+                dataset : EpochSampler(self.getDatasetSize(dataset), self.__rank, self.__worldSize, self.__seed),
+            })
+
+        return self.__samplers[dataset]
+
+    def getSamplerState(self):
+        """
+        Method to obtain the position of the random samples of both datasets, to resume them with loadSamplerState
+
+        return dict
         """
-        datasetJsonIndexPath = os.path.join(self.__pathData, self.__folderStructure[dataset]["jsonImagesIndex"])
-        datasetImages = JsonHandler.loadJson(datasetJsonIndexPath)
+        return {dataset : self.getSampler(dataset).getState() for dataset in ["train", "test"]}
 
-        datasetGroundTruthPath = os.path.join(self.__pathData, self.__folderStructure[dataset]["jsonGroundTruth"])
-        datasetGroundTruth = JsonHandler.loadJson(datasetGroundTruthPath)
+    def loadSamplerState(self, state):
+        """
+        Method to resume the random samples from a state obtained with getSamplerState
 
-        imagePath = datasetImages[str(index)]
-        groundTruth = datasetGroundTruth[str(index)]
-        return np.asarray(Image.open(imagePath)), groundTruth
+        state : dict
+        """
+        for dataset in list(state.keys()):
+            self.getSampler(dataset).loadState(state[dataset])
 
     def getRandomSample(self, dataset="train"):
         """
-        Method used to obtain randomly a sample from the given dataset, the method creates a random list with the keys
-        and will iterate over that list, when the list is covered it will be shufled again
+        Method used to obtain randomly a sample from the given dataset, the samples of an epoch are a permutation
+        of the shard of this process and the next epoch starts when the shard is covered
 
         dataset : String -> train, test
 
         return tuple image, groundTruth
         """
-        index = self.__randomListIndex[dataset]
-        if (len(self.__randomList[dataset]) == 0 or index == self.getDatasetSize(dataset)):
-            index = 0
-            datasetJsonIndexPath = os.path.join(self.__pathData, self.__folderStructure[dataset]["jsonImagesIndex"])
-            datasetJson = JsonHandler.loadJson(datasetJsonIndexPath)
-            keys = list(datasetJson.keys())
+        timing = Instrumentation.enabled and Instrumentation.start()
+        index = self.getSampler(dataset).next()
+        if timing:
+            Instrumentation.stop("samplePick", timing)
+
+        return self.getSample(index, dataset)
+
+    def __getBucketShapes(self, numberBuckets):
+        """
+        Private method to obtain the bucket limits of the image sizes, the range of sizes of the normalization
+        parameters is divided in numberBuckets buckets per dimension. Only the train split has normalization
+        parameters, so the buckets of both splits are derived from the sizes of the train images. The limits are
+        computed once for each numberBuckets
 
-            random.shuffle(keys)
+        numberBuckets : int
 
-            self.__randomList.update({
-                dataset : keys,
+        return rows, columns -> numpy arrays int64 with the upper limit of each bucket
+        """
+        if numberBuckets not in self.__bucketShapes:
+            parameters = self.getNormalizationParameters()
+            # The normalization parameters store the number of rows as width and the number of columns as height
+            rows = np.linspace(parameters["minWidth"], parameters["maxWidth"], numberBuckets + 1)[1:]
+            columns = np.linspace(parameters["minHeight"], parameters["maxHeight"], numberBuckets + 1)[1:]
+            self.__bucketShapes.update({
+                numberBuckets : (np.ceil(rows).astype(np.int64), np.ceil(columns).astype(np.int64)),
             })
 
-        randomIndex = self.__randomList[dataset][index]
-        sample = self.getSample(randomIndex)
-            
-        self.__randomListIndex.update({
-            dataset : index + 1
+        return self.__bucketShapes[numberBuckets]
+
+    def __getstate__(self):
+        # The lock and the pool of threads of getBatch are not pickled, the copy creates its own pool on its first batch
+        state = dict(self.__dict__)
+        state.update({
+            "_SVHN__batchLock" : None,
+            "_SVHN__batchExecutor" : None,
+            "_SVHN__batchWorkers" : None,
         })
 
-        return sample
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__batchLock = threading.Lock()
+
+    def __getBatchExecutor(self, workers):
+        """
+        Private method to obtain the pool of threads decoding the images of getBatch, it is created on the first
+        batch and kept until close, or replaced when the number of workers changes
+        """
+        with self.__batchLock:
+            if self.__batchExecutor is None or self.__batchWorkers != workers:
+                if self.__batchExecutor is not None:
+                    self.__batchExecutor.shutdown()
+                self.__batchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+                self.__batchWorkers = workers
+
+            return self.__batchExecutor
+
+    def close(self):
+        """
+        Method to release the pool of threads of getBatch, a later getBatch creates a new one
+        """
+        with self.__batchLock:
+            if self.__batchExecutor is not None:
+                self.__batchExecutor.shutdown()
+                self.__batchExecutor = None
+                self.__batchWorkers = None
+
+    def getBatch(self, indices, dataset="train", mode="pad", numberBuckets=4, workers=8, augmentation=None):
+        """
+        Method to get many samples at once, the images are decoded by a pool of threads and grouped in buckets of
+        similar size, each bucket is collated into contiguous arrays. The pool is kept between calls, close releases
+        it. The buckets of both splits are derived from the image sizes of the train split
+
+        indices : list or numpy array of int
+        dataset : String -> train, test
+        mode : String -> pad, resize. With pad the images are placed in the top left corner of the bucket shape and
+            the boxes keep their coordinates, with resize the images are resized to the bucket shape and the boxes scaled
+        numberBuckets : int -> buckets per dimension, 1 collates the whole batch into a single bucket
+        workers : int -> threads decoding the images, the pool is created again when it changes between calls
+        augmentation : Augmentation or None -> if given the images, masks and boxes of each bucket are augmented
+
+        return list of dict -> one batch per bucket with the keys
+            positions : numpy array int64 (n,) -> position of each sample in indices
+            images : numpy array uint8 (n, rows, columns, channels)
+            masks : numpy array bool (n, rows, columns) -> true on the pixels of the image, false on the padding
+            boxes : numpy array float32 (n, maxBoxes, 4) -> top, left, height, width in pixels of the batch images
+            labels : numpy array int32 (n, maxBoxes) -> -1 on the padding boxes
+            boxCounts : numpy array int32 (n,)
+        """
+        if mode not in ["pad", "resize"]:
+            raise Exception("Unexpected batch mode : " + str(mode))
+
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        tables = self.__getTables(dataset)
+        executor = self.__getBatchExecutor(workers)
+        images = list(executor.map(lambda index: self.__getImage(tables, int(index), dataset), indices))
+        boxes = [SVHNIndex.getBoxes(tables, int(index)) for index in indices]
+
+        timing = Instrumentation.enabled and Instrumentation.start()
+        bucketRows, bucketColumns = self.__getBucketShapes(numberBuckets)
+        shapes = np.array([image.shape[:2] for image in images], dtype=np.int64).reshape(-1, 2)
+        rowBuckets = np.minimum(np.searchsorted(bucketRows, shapes[:, 0]), numberBuckets - 1)
+        columnBuckets = np.minimum(np.searchsorted(bucketColumns, shapes[:, 1]), numberBuckets - 1)
+        bucketKeys = rowBuckets * numberBuckets + columnBuckets
+
+        batches = list()
+        for bucketKey in np.unique(bucketKeys):
+            positions = np.flatnonzero(bucketKeys == bucketKey)
+            rows = int(bucketRows[bucketKey // numberBuckets])
+            columns = int(bucketColumns[bucketKey % numberBuckets])
+            if mode == "pad":
+                rows = max(rows, int(shapes[positions, 0].max()))
+                columns = max(columns, int(shapes[positions, 1].max()))
+
+            channels = images[positions[0]].shape[2:]
+            maxBoxes = max(len(boxes[position]) for position in positions)
+            batch = {
+                "positions" : positions,
+                "images" : np.zeros((len(positions), rows, columns) + channels, dtype=np.uint8),
+                "masks" : np.zeros((len(positions), rows, columns), dtype=bool),
+                "boxes" : np.zeros((len(positions), maxBoxes, 4), dtype=np.float32),
+                "labels" : np.full((len(positions), maxBoxes), -1, dtype=np.int32),
+                "boxCounts" : np.zeros(len(positions), dtype=np.int32),
+            }
+
+            for batchIndex in range(len(positions)):
+                image = images[positions[batchIndex]]
+                imageBoxes = boxes[positions[batchIndex]]
+                scale = np.ones(2, dtype=np.float32)
+                if mode == "resize" and image.shape[:2] != (rows, columns):
+                    from PIL import Image
+
+                    scale = np.array([rows / image.shape[0], columns / image.shape[1]], dtype=np.float32)
+                    image = np.asarray(Image.fromarray(image).resize((columns, rows), Image.BILINEAR))
+
+                batch["images"][batchIndex, :image.shape[0], :image.shape[1]] = image
+                batch["masks"][batchIndex, :image.shape[0], :image.shape[1]] = True
+                batch["boxes"][batchIndex, :len(imageBoxes), 0] = imageBoxes["top"] * scale[0]
+                batch["boxes"][batchIndex, :len(imageBoxes), 1] = imageBoxes["left"] * scale[1]
+                batch["boxes"][batchIndex, :len(imageBoxes), 2] = imageBoxes["height"] * scale[0]
+                batch["boxes"][batchIndex, :len(imageBoxes), 3] = imageBoxes["width"] * scale[1]
+                batch["labels"][batchIndex, :len(imageBoxes)] = imageBoxes["label"]
+                batch["boxCounts"][batchIndex] = len(imageBoxes)
+
+            if augmentation is not None:
+                batch = augmentation.applyBoxes(batch)
+            batches.append(batch)
+
+        if timing:
+            Instrumentation.stop("collate", timing, items=len(indices))
+
+        return batches
 
     def getNormalizationParameters(self):
         """
@@ -0,0 +1,230 @@
+import os
+import numpy as np
+from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+from ai_dataloader.jsonHandler.arrayHandler import ArrayHandler
+from ai_dataloader.instrumentation.instrumentation import Instrumentation
+
+class SVHNIndex(object):
+    """
+    Class to keep the images index and the ground truth of SVHN loaded in memory as compact arrays keyed
+    by integer index, the tables are loaded once and reloaded only when the files change on disk
+    """
+    boxFields = ("height", "width", "top", "left", "label")
+
+    boxDtype = np.dtype([
+        ("imageId", np.int32),
+        ("height", np.int32),
+        ("width", np.int32),
+        ("top", np.int32),
+        ("left", np.int32),
+        ("label", np.int32),
+    ])
+
+    def __init__(self):
+        self.__tables = dict()
+
+    def __getFilesState(self, paths):
+        """
+        Tool to obtain the modification time and size of the files, used to invalidate the tables
+
+        paths : list of String
+        """
+        state = list()
+        for path in paths:
+            fileStat = os.stat(path)
+            state.append((fileStat.st_mtime_ns, fileStat.st_size))
+
+        return tuple(state)
+
+    def groundTruthToArrays(groundTruth):
+        """
+        Method to convert the nested ground truth dict of groundTruth.json into a flat boxes array and offsets,
+        the boxes of image i are boxes[offsets[i]:offsets[i + 1]]
+
+        groundTruth : dict -> {index : {numberIndex : {height, width, top, left, label}}}
+
+        return boxes, offsets
+        """
+        size = 0
+        if len(groundTruth) > 0:
+            size = max([int(key) for key in list(groundTruth.keys())]) + 1
+
+        counts = np.zeros(size, dtype=np.int64)
+        for key in list(groundTruth.keys()):
+            counts[int(key)] = len(groundTruth[key])
+
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        boxes = np.empty(offsets[-1], dtype=SVHNIndex.boxDtype)
+        for key in list(groundTruth.keys()):
+            index = int(key)
+            numbers = groundTruth[key]
+            position = offsets[index]
+            for numberIndex in range(len(numbers)):
+                number = numbers[str(numberIndex)] if str(numberIndex) in numbers else numbers[numberIndex]
+                boxes[position] = (
+                    index,
+                    number["height"],
+                    number["width"],
+                    number["top"],
+                    number["left"],
+                    number["label"],
+                )
+                position += 1
+
+        return boxes, offsets
+
+    def savePackedGroundTruth(boxes, offsets, boxesPath, offsetsPath):
+        """
+        Method to store the boxes and offsets arrays as .npy files, each file is replaced atomically
+
+        boxes : numpy array with dtype boxDtype
+        offsets : numpy array int64
+        boxesPath : String
+        offsetsPath : String
+        """
+        ArrayHandler.saveArray(boxesPath, np.ascontiguousarray(boxes, dtype=SVHNIndex.boxDtype))
+        ArrayHandler.saveArray(offsetsPath, np.ascontiguousarray(offsets, dtype=np.int64))
+
+    def convertJsonGroundTruth(groundTruthPath, boxesPath, offsetsPath):
+        """
+        Method to convert an existing groundTruth.json into the packed .npy format
+
+        groundTruthPath : String
+        boxesPath : String
+        offsetsPath : String
+        """
+        boxes, offsets = SVHNIndex.groundTruthToArrays(JsonHandler.loadJson(groundTruthPath))
+        SVHNIndex.savePackedGroundTruth(boxes, offsets, boxesPath, offsetsPath)
+
+    def saveImagesIndex(imagesIndexPath, packedImagesIndexPath):
+        """
+        Method to convert the json images index into a .npz file with the column imagePaths
+
+        imagesIndexPath : String
+        packedImagesIndexPath : String
+        """
+        imagesIndex = JsonHandler.loadJson(imagesIndexPath)
+        ArrayHandler.saveArrays(packedImagesIndexPath, {
+            "imagePaths" : np.array([imagesIndex[str(index)] for index in range(len(imagesIndex))]),
+        })
+
+    def __loadImagePaths(self, imagesIndexPath):
+        """
+        Tool to load the images index as an array of paths, a .npz index is memory mapped instead of parsed
+
+        imagesIndexPath : String
+        """
+        if imagesIndexPath.endswith(".npz"):
+            return ArrayHandler.loadArrays(imagesIndexPath)["imagePaths"]
+
+        imagesIndex = JsonHandler.loadJson(imagesIndexPath)
+        return np.array([imagesIndex[str(index)] for index in range(len(imagesIndex))])
+
+    def __buildTables(self, imagesIndexPath, groundTruthPath):
+        """
+        Tool to parse the json files once and convert them into arrays
+
+        imagesIndexPath : String
+        groundTruthPath : String
+
+        return dict with imagePaths, boxes and offsets
+        """
+        boxes, offsets = SVHNIndex.groundTruthToArrays(JsonHandler.loadJson(groundTruthPath))
+
+        return {
+            "imagePaths" : self.__loadImagePaths(imagesIndexPath),
+            "boxes" : boxes,
+            "offsets" : offsets,
+        }
+
+    def __buildPackedTables(self, imagesIndexPath, boxesPath, offsetsPath):
+        """
+        Tool to open the packed ground truth memory mapped, only the images index is parsed
+
+        imagesIndexPath : String
+        boxesPath : String
+        offsetsPath : String
+
+        return dict with imagePaths, boxes and offsets
+        """
+        return {
+            "imagePaths" : self.__loadImagePaths(imagesIndexPath),
+            "boxes" : np.load(boxesPath, mmap_mode="r"),
+            "offsets" : np.load(offsetsPath, mmap_mode="r"),
+        }
+
+    def __getCachedTables(self, key, buildTables):
+        """
+        Tool to return the cached tables of key, building them again when the files of key changed
+
+        key : tuple of String -> paths of the files the tables are built from
+        buildTables : function -> builds the tables from the paths in key
+        """
+        filesState = self.__getFilesState(key)
+
+        if key not in self.__tables or self.__tables[key]["filesState"] != filesState:
+            timing = Instrumentation.enabled and Instrumentation.start()
+            self.__tables.update({
+                key : {
+                    "filesState" : filesState,
+                    "tables" : buildTables(*key),
+                }
+            })
+            if timing:
+                Instrumentation.stop("indexLoad", timing, bytesRead=sum(size for _, size in filesState))
+
+        return self.__tables[key]["tables"]
+
+    def getTables(self, imagesIndexPath, groundTruthPath):
+        """
+        Method to obtain the tables of a dataset, parsing the files only if they changed since the last load
+
+        imagesIndexPath : String
+        groundTruthPath : String
+
+        return dict with imagePaths, boxes and offsets
+        """
+        return self.__getCachedTables((imagesIndexPath, groundTruthPath), self.__buildTables)
+
+    def getPackedTables(self, imagesIndexPath, boxesPath, offsetsPath):
+        """
+        Method to obtain the tables of a dataset stored with the packed ground truth format, the boxes and offsets
+        are memory mapped so per image lookup only touches the pages of its boxes
+
+        imagesIndexPath : String
+        boxesPath : String
+        offsetsPath : String
+
+        return dict with imagePaths, boxes and offsets
+        """
+        return self.__getCachedTables((imagesIndexPath, boxesPath, offsetsPath), self.__buildPackedTables)
+
+    def getBoxes(tables, index):
+        """
+        Method to obtain the boxes of an image as a view of the boxes array
+
+        tables : dict returned by getTables
+        index : int -> 0 <= index < number of images of the ground truth
+        """
+        offsets = tables["offsets"]
+        if index < 0 or index >= len(offsets) - 1:
+            raise Exception("Index of the ground truth out of range : " + str(index))
+
+        return tables["boxes"][offsets[index]:offsets[index + 1]]
+
+    def boxesToDict(boxes):
+        """
+        Method to convert boxes array into the ground truth dict format of groundTruth.json
+
+        boxes : numpy array with dtype boxDtype
+        """
+        numbers = dict()
+        for numberIndex in range(len(boxes)):
+            box = boxes[numberIndex]
+            numbers.update({
+                str(numberIndex) : {field : int(box[field]) for field in SVHNIndex.boxFields},
+            })
+
+        return numbers
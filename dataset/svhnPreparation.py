@@ -0,0 +1,226 @@
+import os
+import time
+import numpy as np
+from ai_dataloader.dataset.svhnIndex import SVHNIndex
+from ai_dataloader.dataset.pixelStatistics import PixelStatistics
+
+class SVHNPreparation(object):
+    """
+    Class with the heavy steps of SVHN.prepareData working on a chunk of a split, the methods only receive
+    paths and plain values so they can be sent to the worker processes of a process pool
+    """
+    scalarDtype = np.dtype("<f8")
+
+    def reportProgress(message, done, total, startTime):
+        """
+        Prints the progress and throughput of a long running step
+
+        message : String
+        done : int
+        total : int
+        startTime : float -> time.perf_counter() when the step started
+        """
+        elapsed = time.perf_counter() - startTime
+        throughput = done / elapsed if elapsed > 0 else 0.0
+        print(message + " : " + str(done) + "/" + str(total) + " images, " + "{:.1f}".format(throughput) + " images/s")
+
+    def chunkRanges(size, chunkSize):
+        """
+        Method to split the range [0, size) into consecutive chunks
+
+        size : int
+        chunkSize : int
+
+        return list of tuples (start, stop)
+        """
+        return [(start, min(start + chunkSize, size)) for start in range(0, size, chunkSize)]
+
+    def __gatherScalars(references, fileId, groundTruthFile):
+        """
+        Reads the scalars pointed by a flat list of h5py references in bulk. MATLAB stores each of them as a contiguous
+        float64 dataset, so only their offsets in the file are looked up and the values are gathered with one indexed
+        read of the memory mapped file. When the first one is not a float64 or a dataset is not stored contiguously
+        they are read with the low level api
+
+        references : list of h5py references
+        fileId : h5py FileID
+        groundTruthFile : String
+
+        return numpy array of float64
+        """
+        import h5py
+        values = np.empty(len(references), dtype=np.float64)
+        if len(references) == 0:
+            return values
+
+        offsets = np.full(len(references), -1, dtype=np.int64)
+        gather = h5py.h5r.dereference(references[0], fileId).dtype == SVHNPreparation.scalarDtype
+        for referenceIndex in range(len(references)):
+            datasetId = h5py.h5r.dereference(references[referenceIndex], fileId)
+            offset = datasetId.get_offset() if gather else None
+            if offset is not None and datasetId.get_storage_size() == SVHNPreparation.scalarDtype.itemsize:
+                offsets[referenceIndex] = offset
+            else:
+                value = np.empty(datasetId.shape, dtype=np.float64)
+                datasetId.read(h5py.h5s.ALL, h5py.h5s.ALL, value)
+                values[referenceIndex] = value.ravel()[0]
+
+        contiguous = offsets >= 0
+        if contiguous.any():
+            fileBytes = np.memmap(groundTruthFile, dtype=np.uint8, mode="r")
+            positions = offsets[contiguous][:, None] + np.arange(SVHNPreparation.scalarDtype.itemsize)
+            values[contiguous] = fileBytes[positions].view(SVHNPreparation.scalarDtype).ravel()
+            del fileBytes
+
+        return values
+
+    def __readBoxField(groupId, fieldName):
+        """
+        Reads the whole column of a box field with one low level read
+
+        groupId : h5py GroupID -> box group of an image
+        fieldName : bytes -> name of the field dataset, values or references, one per digit
+
+        return values, isReference -> flat numpy array of the values or of h5py references
+        """
+        import h5py
+        datasetId = h5py.h5d.open(groupId, fieldName)
+        values = np.empty(datasetId.shape, dtype=datasetId.dtype)
+        datasetId.read(h5py.h5s.ALL, h5py.h5s.ALL, values)
+
+        return values.ravel(), h5py.check_ref_dtype(values.dtype) is not None
+
+    def countImages(groundTruthFile, matKeys):
+        """
+        Method to obtain the number of images described in a .mat file
+
+        groundTruthFile : String
+        matKeys : dict -> keys of the .mat structure
+        """
+        import h5py
+        with h5py.File(groundTruthFile, "r") as matFile:
+            return matFile[matKeys["digitStruct"]][matKeys["box"]].shape[0]
+
+    def extractBoxes(groundTruthFile, matKeys, start, stop, message=None):
+        """
+        Method to extract the boxes of the images in the range [start, stop) of a .mat file
+
+        groundTruthFile : String
+        matKeys : dict -> keys of the .mat structure
+        start : int
+        stop : int
+        message : String -> if not None the progress is reported with this message
+
+        return boxes, offsets -> the boxes of image i are boxes[offsets[i - start]:offsets[i - start + 1]]
+        """
+        import h5py
+        boxKeys = matKeys["boxKeys"]
+        fields = SVHNIndex.boxFields
+        fieldNames = {field : boxKeys[field].encode() for field in fields}
+        # A field with one digit is stored in place and with several digits as references to scalars of #refs#, the
+        # references of the chunk are gathered at once and each column is then assembled with one indexing
+        inPlace = list()
+        references = list()
+        starts = np.empty((len(fields), stop - start), dtype=np.int64)
+        isReference = np.empty((len(fields), stop - start), dtype=bool)
+        fieldCounts = np.empty((len(fields), stop - start), dtype=np.int64)
+
+        with h5py.File(groundTruthFile, "r") as matFile:
+            boxReferences = matFile[matKeys["digitStruct"]][matKeys["box"]][start:stop].ravel()
+
+            startTime = time.perf_counter()
+            for boxIndex in range(len(boxReferences)):
+                groupId = h5py.h5r.dereference(boxReferences[boxIndex], matFile.id)
+                for fieldIndex in range(len(fields)):
+                    values, reference = SVHNPreparation.__readBoxField(groupId, fieldNames[fields[fieldIndex]])
+                    target = references if reference else inPlace
+                    starts[fieldIndex, boxIndex] = len(target)
+                    isReference[fieldIndex, boxIndex] = reference
+                    fieldCounts[fieldIndex, boxIndex] = len(values)
+                    target.extend(values)
+
+                if message is not None and (boxIndex + 1) % 1000 == 0 and boxIndex + 1 < len(boxReferences):
+                    SVHNPreparation.reportProgress(message, boxIndex + 1, len(boxReferences), startTime)
+
+            scalars = np.concatenate([
+                np.asarray(inPlace, dtype=np.float64),
+                SVHNPreparation.__gatherScalars(references, matFile.id, groundTruthFile),
+            ])
+            if message is not None and len(boxReferences) > 0:
+                SVHNPreparation.reportProgress(message, len(boxReferences), len(boxReferences), startTime)
+
+        counts = fieldCounts[0] if len(fields) > 0 else np.zeros(stop - start, dtype=np.int64)
+        if np.any(fieldCounts != counts):
+            raise Exception("The box fields of an image have different lengths in " + groundTruthFile)
+
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        boxes = np.empty(offsets[-1], dtype=SVHNIndex.boxDtype)
+        boxes["imageId"] = np.repeat(np.arange(start, stop, dtype=np.int32), counts)
+        positionInImage = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1], counts)
+        for fieldIndex in range(len(fields)):
+            fieldStarts = starts[fieldIndex] + np.where(isReference[fieldIndex], len(inPlace), 0)
+            boxes[fields[fieldIndex]] = scalars[np.repeat(fieldStarts, counts) + positionInImage].astype(np.int64)
+
+        return boxes, offsets
+
+    def mergeBoxes(chunks):
+        """
+        Method to merge the boxes of consecutive chunks returned by extractBoxes, in the order of the chunks
+
+        chunks : list of tuples (boxes, offsets)
+
+        return boxes, offsets
+        """
+        boxes = np.concatenate([chunk[0] for chunk in chunks])
+        offsets = [np.zeros(1, dtype=np.int64)]
+        position = 0
+        for chunk in chunks:
+            offsets.append(chunk[1][1:] + position)
+            position += chunk[1][-1]
+
+        return boxes, np.concatenate(offsets)
+
+    def indexImages(pathImages, imageFormat):
+        """
+        Method to find the images 1.png, 2.png, ... of a folder until the first missing one
+
+        pathImages : String
+        imageFormat : String
+
+        return dict -> {index : imageFile}
+        """
+        index = 0
+        imagesDirectory = dict()
+        while(True):
+            indexImage = index + 1
+            imageFileName = str(indexImage) + imageFormat
+            imageFile = os.path.join(pathImages, imageFileName)
+
+            if os.path.isfile(imageFile):
+                imagesDirectory.update({
+                    index : imageFile,
+                })
+            else:
+                break
+
+            index += 1
+
+        return imagesDirectory
+
+    def pixelStatistics(imageFiles, histogram=False):
+        """
+        Method to accumulate the pixel statistics of a chunk of images
+
+        imageFiles : list of String
+        histogram : boolean -> if true the histogram of the pixel values is accumulated
+
+        return dict -> partial state of PixelStatistics
+        """
+        from PIL import Image
+        statistics = PixelStatistics(histogram)
+        for imageFile in imageFiles:
+            statistics.update(np.asarray(Image.open(imageFile)))
+
+        return statistics.getState()
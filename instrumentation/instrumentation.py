@@ -0,0 +1,244 @@
+import json
+import time
+import threading
+
+class Histogram(object):
+    """
+    Class to count latencies in nanoseconds in log linear buckets, the values below 2 ** subBits have their own
+    bucket and the others are kept with subBits significant bits, so a percentile is within 1 / 2 ** (subBits - 1)
+    of the true value and recording a value is a few integer operations
+    """
+    subBits = 5
+    numberBuckets = 64 * 2 ** (5 - 1) + 2 ** 5
+
+    def __init__(self):
+        self.__counts = [0] * Histogram.numberBuckets
+        self.__total = 0
+
+    def bucket(value):
+        """
+        Method to obtain the bucket of a value
+
+        value : int -> non negative
+        """
+        shift = value.bit_length() - Histogram.subBits
+        if shift <= 0:
+            return value
+
+        return min(shift * 2 ** (Histogram.subBits - 1) + (value >> shift), Histogram.numberBuckets - 1)
+
+    def bucketMiddle(bucket):
+        """
+        Method to obtain the value in the middle of a bucket
+        """
+        if bucket < 2 ** Histogram.subBits:
+            return float(bucket)
+
+        shift = (bucket - 2 ** (Histogram.subBits - 1)) // 2 ** (Histogram.subBits - 1)
+        mantissa = bucket - shift * 2 ** (Histogram.subBits - 1)
+
+        return ((mantissa << shift) + (((mantissa + 1) << shift) - 1)) / 2.0
+
+    def record(self, value):
+        """
+        Method to count a value
+
+        value : int -> non negative
+        """
+        self.__counts[Histogram.bucket(value)] += 1
+        self.__total += 1
+
+    def getCount(self):
+        """
+        Method to obtain the number of values counted
+        """
+        return self.__total
+
+    def percentiles(self, quantiles):
+        """
+        Method to obtain percentiles of the values counted
+
+        quantiles : list of float -> in [0, 1]
+
+        return list of float -> middle of the bucket of each percentile, 0 when nothing was counted
+        """
+        if self.__total == 0:
+            return [0.0 for _ in quantiles]
+
+        targets = sorted((max(int(quantile * self.__total + 0.5), 1), position) for position, quantile in enumerate(quantiles))
+        values = [0.0] * len(quantiles)
+        cumulative = 0
+        target = 0
+        for bucket in range(Histogram.numberBuckets):
+            cumulative += self.__counts[bucket]
+            while target < len(targets) and cumulative >= targets[target][0]:
+                values[targets[target][1]] = Histogram.bucketMiddle(bucket)
+                target += 1
+            if target == len(targets):
+                break
+
+        return values
+
+class Instrumentation(object):
+    """
+    Class to time the stages of the loaders and count what they read, it is off by default and every probe of the
+    hot paths is guarded by Instrumentation.enabled, so when it is off a probe costs one attribute lookup:
+
+        timing = Instrumentation.enabled and Instrumentation.start()
+        ...
+        if timing:
+            Instrumentation.stop("decode", timing, bytesRead=size)
+
+    The records are kept per process, a process started after enable keeps its own records
+    """
+    enabled = False
+
+    __lock = threading.Lock()
+    __stages = dict()
+    __counters = dict()
+    __resetTime = time.time()
+    __exporter = None
+    __stopExporter = None
+
+    def enable():
+        """
+        Method to start recording
+        """
+        Instrumentation.enabled = True
+
+    def disable():
+        """
+        Method to stop recording, the records are kept until reset
+        """
+        Instrumentation.enabled = False
+
+    def reset():
+        """
+        Method to remove the records
+        """
+        with Instrumentation.__lock:
+            Instrumentation.__stages = dict()
+            Instrumentation.__counters = dict()
+            Instrumentation.__resetTime = time.time()
+
+    def start():
+        """
+        Method to obtain the start time of a timed stage
+
+        return int -> nanoseconds, never 0
+        """
+        return time.perf_counter_ns() or 1
+
+    def stop(stage, start, bytesRead=0, items=1):
+        """
+        Method to record a timed stage
+
+        stage : String -> for example indexLoad, decode, samplePick, collate
+        start : int -> as returned by start
+        bytesRead : int -> bytes read from disk by the stage
+        items : int -> samples processed by the stage, for the throughput
+        """
+        elapsed = time.perf_counter_ns() - start
+        with Instrumentation.__lock:
+            record = Instrumentation.__stages.get(stage)
+            if record is None:
+                record = {
+                    "calls" : 0,
+                    "items" : 0,
+                    "bytesRead" : 0,
+                    "totalNs" : 0,
+                    "maxNs" : 0,
+                    "histogram" : Histogram(),
+                }
+                Instrumentation.__stages[stage] = record
+
+            record["calls"] += 1
+            record["items"] += items
+            record["bytesRead"] += bytesRead
+            record["totalNs"] += elapsed
+            record["maxNs"] = max(record["maxNs"], elapsed)
+            record["histogram"].record(max(elapsed, 0))
+
+    def count(name, value=1):
+        """
+        Method to add to a counter
+
+        name : String
+        value : int
+        """
+        with Instrumentation.__lock:
+            Instrumentation.__counters[name] = Instrumentation.__counters.get(name, 0) + value
+
+    def snapshot():
+        """
+        Method to obtain the current records
+
+        return dict -> time, elapsed seconds since the reset, counters and for each stage the calls, items, bytesRead,
+            total, mean, p50, p99 and max in seconds, itemsPerSecond and bytesPerSecond over the time spent in the stage
+        """
+        with Instrumentation.__lock:
+            stages = dict()
+            for stage, record in Instrumentation.__stages.items():
+                p50, p99 = record["histogram"].percentiles([0.5, 0.99])
+                seconds = record["totalNs"] / 1e9
+                stages[stage] = {
+                    "calls" : record["calls"],
+                    "items" : record["items"],
+                    "bytesRead" : record["bytesRead"],
+                    "total" : seconds,
+                    "mean" : seconds / record["calls"],
+                    "p50" : p50 / 1e9,
+                    "p99" : p99 / 1e9,
+                    "max" : record["maxNs"] / 1e9,
+                    "itemsPerSecond" : record["items"] / seconds if seconds > 0 else 0.0,
+                    "bytesPerSecond" : record["bytesRead"] / seconds if seconds > 0 else 0.0,
+                }
+
+            return {
+                "time" : time.time(),
+                "elapsed" : time.time() - Instrumentation.__resetTime,
+                "stages" : stages,
+                "counters" : dict(Instrumentation.__counters),
+            }
+
+    def export(pathFile=None):
+        """
+        Method to write the current snapshot as a json line
+
+        pathFile : String or None -> file the line is appended to, printed when None
+        """
+        line = json.dumps(Instrumentation.snapshot())
+        if pathFile is None:
+            print(line)
+        else:
+            with open(pathFile, "a") as f:
+                f.write(line + "\n")
+
+    def startExporter(interval=10.0, pathFile=None):
+        """
+        Method to export a snapshot every interval seconds from a background thread, until stopExporter
+
+        interval : float
+        pathFile : String or None -> as for export
+        """
+        Instrumentation.stopExporter()
+        stopEvent = threading.Event()
+
+        def run():
+            while stopEvent.wait(interval) is False:
+                Instrumentation.export(pathFile)
+            Instrumentation.export(pathFile)
+
+        Instrumentation.__stopExporter = stopEvent
+        Instrumentation.__exporter = threading.Thread(target=run, daemon=True)
+        Instrumentation.__exporter.start()
+
+    def stopExporter():
+        """
+        Method to stop the exporter, a last snapshot is exported
+        """
+        if Instrumentation.__exporter is not None:
+            Instrumentation.__stopExporter.set()
+            Instrumentation.__exporter.join()
+            Instrumentation.__exporter = None
+            Instrumentation.__stopExporter = None
@@ -0,0 +1,110 @@
+import struct
+import zipfile
+import numpy as np
+from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+
+class ArrayHandler(object):
+    """
+    Class to handle numpy files, the tables are stored by columns in uncompressed .npz files so a column can be
+    memory mapped without reading the others
+    """
+    def saveArray(pathFile, array):
+        """
+        Method to save an array in a .npy file, the file is replaced atomically
+
+        pathFile : String
+        array : numpy array
+        """
+        JsonHandler.writeAtomic(pathFile, lambda f: np.save(f, np.asarray(array)), "wb")
+
+    def saveArrays(pathFile, arrays):
+        """
+        Method to save the columns of a table in an uncompressed .npz file, the file is replaced atomically
+
+        pathFile : String
+        arrays : dict -> {name : numpy array}
+        """
+        JsonHandler.writeAtomic(pathFile, lambda f: np.savez(f, **arrays), "wb")
+
+    def loadArrays(pathFile, mmap=True):
+        """
+        Method to open a .npz file, the columns are loaded when they are accessed
+
+        pathFile : String
+        mmap : boolean -> if true the columns are memory mapped when their dtype allows it
+
+        return ArrayTable
+        """
+        return ArrayTable(pathFile, mmap)
+
+class ArrayTable(object):
+    """
+    Lazy read only view of the columns of a .npz file, each column is loaded or memory mapped on its first access
+
+    pathFile : String
+    mmap : boolean
+    """
+    def __init__(self, pathFile, mmap=True):
+        self.__pathFile = pathFile
+        self.__mmap = mmap
+        self.__columns = dict()
+        with zipfile.ZipFile(pathFile) as archive:
+            self.__members = {
+                info.filename[:-len(".npy")] : info for info in archive.infolist() if info.filename.endswith(".npy")
+            }
+
+    def keys(self):
+        """
+        Method to obtain the names of the columns
+        """
+        return list(self.__members.keys())
+
+    def __contains__(self, name):
+        return name in self.__members
+
+    def __len__(self):
+        return len(self.__members)
+
+    def __mapColumn(self, info):
+        """
+        Tool to memory map a column stored without compression
+
+        return numpy memmap or None if the column can not be memory mapped, also for header versions other than 1.0
+            and 2.0 which are left to np.load
+        """
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+
+        with open(self.__pathFile, "rb") as f:
+            f.seek(info.header_offset)
+            localHeader = f.read(30)
+            nameLength, extraLength = struct.unpack("<HH", localHeader[26:30])
+            f.seek(info.header_offset + 30 + nameLength + extraLength)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                return None
+            offset = f.tell()
+
+        if dtype.hasobject:
+            return None
+        if int(np.prod(shape)) == 0:
+            return np.empty(shape, dtype=dtype)
+
+        return np.memmap(self.__pathFile, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortranOrder else "C")
+
+    def __getitem__(self, name):
+        if name not in self.__columns:
+            column = self.__mapColumn(self.__members[name]) if self.__mmap else None
+            if column is None:
+                with np.load(self.__pathFile) as arrays:
+                    column = arrays[name]
+            self.__columns.update({
+                name : column,
+            })
+
+        return self.__columns[name]
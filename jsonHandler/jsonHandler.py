@@ -1,10 +1,60 @@
 import json
 import os
+import tempfile
+from ai_dataloader.instrumentation.instrumentation import Instrumentation
 
 class JsonHandler(object):
     """
     Class to handle json files
     """
+    fileMode = None
+
+    def __getFileMode(pathFile, temporaryFile):
+        """
+        Tool to obtain the permissions of the written file, the ones of the file replaced or otherwise the ones open()
+        gives to a new file. Those are read once from a probe file, since reading the umask would require setting it
+        """
+        try:
+            return os.stat(pathFile).st_mode & 0o7777
+        except FileNotFoundError:
+            pass
+
+        if JsonHandler.fileMode is None:
+            probeFile = temporaryFile + ".mode"
+            descriptor = os.open(probeFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            try:
+                JsonHandler.fileMode = os.fstat(descriptor).st_mode & 0o777
+            finally:
+                os.close(descriptor)
+                os.remove(probeFile)
+
+        return JsonHandler.fileMode
+
+    def writeAtomic(pathFile, write, mode="w"):
+        """
+        Method to write a file through a temporary file renamed once it is complete, so an interrupted write never
+        leaves a truncated file in pathFile
+
+        pathFile : String
+        write : function -> write(f) writes the content into the open temporary file
+        mode : String -> mode the temporary file is opened with
+        """
+        if os.path.dirname(pathFile) != "" and os.path.exists(os.path.dirname(pathFile)) is False:
+            os.makedirs(os.path.dirname(pathFile))
+
+        # mkstemp gives every writer its own temporary file, also threads of the same process writing the same path
+        descriptor, temporaryFile = tempfile.mkstemp(prefix=os.path.basename(pathFile) + ".", suffix=".tmp", dir=os.path.dirname(pathFile) or ".")
+        try:
+            with os.fdopen(descriptor, mode) as f:
+                os.fchmod(f.fileno(), JsonHandler.__getFileMode(pathFile, temporaryFile))
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporaryFile, pathFile)
+        finally:
+            if os.path.exists(temporaryFile):
+                os.remove(temporaryFile)
+
     def saveJson(pathFile, contentDict):
         """
         Method to save dict content in a json file
@@ -12,11 +62,10 @@ class JsonHandler(object):
         pathFile : String
         contentDict : dict
         """
-        if os.path.exists(os.path.dirname(pathFile)) is False:
-            os.makedirs(os.path.dirname(pathFile))
-
-        with open(pathFile, 'w') as f:
-            json.dump(contentDict, f)
+        timing = Instrumentation.enabled and Instrumentation.start()
+        JsonHandler.writeAtomic(pathFile, lambda f: json.dump(contentDict, f))
+        if timing:
+            Instrumentation.stop("jsonSave", timing)
 
     def loadJson(pathFile):
         """
@@ -24,7 +73,10 @@ class JsonHandler(object):
 
         pathFile : String
         """
+        timing = Instrumentation.enabled and Instrumentation.start()
         with open(pathFile, "r") as f:
             jsonContent = json.load(f)
+            if timing:
+                Instrumentation.stop("jsonLoad", timing, bytesRead=os.fstat(f.fileno()).st_size)
 
-        return jsonContent
\ No newline at end of file
+        return jsonContent
@@ -0,0 +1,28 @@
+import os
+import sys
+import importlib.util
+import pytest
+
+# The package is imported as ai_dataloader, the tests import this tree under that name wherever it is checked out
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "ai_dataloader" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("ai_dataloader", os.path.join(root, "__init__.py"), submodule_search_locations=[root])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["ai_dataloader"] = module
+    spec.loader.exec_module(module)
+
+@pytest.fixture(scope="session")
+def svhnPath(tmp_path_factory):
+    """
+    Synthetic SVHN fixture prepared in both ground truth formats
+    """
+    pytest.importorskip("h5py")
+    pytest.importorskip("PIL")
+    from ai_dataloader.benchmark.syntheticFixtures import SyntheticFixtures
+    from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+
+    path = str(tmp_path_factory.mktemp("svhn"))
+    SyntheticFixtures.buildSVHN(path, trainImages=40, testImages=12, seed=5)
+    SVHN(path, groundTruthFormat="packed").prepareData()
+
+    return path
@@ -0,0 +1,63 @@
+import os
+import threading
+import zipfile
+import numpy as np
+
+from ai_dataloader.jsonHandler.jsonHandler import JsonHandler
+from ai_dataloader.jsonHandler.arrayHandler import ArrayHandler
+
+def test_concurrentWritesOfSamePath(tmp_path):
+    pathFile = str(tmp_path / "table.json")
+    errors = list()
+
+    def write(value):
+        try:
+            for _ in range(20):
+                JsonHandler.saveJson(pathFile, {"value" : [value] * 1000})
+        except Exception as exception:
+            errors.append(exception)
+
+    threads = [threading.Thread(target=write, args=(value,)) for value in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(JsonHandler.loadJson(pathFile)["value"])) == 1
+    assert os.listdir(tmp_path) == ["table.json"]
+
+def test_columnsOfEveryHeaderVersion(tmp_path):
+    columns = {
+        "v1" : np.arange(12, dtype=np.int32).reshape(3, 4),
+        "v2" : np.arange(5, dtype=np.float64),
+        "v3" : np.arange(6, dtype=np.uint8),
+    }
+    pathFile = str(tmp_path / "table.npz")
+    with zipfile.ZipFile(pathFile, "w", zipfile.ZIP_STORED) as archive:
+        for name, version in [("v1", (1, 0)), ("v2", (2, 0)), ("v3", (3, 0))]:
+            with archive.open(name + ".npy", "w") as f:
+                np.lib.format.write_array(f, columns[name], version=version)
+
+    table = ArrayHandler.loadArrays(pathFile)
+
+    assert sorted(table.keys()) == ["v1", "v2", "v3"]
+    for name in list(columns.keys()):
+        np.testing.assert_array_equal(table[name], columns[name])
+    assert isinstance(table["v1"], np.memmap)
+    assert isinstance(table["v2"], np.memmap)
+
+def test_writtenFilePermissions(tmp_path):
+    with open(tmp_path / "reference.json", "w") as f:
+        f.write("{}")
+    pathFile = str(tmp_path / "table.json")
+
+    JsonHandler.saveJson(pathFile, {"value" : 1})
+    assert os.stat(pathFile).st_mode & 0o777 == os.stat(tmp_path / "reference.json").st_mode & 0o777
+
+    # A replaced file keeps its permissions
+    os.chmod(pathFile, 0o600)
+    JsonHandler.saveJson(pathFile, {"value" : 2})
+    assert os.stat(pathFile).st_mode & 0o777 == 0o600
+    assert JsonHandler.loadJson(pathFile) == {"value" : 2}
+    assert sorted(os.listdir(tmp_path)) == ["reference.json", "table.json"]
@@ -0,0 +1,87 @@
+import numpy as np
+
+from ai_dataloader.dataset.augmentation import Augmentation
+
+shape = (48, 64)
+
+def makeBatch(batchSize, seed=0):
+    """
+    Images with one filled rectangle each and the box of the rectangle, with a padding box after it
+    """
+    generator = np.random.default_rng(seed)
+    images = np.zeros((batchSize,) + shape, dtype=np.float32)
+    boxes = np.zeros((batchSize, 2, 4), dtype=np.float32)
+    for index in range(batchSize):
+        height, width = int(generator.integers(6, 16)), int(generator.integers(6, 20))
+        top, left = int(generator.integers(12, shape[0] - 12 - height)), int(generator.integers(12, shape[1] - 12 - width))
+        images[index, top:top + height, left:left + width] = 1.0
+        boxes[index, 0] = [top, left, height, width]
+        boxes[index, 1] = [1, 2, 3, 4]
+
+    return images, boxes, np.ones(batchSize, dtype=np.int32)
+
+def foregroundExtent(image):
+    rows, columns = np.nonzero(image >= 0.5)
+    return rows.min(), columns.min(), rows.max() + 1, columns.max() + 1
+
+def test_warpedRectangleInsideTransformedBox():
+    images, boxes, counts = makeBatch(32)
+    augmentation = Augmentation(rotation=30.0, shift=0.1, scale=(0.8, 1.2), seed=0)
+    matrices = Augmentation.getMatrices(augmentation.sampleParameters(len(images)), shape)
+
+    warped = Augmentation.warp(images, matrices)
+    transformed = Augmentation.transformBoxes(boxes, counts, matrices, shape)
+
+    for index in range(len(images)):
+        top, left, height, width = transformed[index, 0]
+        rows, columns = np.nonzero(warped[index] >= 0.5)
+        assert rows.min() >= top - 1 and rows.max() + 1 <= top + height + 1
+        assert columns.min() >= left - 1 and columns.max() + 1 <= left + width + 1
+        np.testing.assert_array_equal(transformed[index, 1], 0)
+
+def test_transformedBoxFitsRectangleWithoutRotation():
+    images, boxes, counts = makeBatch(32, seed=1)
+    augmentation = Augmentation(shift=0.1, scale=(0.7, 1.3), seed=1)
+    matrices = Augmentation.getMatrices(augmentation.sampleParameters(len(images)), shape)
+
+    warped = Augmentation.warp(images, matrices)
+    transformed = Augmentation.transformBoxes(boxes, counts, matrices, shape)
+
+    for index in range(len(images)):
+        top, left, height, width = transformed[index, 0]
+        extent = foregroundExtent(warped[index])
+        np.testing.assert_allclose(extent, [top, left, top + height, left + width], atol=1.5)
+
+def test_identityAndClipping():
+    images, boxes, counts = makeBatch(4, seed=2)
+    identity = np.tile(np.eye(3), (4, 1, 1))
+
+    np.testing.assert_allclose(Augmentation.warp(images, identity), images)
+    transformed = Augmentation.transformBoxes(boxes, counts, identity, shape)
+    np.testing.assert_array_equal(transformed[:, 0], boxes[:, 0])
+
+    shifted = identity.copy()
+    shifted[:, 0, 2] = -100.0
+    transformed = Augmentation.transformBoxes(boxes, counts, shifted, shape)
+    assert np.all(transformed[:, 0, 0] == 0)
+    assert np.all(transformed[:, 0, 2] == 0)
+
+def test_applyBoxesKeepsMasksAndBoxesTogether():
+    images, boxes, counts = makeBatch(16, seed=3)
+    batch = {
+        "images" : (images * 255).astype(np.uint8),
+        "masks" : images >= 0.5,
+        "boxes" : boxes,
+        "labels" : np.full((16, 2), 7, dtype=np.int32),
+        "boxCounts" : counts,
+    }
+
+    augmented = Augmentation(rotation=15.0, shift=0.05, seed=4).applyBoxes(batch)
+
+    assert augmented["images"].dtype == np.uint8
+    np.testing.assert_array_equal(augmented["labels"], batch["labels"])
+    for index in range(16):
+        top, left, height, width = augmented["boxes"][index, 0]
+        rows, columns = np.nonzero(augmented["masks"][index])
+        assert rows.min() >= top - 1 and rows.max() + 1 <= top + height + 1
+        assert columns.min() >= left - 1 and columns.max() + 1 <= left + width + 1
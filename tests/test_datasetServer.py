@@ -0,0 +1,72 @@
+import time
+import threading
+import numpy as np
+
+from ai_dataloader.dataset.datasetServer import DatasetServer, DatasetClient
+
+class SlowSamples(object):
+    """
+    Samples of 16 x 16 uint8 images decoded slowly, counting the decodes of each index
+    """
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.decodes = dict()
+        self.lock = threading.Lock()
+
+    def getSample(self, index):
+        with self.lock:
+            self.decodes[index] = self.decodes.get(index, 0) + 1
+        time.sleep(self.delay)
+        return np.full((16, 16), index, dtype=np.uint8), {"label" : index}
+
+def test_servesStoreAndScratch(tmp_path):
+    samples = SlowSamples()
+    # The store holds two images of 256 bytes
+    with DatasetServer(str(tmp_path), samples.getSample, 10, storeBytes=512, overflowBytes=0) as server:
+        client = DatasetClient(str(tmp_path))
+        images, targets = client.getBatch([0, 1, 2, 3], copy=True)
+        client.close()
+
+    for index in range(4):
+        np.testing.assert_array_equal(images[index], np.full((16, 16), index, dtype=np.uint8))
+        assert targets[index] == {"label" : index}
+    assert server.getCounters()["stored"] == 2
+
+def test_overflowCacheAvoidsDecodes(tmp_path):
+    samples = SlowSamples()
+    # One worker decodes in the order of the indexes, so 0 and 1 are the images of the store
+    with DatasetServer(str(tmp_path), samples.getSample, 10, storeBytes=512, workers=1, overflowBytes=2 * 256) as server:
+        client = DatasetClient(str(tmp_path))
+        client.getBatch([0, 1, 2, 3])
+        images, _ = client.getBatch([0, 1, 2, 3], copy=True)
+        client.getBatch([4])
+        client.getBatch([2])
+        client.close()
+
+        for index in range(4):
+            np.testing.assert_array_equal(images[index], np.full((16, 16), index, dtype=np.uint8))
+        # 2 and 3 are served from the overflow cache, then 4 evicts 2 which is decoded again
+        assert samples.decodes == {0 : 1, 1 : 1, 2 : 2, 3 : 1, 4 : 1}
+        assert server.getCounters()["overflowHits"] == 2
+
+def test_concurrentRequestsDecodeOnce(tmp_path):
+    samples = SlowSamples(delay=0.3)
+    with DatasetServer(str(tmp_path), samples.getSample, 10, storeBytes=0, overflowBytes=0) as server:
+        results = dict()
+
+        def request(name):
+            client = DatasetClient(str(tmp_path))
+            results[name] = client.getBatch([5, 6], copy=True)
+            client.close()
+
+        threads = [threading.Thread(target=request, args=(name,)) for name in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert samples.decodes == {5 : 1, 6 : 1}
+    for name in range(4):
+        images, targets = results[name]
+        np.testing.assert_array_equal(images[0], np.full((16, 16), 5, dtype=np.uint8))
+        assert targets == [{"label" : 5}, {"label" : 6}]
@@ -0,0 +1,184 @@
+import os
+import hashlib
+import threading
+import http.server
+import pytest
+
+pytest.importorskip("requests")
+
+from ai_dataloader.dataset.downloader import Downloader
+from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in of the dataset server, the files are served from memory with optional support of range requests
+    """
+    files = dict()
+    supportRanges = True
+    requests = list()
+
+    def log_message(self, *arguments):
+        pass
+
+    def __sendFile(self, body):
+        content = RangeRequestHandler.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+
+        requestedRange = self.headers.get("Range")
+        RangeRequestHandler.requests.append((self.command, self.path, requestedRange))
+        if requestedRange is None or RangeRequestHandler.supportRanges is False:
+            self.send_response(200)
+            if RangeRequestHandler.supportRanges:
+                self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            if body:
+                self.wfile.write(content)
+            return
+
+        start, end = requestedRange[len("bytes="):].split("-")
+        start = int(start)
+        end = int(end) if end != "" else len(content) - 1
+        if start >= len(content):
+            self.send_response(416)
+            self.send_header("Content-Range", "bytes */" + str(len(content)))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        end = min(end, len(content) - 1)
+        self.send_response(206)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", "bytes " + str(start) + "-" + str(end) + "/" + str(len(content)))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if body:
+            self.wfile.write(content[start:end + 1])
+
+    def do_HEAD(self):
+        self.__sendFile(False)
+
+    def do_GET(self):
+        self.__sendFile(True)
+
+@pytest.fixture
+def server():
+    content = os.urandom(300000)
+    RangeRequestHandler.files = {
+        "/file.bin" : content,
+        "/train_32x32.mat" : content[:1000],
+        "/test_32x32.mat" : content[1000:3000],
+    }
+    RangeRequestHandler.supportRanges = True
+    RangeRequestHandler.requests = list()
+
+    httpServer = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    thread = threading.Thread(target=httpServer.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:" + str(httpServer.server_address[1]) + "/"
+    httpServer.shutdown()
+    httpServer.server_close()
+
+def getRequests(method):
+    return [request for request in RangeRequestHandler.requests if request[0] == method]
+
+def test_downloadVerifiesChecksum(server, tmp_path):
+    content = RangeRequestHandler.files["/file.bin"]
+    targetFile = str(tmp_path / "file.bin")
+
+    digest = Downloader(chunkSize=4096).download(server + "file.bin", targetFile, hashlib.sha256(content).hexdigest())
+
+    assert digest == hashlib.sha256(content).hexdigest()
+    with open(targetFile, "rb") as f:
+        assert f.read() == content
+    assert os.path.exists(targetFile + Downloader.partSuffix) is False
+
+def test_resumesFromPartFile(server, tmp_path):
+    content = RangeRequestHandler.files["/file.bin"]
+    targetFile = str(tmp_path / "file.bin")
+    with open(targetFile + Downloader.partSuffix, "wb") as f:
+        f.write(content[:123456])
+
+    Downloader(chunkSize=4096).download(server + "file.bin", targetFile)
+
+    with open(targetFile, "rb") as f:
+        assert f.read() == content
+    assert getRequests("GET") == [("GET", "/file.bin", "bytes=123456-")]
+
+def test_segmentedDownload(server, tmp_path):
+    content = RangeRequestHandler.files["/file.bin"]
+    targetFile = str(tmp_path / "file.bin")
+
+    Downloader(chunkSize=4096, segments=4).download(server + "file.bin", targetFile)
+
+    with open(targetFile, "rb") as f:
+        assert f.read() == content
+    ranges = sorted(request[2] for request in getRequests("GET"))
+    assert ranges == ["bytes=0-74999", "bytes=150000-224999", "bytes=225000-299999", "bytes=75000-149999"]
+    assert os.listdir(tmp_path) == ["file.bin"]
+
+def test_checksumMismatchRemovesPartFile(server, tmp_path):
+    targetFile = str(tmp_path / "file.bin")
+
+    with pytest.raises(Exception, match="Checksum mismatch"):
+        Downloader().download(server + "file.bin", targetFile, "0" * 64)
+
+    assert os.listdir(tmp_path) == []
+
+def test_serverWithoutRangesRestartsPartFile(server, tmp_path):
+    RangeRequestHandler.supportRanges = False
+    content = RangeRequestHandler.files["/file.bin"]
+    targetFile = str(tmp_path / "file.bin")
+    with open(targetFile + Downloader.partSuffix, "wb") as f:
+        f.write(b"x" * 1000)
+
+    Downloader(chunkSize=4096).download(server + "file.bin", targetFile)
+
+    with open(targetFile, "rb") as f:
+        assert f.read() == content
+
+def test_segmentsFallBackWithoutRanges(server, tmp_path):
+    RangeRequestHandler.supportRanges = False
+    content = RangeRequestHandler.files["/file.bin"]
+    targetFile = str(tmp_path / "file.bin")
+
+    Downloader(chunkSize=4096, segments=4).download(server + "file.bin", targetFile)
+
+    with open(targetFile, "rb") as f:
+        assert f.read() == content
+    assert getRequests("GET") == [("GET", "/file.bin", None)]
+
+def test_sizeIsCheckedWithoutSegments(server, tmp_path):
+    content = RangeRequestHandler.files["/file.bin"]
+    targetFile = str(tmp_path / "file.bin")
+    with open(targetFile + Downloader.partSuffix, "wb") as f:
+        f.write(content + b"extra bytes")
+
+    with pytest.raises(Exception, match="Incomplete download"):
+        Downloader().download(server + "file.bin", targetFile)
+
+    assert os.listdir(tmp_path) == []
+    Downloader().download(server + "file.bin", targetFile)
+    with open(targetFile, "rb") as f:
+        assert f.read() == content
+
+def test_cropDatasetDownload(server, tmp_path):
+    files = RangeRequestHandler.files
+    checksums = {
+        "train" : hashlib.sha256(files["/train_32x32.mat"]).hexdigest(),
+        "test" : hashlib.sha256(files["/test_32x32.mat"]).hexdigest(),
+    }
+
+    SVHN(str(tmp_path), baseUrl=server).downloadDataset(crop=True, checksums=checksums)
+
+    for key in ["train", "test"]:
+        with open(tmp_path / key / (key + "_32x32.mat"), "rb") as f:
+            assert f.read() == files["/" + key + "_32x32.mat"]
+        assert os.path.exists(tmp_path / key / "downloadCrop.json")
+
+    # The splits already downloaded are skipped
+    RangeRequestHandler.requests = list()
+    SVHN(str(tmp_path), baseUrl=server).downloadDataset(crop=True, checksums=checksums)
+    assert RangeRequestHandler.requests == []
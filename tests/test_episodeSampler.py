@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+
+from ai_dataloader.dataset.episodeSampler import EpisodeSampler
+
+def makeLabels():
+    # Classes 0 to 9 with 3 to 12 samples, shuffled
+    labels = np.repeat(np.arange(10), np.arange(3, 13))
+    return np.random.default_rng(1).permutation(labels)
+
+def test_samplesWithoutReplacement():
+    labels = makeLabels()
+    sampler = EpisodeSampler(labels, 0)
+
+    classes, support, query = sampler.sample(5, 2, 3, numberEpisodes=200)
+
+    assert classes.shape == (200, 5)
+    assert support.shape == (200, 5, 2)
+    assert query.shape == (200, 5, 3)
+    for episode in range(200):
+        assert len(np.unique(classes[episode])) == 5
+        indexes = np.concatenate([support[episode].reshape(-1), query[episode].reshape(-1)])
+        assert len(np.unique(indexes)) == len(indexes)
+        for way in range(5):
+            assert np.all(labels[support[episode, way]] == classes[episode, way])
+            assert np.all(labels[query[episode, way]] == classes[episode, way])
+
+def test_onlyEligibleClasses():
+    labels = makeLabels()
+    sampler = EpisodeSampler(labels, 0)
+
+    classes, _, _ = sampler.sample(3, 4, 6, numberEpisodes=100)
+
+    # Only the classes with at least 10 samples, 7 to 9
+    assert set(np.unique(classes)) == {7, 8, 9}
+    with pytest.raises(Exception):
+        sampler.sample(4, 4, 6)
+
+def test_positionsAreUniform():
+    labels = np.zeros(4, dtype=np.int64)
+    sampler = EpisodeSampler(labels, 0)
+
+    _, support, _ = sampler.sample(1, 2, 0, numberEpisodes=12000)
+
+    pairs = np.sort(support[:, 0, :], axis=1)
+    _, counts = np.unique(pairs[:, 0] * 4 + pairs[:, 1], return_counts=True)
+    assert len(counts) == 6
+    assert np.all(np.abs(counts / 12000 - 1 / 6) < 0.02)
+
+def test_fewerEpisodesArePrefixOfMore():
+    sampler = EpisodeSampler(makeLabels())
+
+    many = sampler.sample(4, 1, 2, numberEpisodes=50, generator=np.random.default_rng(7))
+    few = sampler.sample(4, 1, 2, numberEpisodes=3, generator=np.random.default_rng(7))
+
+    for manyArray, fewArray in zip(many, few):
+        np.testing.assert_array_equal(manyArray[:3], fewArray)
@@ -0,0 +1,54 @@
+import json
+import pytest
+import numpy as np
+
+from ai_dataloader.dataset.epochSampler import EpochSampler
+
+@pytest.mark.parametrize("datasetSize, worldSize", [(20, 4), (23, 4), (5, 8), (1, 1)])
+def test_shardsCoverEpoch(datasetSize, worldSize):
+    samplers = [EpochSampler(datasetSize, rank, worldSize, seed=3) for rank in range(worldSize)]
+
+    for epoch in range(3):
+        shards = [sampler.getShard(epoch) for sampler in samplers]
+        assert all(len(shard) == len(samplers[0]) for shard in shards)
+
+        # Every sample is in a shard, only the padding repeats samples
+        samples = np.concatenate(shards)
+        assert set(samples) == set(range(datasetSize))
+        assert len(samples) - datasetSize < worldSize
+        if datasetSize % worldSize == 0:
+            assert len(np.unique(samples)) == len(samples)
+
+def test_epochsArePermutedBySeed():
+    sampler = EpochSampler(50, seed=3)
+
+    assert np.array_equal(sampler.getShard(0), EpochSampler(50, seed=3).getShard(0))
+    assert np.array_equal(sampler.getShard(0), sampler.getShard(1)) is False
+    assert np.array_equal(sampler.getShard(0), EpochSampler(50, seed=4).getShard(0)) is False
+    np.testing.assert_array_equal(EpochSampler(50, shuffle=False).getShard(7), np.arange(50))
+
+def test_nextIteratesEpochs():
+    sampler = EpochSampler(10, rank=1, worldSize=3, seed=0)
+
+    taken = [sampler.next() for _ in range(2 * len(sampler) + 1)]
+
+    np.testing.assert_array_equal(taken[:len(sampler)], sampler.getShard(0))
+    np.testing.assert_array_equal(taken[len(sampler):2 * len(sampler)], sampler.getShard(1))
+    assert taken[-1] == sampler.getShard(2)[0]
+    assert sampler.getEpoch() == 2
+
+def test_resumeFromState():
+    sampler = EpochSampler(17, rank=0, worldSize=2, seed=9)
+    for _ in range(len(sampler) + 4):
+        sampler.next()
+    state = json.loads(json.dumps(sampler.getState()))
+    expected = [sampler.next() for _ in range(len(sampler))]
+
+    resumed = EpochSampler(17, rank=0, worldSize=2, seed=9)
+    resumed.loadState(state)
+
+    assert [resumed.next() for _ in range(len(resumed))] == expected
+    with pytest.raises(Exception, match="seed"):
+        EpochSampler(17, rank=0, worldSize=2, seed=10).loadState(state)
+    with pytest.raises(Exception):
+        EpochSampler(17).setEpoch(0, 18)
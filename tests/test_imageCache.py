@@ -0,0 +1,112 @@
+import os
+import pickle
+import multiprocessing
+import pytest
+import numpy as np
+
+from ai_dataloader.dataset.imageCache import ImageCache
+
+def image(value, size=16):
+    return np.full((size, size), value, dtype=np.uint8)
+
+def test_localEvictsLeastRecentlyUsed():
+    cache = ImageCache(3 * image(0).nbytes)
+    for key in range(3):
+        cache.put(key, image(key))
+
+    assert cache.get(0) is not None
+    cache.put(3, image(3))
+
+    assert cache.get(1) is None
+    for key in [0, 2, 3]:
+        np.testing.assert_array_equal(cache.get(key), image(key))
+    counters = cache.getCounters()
+    assert counters["evictions"] == 1
+    assert counters["entries"] == 3
+    assert counters["bytes"] == 3 * image(0).nbytes
+
+def test_localImagesAreReadOnly():
+    cache = ImageCache(1024)
+    source = image(1)
+    cache.put(0, source)
+    source[:] = 2
+
+    cached = cache.get(0)
+    assert cached.flags.writeable is False
+    assert np.all(cached == 1)
+
+def test_sharedEvictsLeastRecentlyUsedOfSet():
+    # A single set, the slots of the cache are the slots of the set
+    cache = ImageCache(ImageCache.setSlots * 256, shared=True, slotBytes=256)
+    for key in range(ImageCache.setSlots):
+        cache.put(key, image(key))
+
+    assert cache.get(0) is not None
+    cache.put(100, image(100))
+
+    assert cache.get(1) is None
+    for key in [0, 100] + list(range(2, ImageCache.setSlots)):
+        np.testing.assert_array_equal(cache.get(key), image(key))
+    assert cache.getCounters()["evictions"] == 1
+    assert cache.getCounters()["entries"] == ImageCache.setSlots
+
+def test_sharedKeepsShapeAndDtype():
+    cache = ImageCache(64 * 1024, shared=True, slotBytes=4096)
+    images = {
+        3 : np.arange(24, dtype=np.float32).reshape(2, 3, 4),
+        5 : np.arange(10, dtype=np.uint8),
+        7 : np.zeros((8, 8), dtype=np.uint8),
+    }
+    for key in list(images.keys()):
+        cache.put(key, images[key])
+
+    for key in list(images.keys()):
+        cached = cache.get(key)
+        assert cached.dtype == images[key].dtype
+        np.testing.assert_array_equal(cached, images[key])
+    assert cache.get(4) is None
+    assert cache.getCounters()["hits"] == 3
+    assert cache.getCounters()["misses"] == 1
+
+def test_sharedSpreadsKeysOverSets():
+    numberSlots = 64
+    cache = ImageCache(numberSlots * 256, shared=True, slotBytes=256)
+    for key in range(numberSlots // 2):
+        cache.put(key, image(key % 256))
+
+    assert cache.getCounters()["evictions"] == 0
+    for key in range(numberSlots // 2):
+        np.testing.assert_array_equal(cache.get(key), image(key % 256))
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork is not available")
+def test_sharedWithForkedProcess():
+    cache = ImageCache(64 * 1024, shared=True, slotBytes=4096)
+
+    def fill():
+        for key in range(10):
+            cache.put(key, image(key))
+        os._exit(0)
+
+    process = multiprocessing.get_context("fork").Process(target=fill)
+    process.start()
+    process.join()
+
+    assert process.exitcode == 0
+    for key in range(10):
+        np.testing.assert_array_equal(cache.get(key), image(key))
+
+def test_sharedCanNotBePickled():
+    cache = ImageCache(64 * 1024, shared=True, slotBytes=4096)
+
+    with pytest.raises(Exception, match="forked processes"):
+        pickle.dumps(cache)
+
+def test_localPickleRoundTrip():
+    cache = ImageCache(3 * image(0).nbytes)
+    cache.put(1, image(1))
+
+    copy = pickle.loads(pickle.dumps(cache))
+    copy.put(2, image(2))
+
+    np.testing.assert_array_equal(copy.get(1), image(1))
+    assert cache.get(2) is None
@@ -0,0 +1,55 @@
+import pickle
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+
+from ai_dataloader.benchmark.syntheticFixtures import SyntheticFixtures
+from ai_dataloader.dataset.numbers import NumbersDataloader
+from ai_dataloader.dataset.negativeMiner import NegativeMiner
+
+@pytest.fixture(scope="module")
+def numbersPath(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("numbers"))
+    SyntheticFixtures.buildNumbers(path, folders=2, imagesPerDigit=4, size=8)
+
+    return path
+
+def test_episodeIsFirstOfEpisodes(numbersPath):
+    loader = NumbersDataloader(numbersPath, seed=0)
+
+    episode = [np.array(array) for array in loader.getEpisode(3, 2, 1, seed=11)]
+    episodes = loader.getEpisodes(NumbersDataloader.episodeChunk + 5, 3, 2, 1, seed=11)
+
+    for array, first in zip(episode, next(episodes)):
+        np.testing.assert_array_equal(array, first)
+
+def test_episodesDoNotChangeThePairs(numbersPath):
+    withEpisodes = NumbersDataloader(numbersPath, seed=3)
+    withoutEpisodes = NumbersDataloader(numbersPath, seed=3)
+
+    withEpisodes.getEpisode(3, 2, 1)
+
+    first, second = withEpisodes.getRandomBatchSample(8), withoutEpisodes.getRandomBatchSample(8)
+    for arrayFirst, arraySecond in zip(first, second):
+        np.testing.assert_array_equal(np.asarray(arrayFirst), np.asarray(arraySecond))
+
+def test_embeddingsBeforeFirstBatch(numbersPath):
+    loader = NumbersDataloader(numbersPath, seed=0)
+    loader.setNegativeMiner(NegativeMiner(loader.getPairSampler().getClassLabels(), 4))
+
+    with pytest.raises(Exception, match="No batch"):
+        loader.pushEmbeddings(np.zeros((8, 4), dtype=np.float32))
+
+    loader.getRandomBatchSample(8)
+    loader.pushEmbeddings(np.zeros((8, 4), dtype=np.float32), np.zeros((8, 4), dtype=np.float32))
+
+def test_pickleRoundTrip(numbersPath):
+    loader = NumbersDataloader(numbersPath, seed=5)
+    loader.getEpisode(3, 2, 1)
+    copy = pickle.loads(pickle.dumps(loader))
+
+    for arrayLoader, arrayCopy in zip(loader.getRandomBatchSample(8), copy.getRandomBatchSample(8)):
+        np.testing.assert_array_equal(np.asarray(arrayLoader), np.asarray(arrayCopy))
+    for arrayLoader, arrayCopy in zip(loader.getEpisode(3, 2, 1), copy.getEpisode(3, 2, 1)):
+        np.testing.assert_array_equal(arrayLoader, arrayCopy)
@@ -0,0 +1,63 @@
+import pickle
+import numpy as np
+import pytest
+
+pytest.importorskip("torchvision")
+pytest.importorskip("PIL")
+
+from ai_dataloader.benchmark.syntheticFixtures import SyntheticFixtures
+from ai_dataloader.dataset.omniglot import OmniglotDataloader
+from ai_dataloader.dataset.negativeMiner import NegativeMiner
+
+@pytest.fixture(scope="module")
+def omniglotPath(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("omniglot"))
+    SyntheticFixtures.buildOmniglot(path, alphabets=2, charactersPerAlphabet=4, drawers=5, size=16)
+
+    return path
+
+@pytest.fixture
+def openLoader(omniglotPath, monkeypatch):
+    from torchvision.datasets import Omniglot
+
+    # The fixture has no zip to check the md5 of
+    monkeypatch.setattr(Omniglot, "_check_integrity", lambda self: True)
+
+    return lambda: OmniglotDataloader(omniglotPath, seed=0)
+
+def test_embeddingsBeforeFirstBatch(openLoader):
+    loader = openLoader()
+    loader.setNegativeMiner(NegativeMiner(loader.getPairSampler().getClassLabels(), 4))
+
+    with pytest.raises(Exception, match="No batch"):
+        loader.pushEmbeddings(np.zeros((8, 4), dtype=np.float32))
+
+    loader.getRandomBatchSample(8)
+    loader.pushEmbeddings(np.zeros((8, 4), dtype=np.float32))
+
+def test_randomSamplesFollowSeed(openLoader):
+    first = openLoader()
+    second = openLoader()
+
+    for _ in range(5):
+        for arrayFirst, arraySecond in zip(first.getRandomSample(), second.getRandomSample()):
+            np.testing.assert_array_equal(np.asarray(arrayFirst), np.asarray(arraySecond))
+
+def test_pickleRoundTrip(openLoader):
+    loader = openLoader()
+    loader.getEpisode(3, 2, 1)
+    copy = pickle.loads(pickle.dumps(loader))
+
+    for arrayLoader, arrayCopy in zip(loader.getRandomBatchSample(8), copy.getRandomBatchSample(8)):
+        np.testing.assert_array_equal(np.asarray(arrayLoader), np.asarray(arrayCopy))
+    for arrayLoader, arrayCopy in zip(loader.getEpisode(3, 2, 1), copy.getEpisode(3, 2, 1)):
+        np.testing.assert_array_equal(arrayLoader, arrayCopy)
+
+def test_integrityCheckRestored(omniglotPath):
+    from torchvision.datasets import Omniglot
+    from ai_dataloader.benchmark.loaderBenchmark import LoaderBenchmark
+
+    checkIntegrity = Omniglot._check_integrity
+    LoaderBenchmark.openOmniglot(omniglotPath)
+
+    assert Omniglot._check_integrity is checkIntegrity
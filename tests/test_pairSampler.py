@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+
+from ai_dataloader.dataset.pairSampler import PairSampler
+
+def makeLabels():
+    # Class 40 has a single sample, it can only be in negative pairs
+    labels = np.concatenate([np.repeat([10, 20, 30], [5, 2, 9]), [40]])
+    return np.random.default_rng(2).permutation(labels)
+
+@pytest.mark.parametrize("balanced", [True, False])
+def test_positivePairs(balanced):
+    labels = makeLabels()
+    sampler = PairSampler(labels, 0, balanced)
+
+    indexes1, indexes2 = sampler.sample(5000, True)
+
+    assert np.all(labels[indexes1] == labels[indexes2])
+    assert np.all(indexes1 != indexes2)
+    assert 40 not in labels[indexes1]
+    assert set(labels[indexes1]) == {10, 20, 30}
+
+@pytest.mark.parametrize("balanced", [True, False])
+def test_negativePairs(balanced):
+    labels = makeLabels()
+    sampler = PairSampler(labels, 0, balanced)
+
+    indexes1, indexes2 = sampler.sample(5000, False)
+
+    assert np.all(labels[indexes1] != labels[indexes2])
+    assert set(labels[indexes1]) == {10, 20, 30, 40}
+    assert set(labels[indexes2]) == {10, 20, 30, 40}
+
+def test_balancedClasses():
+    labels = makeLabels()
+
+    balanced, _ = PairSampler(labels, 0, True).sample(20000, True)
+    proportional, _ = PairSampler(labels, 0, False).sample(20000, True)
+
+    # Positive anchors among the classes 10, 20 and 30 of 5, 2 and 9 samples
+    for classLabel, size in [(10, 5), (20, 2), (30, 9)]:
+        assert abs(np.mean(labels[balanced] == classLabel) - 1 / 3) < 0.02
+        assert abs(np.mean(labels[proportional] == classLabel) - size / 16) < 0.02
+
+def test_negativeWeights():
+    labels = makeLabels()
+    sampler = PairSampler(labels, 0)
+    weights = np.zeros(len(labels))
+    weights[labels == 20] = 1.0
+    sampler.setNegativeWeights(weights)
+
+    # The anchors of class 20 have no other sample with a weight
+    with pytest.raises(Exception):
+        sampler.sample(2000, False)
+    sampler.setNegativeWeights(weights + (labels == 10))
+    indexes1, indexes2 = sampler.sample(2000, False)
+    assert np.all(labels[indexes1] != labels[indexes2])
+    assert set(labels[indexes2]) <= {10, 20}
+    assert np.all(labels[indexes2][labels[indexes1] == 20] == 10)
+
+def test_batchLabels():
+    labels = makeLabels()
+    sampler = PairSampler(labels, 0)
+
+    indexes1, indexes2, pairLabels = sampler.sampleBatch(64)
+
+    assert len(indexes1) == len(indexes2) == len(pairLabels) == 64
+    np.testing.assert_array_equal(pairLabels == 1.0, labels[indexes1] == labels[indexes2])
+
+def test_sameSeedSamePairs():
+    labels = makeLabels()
+
+    first = PairSampler(labels, 4).sampleBatch(32)
+    second = PairSampler(labels, 4).sampleBatch(32)
+
+    for arrayFirst, arraySecond in zip(first, second):
+        np.testing.assert_array_equal(arrayFirst, arraySecond)
@@ -0,0 +1,92 @@
+import pytest
+import numpy as np
+
+from ai_dataloader.dataset.pixelStatistics import PixelStatistics
+
+def makeImages(dtype, channels, numberImages=12, seed=0):
+    generator = np.random.default_rng(seed)
+    images = list()
+    for _ in range(numberImages):
+        shape = (int(generator.integers(3, 20)), int(generator.integers(3, 20))) + ((channels,) if channels > 1 else ())
+        if dtype == np.uint8:
+            images.append(generator.integers(0, 256, shape, dtype=np.uint8))
+        else:
+            images.append((generator.random(shape) * 4 - 1).astype(dtype))
+
+    return images
+
+def referenceResults(images):
+    """
+    Results computed in a single pass over all the pixels at once
+    """
+    pixels = np.concatenate([image.reshape(image.shape[0] * image.shape[1], -1) for image in images]).astype(np.float64)
+    return {
+        "average" : pixels.mean(),
+        "deviation" : pixels.std(),
+        "min" : pixels.min(),
+        "max" : pixels.max(),
+        "minWidth" : min(image.shape[0] for image in images),
+        "maxWidth" : max(image.shape[0] for image in images),
+        "minHeight" : min(image.shape[1] for image in images),
+        "maxHeight" : max(image.shape[1] for image in images),
+        "averageChannels" : pixels.mean(axis=0),
+        "deviationChannels" : pixels.std(axis=0),
+        "numberImages" : len(images),
+    }
+
+def assertResults(results, reference):
+    for key in list(reference.keys()):
+        np.testing.assert_allclose(results[key], reference[key], rtol=1e-10, atol=1e-10, err_msg=key)
+
+@pytest.mark.parametrize("dtype, channels", [(np.uint8, 3), (np.uint8, 1), (np.float32, 3), (np.float32, 1)])
+def test_mergedChunksMatchSinglePass(dtype, channels):
+    images = makeImages(dtype, channels)
+    reference = referenceResults(images)
+
+    sequential = PixelStatistics()
+    for image in images:
+        sequential.update(image)
+    assertResults(sequential.getResults(), reference)
+
+    # Chunks of different sizes and an empty one, merged out of order
+    merged = PixelStatistics()
+    for start, stop in [(7, 12), (0, 1), (4, 4), (1, 7)]:
+        chunk = PixelStatistics()
+        for image in images[start:stop]:
+            chunk.update(image)
+        merged.merge(chunk.getState())
+    assertResults(merged.getResults(), reference)
+
+def test_histogramOfMergedChunks():
+    images = makeImages(np.uint8, 3)
+
+    merged = PixelStatistics(histogram=True)
+    for start, stop in [(0, 5), (5, 12)]:
+        chunk = PixelStatistics(histogram=True)
+        for image in images[start:stop]:
+            chunk.update(image)
+        merged.merge(chunk)
+
+    pixels = np.concatenate([image.reshape(-1, 3) for image in images])
+    histogram = np.array(merged.getResults()["histogram"])
+    for channel in range(3):
+        np.testing.assert_array_equal(histogram[channel], np.bincount(pixels[:, channel], minlength=256))
+
+def test_standardErrorOfImageMeans():
+    images = makeImages(np.float32, 1, numberImages=30)
+    statistics = PixelStatistics()
+    assert statistics.getStandardError() == float("inf")
+    for image in images:
+        statistics.update(image)
+
+    means = np.array([image.astype(np.float64).mean() for image in images])
+    assert statistics.getStandardError() == pytest.approx(means.std(ddof=1) / np.sqrt(len(means)))
+
+def test_channelsMustMatch():
+    statistics = PixelStatistics()
+    statistics.update(np.zeros((4, 4, 3), dtype=np.uint8))
+
+    with pytest.raises(Exception, match="channels"):
+        statistics.update(np.zeros((4, 4), dtype=np.uint8))
+    with pytest.raises(Exception):
+        PixelStatistics().getResults()
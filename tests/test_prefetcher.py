@@ -0,0 +1,92 @@
+import time
+import asyncio
+import threading
+import multiprocessing
+import pytest
+import numpy as np
+
+from ai_dataloader.dataloader import Prefetcher
+
+modes = ["thread"]
+if "fork" in multiprocessing.get_all_start_methods():
+    modes.append("process")
+
+class CountingLoader(object):
+    """
+    Loader whose batches are its seed and the number of batches produced before, with a random delay so the
+    workers finish out of order
+    """
+    def __init__(self, seed, failAt=None):
+        self.seed = seed
+        self.produced = 0
+        self.failAt = failAt
+        self.generator = np.random.default_rng(seed)
+
+    def produceBatch(self):
+        time.sleep(float(self.generator.uniform(0, 0.01)))
+        if self.produced == self.failAt:
+            raise ValueError("batch " + str(self.produced) + " failed")
+        batch = (self.seed, self.produced)
+        self.produced += 1
+        return batch
+
+def produceBatch(loader):
+    return loader.produceBatch()
+
+@pytest.mark.parametrize("mode", modes)
+def test_batchesInRoundRobinOrder(mode):
+    workers = 3
+    with Prefetcher(CountingLoader, produceBatch, workers=workers, mode=mode, seed=5, numberBatches=20) as prefetcher:
+        batches = list(prefetcher)
+
+    assert len(batches) == 20
+    seeds = [batches[position][0] for position in range(workers)]
+    assert len(set(seeds)) == workers
+    for position in range(20):
+        assert batches[position] == (seeds[position % workers], position // workers)
+
+    # The sequence only depends on the seed
+    with Prefetcher(CountingLoader, produceBatch, workers=workers, mode=mode, seed=5, numberBatches=20) as prefetcher:
+        assert list(prefetcher) == batches
+
+@pytest.mark.parametrize("mode", modes)
+def test_workerErrorIsRaised(mode):
+    factory = lambda seed: CountingLoader(seed, failAt=2)
+    prefetcher = Prefetcher(factory, produceBatch, workers=2, mode=mode, seed=0, numberBatches=10)
+
+    batches = [next(prefetcher) for _ in range(4)]
+    with pytest.raises(ValueError, match="batch 2 failed"):
+        next(prefetcher)
+
+    assert [batch[1] for batch in batches] == [0, 0, 1, 1]
+    with pytest.raises(StopIteration):
+        next(prefetcher)
+
+@pytest.mark.parametrize("mode", modes)
+def test_closeStopsWorkers(mode):
+    threadsBefore = threading.active_count()
+    prefetcher = Prefetcher(CountingLoader, produceBatch, workers=3, queueSize=1, mode=mode, seed=0)
+    for _ in range(5):
+        next(prefetcher)
+
+    # The workers are blocked on their full queues when the prefetcher is closed
+    time.sleep(0.1)
+    startTime = time.perf_counter()
+    prefetcher.close()
+
+    assert time.perf_counter() - startTime < 2
+    assert threading.active_count() == threadsBefore
+    assert multiprocessing.active_children() == []
+    with pytest.raises(StopIteration):
+        next(prefetcher)
+
+def test_asyncIteration():
+    async def collect():
+        batches = list()
+        async for batch in Prefetcher(CountingLoader, produceBatch, workers=2, seed=1, numberBatches=6):
+            batches.append(batch)
+        return batches
+
+    batches = asyncio.run(collect())
+
+    assert [batch[1] for batch in batches] == [0, 0, 1, 1, 2, 2]
@@ -0,0 +1,78 @@
+import os
+import shutil
+import pytest
+import numpy as np
+
+pytest.importorskip("h5py")
+pytest.importorskip("PIL")
+
+from ai_dataloader.benchmark.syntheticFixtures import SyntheticFixtures
+from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+
+outputFolders = ["groundTruth", "imagesDirectory"]
+
+def readOutputs(path):
+    """
+    Files written by prepareData, the members of a .npz are compared instead of the archive since zip entries carry
+    their modification time
+    """
+    outputs = dict()
+    for split in ["train", "test"]:
+        for folder in outputFolders:
+            pathFolder = os.path.join(path, split, folder)
+            for name in sorted(os.listdir(pathFolder)):
+                pathFile = os.path.join(pathFolder, name)
+                if name.endswith(".npz"):
+                    with np.load(pathFile) as arrays:
+                        content = {key : arrays[key].tobytes() for key in arrays.files}
+                else:
+                    with open(pathFile, "rb") as f:
+                        content = f.read()
+                outputs.update({os.path.join(split, folder, name) : content})
+
+    return outputs
+
+def removeOutputs(path):
+    for split in ["train", "test"]:
+        for folder in outputFolders:
+            shutil.rmtree(os.path.join(path, split, folder))
+
+@pytest.mark.parametrize("groundTruthFormat", ["json", "packed"])
+def test_workersWriteSameFiles(tmp_path, groundTruthFormat):
+    # The images index stores absolute paths, so both runs prepare the same folder
+    path = str(tmp_path)
+    SyntheticFixtures.buildSVHN(path, trainImages=60, testImages=20, seed=3)
+
+    SVHN(path, groundTruthFormat=groundTruthFormat).prepareData(workers=1)
+    serial = readOutputs(path)
+    removeOutputs(path)
+    SVHN(path, groundTruthFormat=groundTruthFormat).prepareData(workers=2)
+    parallel = readOutputs(path)
+
+    expected = [
+        os.path.join("train", "groundTruth", "groundTruth.json"),
+        os.path.join("train", "imagesDirectory", "normalizationParameters.json"),
+    ]
+    if groundTruthFormat == "packed":
+        expected += [
+            os.path.join("train", "groundTruth", "groundTruthBoxes.npy"),
+            os.path.join("train", "groundTruth", "groundTruthOffsets.npy"),
+            os.path.join("test", "imagesDirectory", "imagesIndex.npz"),
+        ]
+    assert set(expected) <= set(serial.keys())
+    assert sorted(serial.keys()) == sorted(parallel.keys())
+    for name in list(serial.keys()):
+        assert serial[name] == parallel[name], name
+
+def test_benchmarkSpeedupAgainstSerialRun(tmp_path):
+    from ai_dataloader.benchmark.prepareDataBenchmark import PrepareDataBenchmark
+
+    path = str(tmp_path)
+    SyntheticFixtures.buildSVHN(path, trainImages=20, testImages=8, seed=3)
+
+    results = PrepareDataBenchmark(path).run([2])
+
+    assert list(results.keys()) == [1, 2]
+    assert results[1]["speedup"] == 1.0
+    assert results[2]["speedup"] == results[1]["seconds"] / results[2]["seconds"]
+    assert results[2]["identical"]
@@ -0,0 +1,54 @@
+import pickle
+import threading
+import numpy as np
+
+from ai_dataloader.dataset.streetViewHouseNumbers import SVHN
+
+def test_batchesMatchSamples(svhnPath):
+    svhn = SVHN(svhnPath, groundTruthFormat="packed")
+    indices = np.array([3, 0, 17, 3, 39, 22, 8])
+
+    try:
+        for dataset in ["train", "test"]:
+            datasetIndices = indices % svhn.getDatasetSize(dataset)
+            batches = svhn.getBatch(datasetIndices, dataset=dataset, workers=3)
+
+            positions = np.sort(np.concatenate([batch["positions"] for batch in batches]))
+            np.testing.assert_array_equal(positions, np.arange(len(indices)))
+            for batch in batches:
+                for batchIndex in range(len(batch["positions"])):
+                    image, boxes = svhn.getSample(int(datasetIndices[batch["positions"][batchIndex]]), dataset=dataset)
+                    rows, columns = image.shape[:2]
+                    np.testing.assert_array_equal(batch["images"][batchIndex, :rows, :columns], image)
+                    assert batch["masks"][batchIndex].sum() == rows * columns
+                    assert batch["boxCounts"][batchIndex] == len(boxes)
+                    np.testing.assert_array_equal(batch["labels"][batchIndex, :len(boxes)], boxes["label"])
+    finally:
+        svhn.close()
+
+def test_poolIsKeptUntilClose(svhnPath):
+    svhn = SVHN(svhnPath, groundTruthFormat="packed")
+    before = threading.active_count()
+
+    for _ in range(5):
+        svhn.getBatch(np.arange(8), workers=2)
+    assert threading.active_count() - before <= 2
+
+    svhn.close()
+    assert threading.active_count() == before
+    assert len(svhn.getBatch(np.arange(8), workers=2)) > 0
+    svhn.close()
+
+def test_pickleRoundTrip(svhnPath):
+    svhn = SVHN(svhnPath, groundTruthFormat="packed")
+    expected = svhn.getBatch(np.arange(6), workers=2)
+
+    copy = pickle.loads(pickle.dumps(svhn))
+    svhn.close()
+
+    batches = copy.getBatch(np.arange(6), workers=2)
+    copy.close()
+    assert len(batches) == len(expected)
+    for batch, expectedBatch in zip(batches, expected):
+        np.testing.assert_array_equal(batch["images"], expectedBatch["images"])
+        np.testing.assert_array_equal(batch["boxes"], expectedBatch["boxes"])
@@ -0,0 +1,25 @@
+import pytest
+import numpy as np
+
+from ai_dataloader.dataset.svhnIndex import SVHNIndex
+
+def makeTables(counts):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    boxes = np.zeros(offsets[-1], dtype=SVHNIndex.boxDtype)
+    boxes["imageId"] = np.repeat(np.arange(len(counts)), counts)
+
+    return {"boxes" : boxes, "offsets" : offsets}
+
+def test_boxesOfEveryImage():
+    tables = makeTables([2, 0, 3])
+
+    for index, count in enumerate([2, 0, 3]):
+        boxes = SVHNIndex.getBoxes(tables, index)
+        assert len(boxes) == count
+        assert np.all(boxes["imageId"] == index)
+
+@pytest.mark.parametrize("index", [-1, 3, 10])
+def test_indexOutOfRange(index):
+    with pytest.raises(Exception, match="out of range"):
+        SVHNIndex.getBoxes(makeTables([2, 0, 3]), index)
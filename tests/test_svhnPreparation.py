@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+
+h5py = pytest.importorskip("h5py")
+pytest.importorskip("PIL")
+
+from ai_dataloader.benchmark.syntheticFixtures import SyntheticFixtures
+from ai_dataloader.dataset.svhnPreparation import SVHNPreparation
+
+matKeys = {
+    "digitStruct" : "digitStruct",
+    "box" : "bbox",
+    "boxKeys" : {field : field for field in ["height", "left", "width", "top", "label"]},
+}
+
+def readBoxes(groundTruthFile):
+    """
+    Reference reading of the boxes with the high level api of h5py
+    """
+    images = list()
+    with h5py.File(groundTruthFile, "r") as matFile:
+        for reference in matFile["digitStruct"]["bbox"][:].ravel():
+            group = matFile[reference]
+            image = dict()
+            for field in list(matKeys["boxKeys"].keys()):
+                column = group[field][:].ravel()
+                if h5py.check_ref_dtype(column.dtype) is not None:
+                    column = np.array([matFile[scalar][()].ravel()[0] for scalar in column])
+                image.update({field : column.astype(np.int64)})
+            images.append(image)
+
+    return images
+
+def assertSameBoxes(groundTruthFile, start, stop):
+    images = readBoxes(groundTruthFile)[start:stop]
+    boxes, offsets = SVHNPreparation.extractBoxes(groundTruthFile, matKeys, start, stop)
+
+    assert len(offsets) == len(images) + 1
+    for position in range(len(images)):
+        imageBoxes = boxes[offsets[position]:offsets[position + 1]]
+        assert np.all(imageBoxes["imageId"] == start + position)
+        for field in list(matKeys["boxKeys"].keys()):
+            np.testing.assert_array_equal(imageBoxes[field], images[position][field])
+
+def test_extractBoxesOfFixture(tmp_path):
+    SyntheticFixtures.buildSVHN(str(tmp_path), trainImages=40, testImages=1, maxDigits=5, seed=7)
+    groundTruthFile = str(tmp_path / "train" / "train" / "digitStruct.mat")
+
+    assertSameBoxes(groundTruthFile, 0, 40)
+    assertSameBoxes(groundTruthFile, 13, 29)
+    assertSameBoxes(groundTruthFile, 5, 5)
+
+def test_extractBoxesOfScalarsNotGathered(tmp_path):
+    # Integer scalars and chunked scalars are read one by one instead of gathered from the file
+    groundTruthFile = str(tmp_path / "digitStruct.mat")
+    generator = np.random.default_rng(0)
+    with h5py.File(groundTruthFile, "w") as matFile:
+        references = matFile.create_group("#refs#")
+        boxReferences = list()
+        for image in range(6):
+            group = references.create_group("b" + str(image))
+            numberDigits = 1 + image % 3
+            for field in list(matKeys["boxKeys"].keys()):
+                values = generator.integers(0, 100, numberDigits)
+                if numberDigits == 1:
+                    group.create_dataset(field, data=np.array([[values[0]]], dtype=np.float64))
+                    continue
+                scalars = list()
+                for value in values:
+                    name = "s" + str(len(references))
+                    if image % 2 == 0:
+                        scalar = references.create_dataset(name, data=np.array([[value]], dtype=np.int32))
+                    else:
+                        scalar = references.create_dataset(name, data=np.array([[value]], dtype=np.float64), chunks=(1, 1))
+                    scalars.append(scalar.ref)
+                group.create_dataset(field, data=np.array(scalars, dtype=h5py.ref_dtype).reshape(numberDigits, 1))
+            boxReferences.append(group.ref)
+        matFile.create_group("digitStruct").create_dataset("bbox", data=np.array(boxReferences, dtype=h5py.ref_dtype).reshape(6, 1))
+
+    assertSameBoxes(groundTruthFile, 0, 6)